@@ -13,10 +13,12 @@ from urlparse import urlparse
 
 __author__ = 'hiranya'
 
-CLASSES = []
-CLASS_NAMES = []
+CLASSES = MemberList()
+CLASS_NAMES = NameAllocator()
 CLASS_NAME_MAPPINGS = {}
-STATIC_METHODS = []
+STATIC_METHODS = MemberList()
+# Names of the generated serializer functions (See get_serializer)
+SERIALIZERS = {}
 
 CONTENT_TYPES = {
   'application/json' : 'json',
@@ -61,22 +63,10 @@ def define_class_name(string):
     # '12345' -> 'DataType12345'
     temp_name = 'DataType' + temp_name
 
-  class_name = temp_name[0].upper() + temp_name[1:]
-  counter = 0
-  while True:
-    if class_name in CLASS_NAMES:
-      # Name already allocated. Try randomizing it by adding an integer
-      # to the end.
-      if counter > 0:
-        class_name = class_name[:-1*len(str(counter))]
-      counter += 1
-      class_name += str(counter)
-      continue
-    else:
-      # We have found a valid Python class name.
-      CLASS_NAMES.append(class_name)
-      CLASS_NAME_MAPPINGS[string] = class_name
-      return class_name
+  # If the name is already allocated, an integer is added to the end of it
+  class_name = CLASS_NAMES.allocate(temp_name[0].upper() + temp_name[1:])
+  CLASS_NAME_MAPPINGS[string] = class_name
+  return class_name
 
 def define_method_name(clazz, string):
   """
@@ -96,17 +86,9 @@ def define_method_name(clazz, string):
     temp_name = 'method'
   elif temp_name[0].isdigit():
     temp_name = 'method_' + temp_name
-  method_name = temp_name[0].lower() + temp_name[1:]
-  counter = 0
-  while True:
-    if clazz.has_method(method_name):
-      if counter > 0:
-        method_name = method_name[:-1*len(str(counter))]
-      counter += 1
-      method_name += str(counter)
-      continue
-    else:
-      return method_name
+  # The name is taken once the method is added to the class
+  return clazz.method_names.allocate(temp_name[0].lower() + temp_name[1:],
+                                     reserve=False)
 
 def define_static_method_name(string):
   """
@@ -126,9 +108,8 @@ def define_static_method_name(string):
   elif temp_name[0].isdigit():
     temp_name = 'method_' + temp_name
   method_name = temp_name[0].lower() + temp_name[1:]
-  for sm in STATIC_METHODS:
-    if sm.name == method_name:
-      return None
+  if STATIC_METHODS.lookup(method_name) is not None:
+    return None
   return method_name
 
 def define_argument_name(method, string):
@@ -149,17 +130,9 @@ def define_argument_name(method, string):
     temp_name = 'param'
   elif temp_name[0].isdigit():
     temp_name = 'param_' + temp_name
-  param_name = temp_name[0].lower() + temp_name[1:]
-  counter = 0
-  while True:
-    if method.has_argument(param_name):
-      if counter > 0:
-        param_name = param_name[:-1*len(str(counter))]
-      counter += 1
-      param_name += str(counter)
-      continue
-    else:
-      return param_name
+  # The name is taken once the argument is added to the method
+  return method.argument_names.allocate(temp_name[0].lower() + temp_name[1:],
+                                        reserve=False)
 
 def generate_imports():
   """
@@ -443,18 +416,17 @@ def resolve_uri_templates(request_path, resource, operation, method):
   return request_path.replace('+ \'\'', '')
 
 def get_class_parameter(data_type, key):
-  class_name = CLASS_NAME_MAPPINGS[data_type]
-  for clazz in CLASSES:
-    if clazz.name == class_name:
-      constructor = clazz.get_constructor()
-      return constructor.get_mapping(key)
-  return None
+  clazz = CLASSES.lookup(CLASS_NAME_MAPPINGS[data_type])
+  if clazz is None:
+    return None
+  return clazz.get_constructor().get_mapping(key)
 
 def generate_serializers(api, data_type, content_types):
   """
   Recursively generate serializer functions for the specified data type. All
   serializer functions are generated as static functions and added to the
-  STATIC_METHODS global.
+  STATIC_METHODS global. Functions generated by earlier calls are not
+  generated again.
 
   Args:
     api The API object for which client code is being generated
@@ -465,7 +437,8 @@ def generate_serializers(api, data_type, content_types):
   """
   for content_type in content_types:
     media_type = find_media_type(content_type)
-    serializer = get_serializer(media_type, CLASSES, CLASS_NAME_MAPPINGS)
+    serializer = get_serializer(media_type, CLASSES, CLASS_NAME_MAPPINGS,
+                                SERIALIZERS)
     serializer_functions = serializer.generate_serializers(data_type, api)
     for sf in serializer_functions:
       if define_static_method_name(sf.name) is not None:
@@ -475,7 +448,8 @@ def generate_deserializers(api, data_type, content_types):
   """
   Recursively generate deserializer functions for the specified data type. All
   deserializer functions are generated as static functions and added to the
-  STATIC_METHODS global.
+  STATIC_METHODS global. Functions generated by earlier calls are not
+  generated again.
 
   Args:
     api The API object for which client code is being generated
@@ -486,7 +460,8 @@ def generate_deserializers(api, data_type, content_types):
   """
   for content_type in content_types:
     media_type = find_media_type(content_type)
-    serializer = get_serializer(media_type, CLASSES, CLASS_NAME_MAPPINGS)
+    serializer = get_serializer(media_type, CLASSES, CLASS_NAME_MAPPINGS,
+                                SERIALIZERS)
     serializer_functions = serializer.generate_deserializers(data_type, api)
     for sf in serializer_functions:
       if define_static_method_name(sf.name) is not None:
@@ -718,10 +693,23 @@ if __name__ == '__main__':
     help='Path to the output Python file to be generated')
   parser.add_option('-d', '--deserializer', dest='deserializer',
     help='Preferred output deserializer (used for all operations that support this content type)')
+  parser.add_option('-s', '--stream', dest='stream', action='store_true',
+    default=False, help='Parse the input API description file incrementally (reduces memory usage for large files)')
+  parser.add_option('-c', '--cache', dest='cache', action='store_true',
+    default=False, help='Cache the parsed API description alongside the input file, and reuse it until the file changes')
+  parser.add_option('--cache-dir', dest='cache_dir',
+    help='Directory in which to cache parsed API descriptions (implies -c)')
+  parser.add_option('-p', '--parallel', dest='parallel', action='store_true',
+    default=False, help='Validate the input API description in parallel using multiple processes')
 
   (options, args) = parser.parse_args(sys.argv)
   if options.file:
-    api = parse(options.file)
+    if options.cache or options.cache_dir:
+      api = parse_cached(options.file, options.cache_dir, options.stream,
+                         options.parallel)
+    else:
+      api = parse(options.file, streaming=options.stream,
+                  parallel=options.parallel)
     print 'API description loaded from', options.file
   elif options.url:
     if options.method:
@@ -772,12 +760,17 @@ if __name__ == '__main__':
   output.write('\n')
   output.write(generate_epr_definitions(api.base))
   output.write('\n')
+  # Serializers and classes are streamed to the output file as they are
+  # generated, so the generated module is never held in memory
+  pcg = PythonCodeGenerator()
+  pcg.begin(tab='  ', output=output)
   for serializer in STATIC_METHODS:
-    output.write(serializer.generate_code())
-    output.write('\n')
+    serializer.generate_code(pcg)
+    pcg.writeln()
   for clazz in CLASSES:
-    output.write(clazz.generate_code())
-    output.write('\n')
+    clazz.generate_code(pcg)
+    pcg.writeln()
+  pcg.end()
   output.flush()
   output.close()
 
@@ -0,0 +1,269 @@
+#!/usr/bin/python
+
+import itertools
+import multiprocessing
+import sys
+import time
+
+sys.path.append('../python-lib')
+
+from api import *
+from comparison_store import ComparisonStore, get_operation_key
+from operation_index import OperationIndex
+from optparse import OptionParser
+from predicate_parser import compare_operation_conditions, conditions_match, \
+  methods_compatible
+
+__author__ = 'hiranya'
+
+# Number of operation pairs handed to a worker process at a time
+PAIRS_PER_TASK = 64
+
+# API descriptions of a worker process (See init_worker)
+APIS = None
+
+def load_api(path, cache_dir=None, cache=False):
+  if cache or cache_dir:
+    return parse_cached(path, cache_dir)
+  return parse(path)
+
+def load_apis(paths, cache_dir=None, cache=False):
+  apis = []
+  for path in paths:
+    api = load_api(path, cache_dir, cache)
+    api.precompute_conditions()
+    apis.append(api)
+  return apis
+
+def init_worker(apis):
+  # Worker processes are forked with the API descriptions already loaded by
+  # the parent, so that only the positions of the compared operations are
+  # sent between processes.
+  global APIS
+  APIS = apis
+
+def get_operations(api):
+  """
+  Returns:
+    A list of (resource index, operation index, operation) tuples for all
+    the operations of the API
+  """
+  operations = []
+  for i in range(len(api.resources)):
+    resource = api.resources[i]
+    for j in range(len(resource.operations)):
+      operations.append((i, j, resource.operations[j]))
+  return operations
+
+def get_operation(api, position):
+  resource, operation = position
+  return api.resources[resource].operations[operation]
+
+def generate_pairs(apis, index=None):
+  """
+  Generate the pairs of operations from different API descriptions that
+  have compatible HTTP methods (See methods_compatible).
+
+  Args:
+    apis  A list of API objects
+    index An optional OperationIndex holding all the operations of the
+          APIs. If specified, only the candidate pairs found by the index
+          are generated.
+
+  Returns:
+    A generator of ((api, resource, operation), (api, resource, operation))
+    position tuples
+  """
+  if index is not None:
+    positions = {}
+    for k in range(len(apis)):
+      for i, j, operation in get_operations(apis[k]):
+        positions[id(operation)] = (k, i, j)
+    for a, b in index.get_candidate_pairs():
+      api1, op1 = index.entries[a]
+      api2, op2 = index.entries[b]
+      if api1 is not api2 and methods_compatible(op1.method, op2.method):
+        yield positions[id(op1)], positions[id(op2)]
+    return
+
+  operations = [ get_operations(api) for api in apis ]
+  for k1 in range(len(apis)):
+    for k2 in range(k1 + 1, len(apis)):
+      for i1, j1, op1 in operations[k1]:
+        for i2, j2, op2 in operations[k2]:
+          if methods_compatible(op1.method, op2.method):
+            yield (k1, i1, j1), (k2, i2, j2)
+
+def get_operation_keys(apis):
+  """
+  Returns:
+    A dictionary of operation keys (See get_operation_key) keyed by
+    (api, resource, operation) position
+  """
+  keys = {}
+  for k in range(len(apis)):
+    for i, j, operation in get_operations(apis[k]):
+      keys[(k, i, j)] = get_operation_key(apis[k], operation)
+  return keys
+
+def split_stored_pairs(pairs, keys, store):
+  """
+  Separate the operation pairs whose results are already in a comparison
+  store from the pairs that must be compared.
+
+  Returns:
+    A tuple containing a list of (pair, pre-condition similarity,
+    post-condition similarity) tuples for the stored pairs, and a list of
+    the remaining pairs
+  """
+  stored = []
+  remaining = []
+  for pair in pairs:
+    result = store.get(keys[pair[0]], keys[pair[1]])
+    if result is None:
+      remaining.append(pair)
+    else:
+      stored.append((pair, result[0], result[1]))
+  return stored, remaining
+
+def generate_tasks(pairs):
+  task = []
+  for pair in pairs:
+    task.append(pair)
+    if len(task) == PAIRS_PER_TASK:
+      yield task
+      task = []
+  if task:
+    yield task
+
+def compare_pairs(pairs, apis=None):
+  """
+  Compare a list of operation pairs.
+
+  Args:
+    pairs A list of position tuples (See generate_pairs)
+    apis  A list of API objects. Defaults to the APIs of the worker
+          process.
+
+  Returns:
+    A list of (pair, pre-condition similarity, post-condition similarity)
+    tuples
+  """
+  if apis is None:
+    apis = APIS
+  results = []
+  for pair in pairs:
+    (k1, i1, j1), (k2, i2, j2) = pair
+    api1 = apis[k1]
+    api2 = apis[k2]
+    op1 = get_operation(api1, (i1, j1))
+    op2 = get_operation(api2, (i2, j2))
+    sim1, sim2 = compare_operation_conditions(api1, op1, api2, op2)
+    results.append((pair, sim1, sim2))
+  return results
+
+def get_operation_label(api, position):
+  k, i, j = position
+  resource = api.resources[i]
+  return resource.name + '.' + resource.operations[j].name
+
+def write_result(output, apis, result, verbose):
+  pair, sim1, sim2 = result
+  match = conditions_match(sim1, sim2)
+  if match or verbose:
+    position1, position2 = pair
+    api1 = apis[position1[0]]
+    api2 = apis[position2[0]]
+    output.write('%s\t%s\t%s\t%s\t%.4f\t%.4f\t%s\n' % (
+      api1.name, get_operation_label(api1, position1),
+      api2.name, get_operation_label(api2, position2),
+      sim1, sim2, 'MATCH' if match else '-'))
+  return match
+
+if __name__ == '__main__':
+  parser = OptionParser(usage='%prog [options] FILE FILE...')
+  parser.add_option('-o', '--output', dest='output',
+    help='Path to the output match report (defaults to the standard output)')
+  parser.add_option('-j', '--processes', dest='processes', type='int',
+    help='Number of worker processes (defaults to the number of CPUs)')
+  parser.add_option('-i', '--index', dest='index', action='store_true',
+    default=False, help='Only compare the operation pairs found similar by an LSH index (faster for large numbers of descriptions, but may miss some matches)')
+  parser.add_option('-v', '--verbose', dest='verbose', action='store_true',
+    default=False, help='Report all the compared operation pairs, and not only the matching ones')
+  parser.add_option('-c', '--cache', dest='cache', action='store_true',
+    default=False, help='Cache the parsed API descriptions alongside the input files, and reuse them until the files change')
+  parser.add_option('--cache-dir', dest='cache_dir',
+    help='Directory in which to cache parsed API descriptions (implies -c)')
+  parser.add_option('-s', '--store', dest='store',
+    help='Path to a comparison store file. Results of operations that have not changed since the previous run are read from the store instead of being recomputed, and the store is updated afterwards.')
+
+  (options, args) = parser.parse_args(sys.argv)
+  paths = args[1:]
+  if len(paths) < 2:
+    print 'Please specify the paths of at least two API description files'
+    exit(1)
+
+  processes = options.processes or multiprocessing.cpu_count()
+  if processes < 1:
+    print 'The number of worker processes must be positive'
+    exit(1)
+
+  apis = load_apis(paths, options.cache_dir, options.cache)
+  index = None
+  if options.index:
+    index = OperationIndex()
+    for api in apis:
+      index.add_api(api)
+
+  if options.output:
+    output = open(options.output, 'w')
+  else:
+    output = sys.stdout
+  output.write('# api1\toperation1\tapi2\toperation2\tpre\tpost\tresult\n')
+
+  start = time.time()
+  pairs = generate_pairs(apis, index)
+  store = None
+  stored = []
+  if options.store:
+    store = ComparisonStore(options.store)
+    keys = get_operation_keys(apis)
+    stored, pairs = split_stored_pairs(pairs, keys, store)
+  tasks = generate_tasks(pairs)
+  pool = None
+  if processes > 1:
+    pool = multiprocessing.Pool(processes, init_worker, (apis,))
+    results = pool.imap_unordered(compare_pairs, tasks)
+  else:
+    results = (compare_pairs(task, apis) for task in tasks)
+
+  pair_count = 0
+  match_count = 0
+  try:
+    for task_results in itertools.chain([ stored ], results):
+      for result in task_results:
+        pair_count += 1
+        if store is not None and task_results is not stored:
+          pair, sim1, sim2 = result
+          store.put(keys[pair[0]], keys[pair[1]], sim1, sim2)
+        if write_result(output, apis, result, options.verbose):
+          match_count += 1
+      output.flush()
+  finally:
+    if pool is not None:
+      pool.terminate()
+      pool.join()
+  if store is not None:
+    store.save()
+  elapsed = time.time() - start
+  if options.output:
+    output.close()
+
+  # Stored results are not counted towards the throughput
+  compared_count = pair_count - len(stored)
+  throughput = compared_count / elapsed if elapsed > 0 else 0.0
+  print >> sys.stderr, 'Compared %d operation pairs in %.2f seconds (%.1f pairs/sec) using %d process(es)' % (
+    compared_count, elapsed, throughput, processes)
+  if store is not None:
+    print >> sys.stderr, 'Reused %d stored results' % len(stored)
+  print >> sys.stderr, 'Found %d matching operation pairs' % match_count
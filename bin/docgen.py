@@ -416,10 +416,23 @@ if __name__ == '__main__':
     help='Output directory')
   parser.add_option('-e', '--export', dest='export',
     help='Export format (defaults to html)')
+  parser.add_option('-s', '--stream', dest='stream', action='store_true',
+    default=False, help='Parse the input API description file incrementally (reduces memory usage for large files)')
+  parser.add_option('-c', '--cache', dest='cache', action='store_true',
+    default=False, help='Cache the parsed API description alongside the input file, and reuse it until the file changes')
+  parser.add_option('--cache-dir', dest='cache_dir',
+    help='Directory in which to cache parsed API descriptions (implies -c)')
+  parser.add_option('-p', '--parallel', dest='parallel', action='store_true',
+    default=False, help='Validate the input API description in parallel using multiple processes')
 
   (options, args) = parser.parse_args(sys.argv)
   if options.file:
-    api = parse(options.file)
+    if options.cache or options.cache_dir:
+      api = parse_cached(options.file, options.cache_dir, options.stream,
+                         options.parallel)
+    else:
+      api = parse(options.file, streaming=options.stream,
+                  parallel=options.parallel)
     print 'API description loaded from', options.file
   elif options.url:
     if options.method:
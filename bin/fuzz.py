@@ -0,0 +1,52 @@
+#!/usr/bin/python
+
+import sys
+import time
+
+sys.path.append('../python-lib')
+
+from api import *
+from api_fuzzer import DEFAULT_PREFIX, generate_variants
+from optparse import OptionParser
+
+__author__ = 'hiranya'
+
+if __name__ == '__main__':
+  parser = OptionParser()
+  parser.add_option('-f', '--file', dest='file',
+    help='Path to the input API description file')
+  parser.add_option('-n', '--count', dest='count', type='int', default=1,
+    help='Number of mutated variants to generate (defaults to 1)')
+  parser.add_option('-s', '--seed', dest='seed', default='0',
+    help='Seed of the generated corpus (defaults to 0). The same seed always generates the same variants.')
+  parser.add_option('-o', '--output', dest='output',
+    help='Output directory (one JSON file per variant)')
+  parser.add_option('-l', '--lines', dest='lines',
+    help='Output file to which the variants are written as JSON lines, or - for the standard output')
+  parser.add_option('--prefix', dest='prefix', default=DEFAULT_PREFIX,
+    help='Prefix of the variant names (defaults to ' + DEFAULT_PREFIX + ')')
+  parser.add_option('-j', '--processes', dest='processes', type='int',
+    default=1, help='Number of worker processes (defaults to 1)')
+
+  (options, args) = parser.parse_args(sys.argv)
+  if not options.file:
+    print 'Please specify the path of the input API description file'
+    exit(1)
+  if bool(options.output) == bool(options.lines):
+    print 'Please specify either an output directory or a JSON lines output file'
+    exit(1)
+
+  api = parse(options.file)
+  output = None
+  if options.lines == '-':
+    output = sys.stdout
+  elif options.lines:
+    output = open(options.lines, 'w')
+
+  start = time.time()
+  count = generate_variants(api, options.count, options.seed, options.output,
+                            output, options.processes, options.prefix)
+  elapsed = time.time() - start
+  if output is not None and output is not sys.stdout:
+    output.close()
+  print >> sys.stderr, 'Generated %d variants in %.2f seconds' % (count, elapsed)
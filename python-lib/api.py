@@ -1,8 +1,16 @@
 import ast
 from collections import OrderedDict
+import hashlib
 import json
+import marshal
+import multiprocessing
+import os
+import tempfile
 import traceback
+import weakref
 import ast2code
+import jsonstream
+import predicate_cache
 
 __author__ = 'hiranya'
 
@@ -51,6 +59,21 @@ TYPE = 'type'
 UNIT_PRICE = 'unitPrice'
 VERSION = 'version'
 
+# Compiled API description cache settings. Increment CACHE_FORMAT whenever
+# a change to the object model invalidates previously cached API objects.
+CACHE_FORMAT = 4
+CACHE_MAGIC = 'RESTCODER-API-CACHE'
+CACHE_SUFFIX = '.cache'
+
+# Parallel validation settings. Descriptions with fewer resources and data
+# types than the threshold are always validated serially, since starting the
+# worker processes would cost more than the validation itself.
+PARALLEL_VALIDATION_THRESHOLD = 1000
+SHARDS_PER_PROCESS = 4
+
+# Results of ContextChanger.change_context keyed by (predicate, old, new)
+CONTEXT_CACHE = predicate_cache.LRUCache(predicate_cache.PARSE_CACHE_SIZE)
+
 def init_field(obj, data, key, required=False):
   if data.has_key(key):
     attribute = getattr(obj, key)
@@ -85,10 +108,36 @@ def sanitize(value):
   else:
     return str(value)
 
+def report_error(errors, message):
+  """
+  Report a validation error. Errors are raised immediately unless the caller
+  is collecting them.
+
+  Args:
+    errors  A list to which the error message should be appended, or None
+            if an APIDescriptionException should be raised instead
+    message The error message
+  """
+  if errors is None:
+    raise APIDescriptionException(message)
+  errors.append(message)
+
 class APIDescriptionException(Exception):
-  pass
+  """
+  Raised when an API description cannot be parsed or validated. When several
+  validation errors are detected in one pass, the errors attribute holds all
+  of their messages.
+  """
+
+  def __init__(self, message, errors=None):
+    Exception.__init__(self, message)
+    if errors is None:
+      errors = [ str(message) ]
+    self.errors = errors
+
+class Field(object):
+  __slots__ = ('name', 'description', 'type', 'optional')
 
-class Field:
   def __init__(self, data=None, name=None, type=None):
     self.name = None
     self.description = None
@@ -119,46 +168,107 @@ class Field:
     data[TYPE] = self.type.serialize()
     return data
 
-  def validate(self, types):
-    self.type.validate(types)
+  def validate(self, types, errors=None):
+    self.type.validate(types, errors)
 
 class TypeRef(object):
+  """
+  Base class for type references. Type references are immutable, and the
+  instances created by create_type_reference are shared by all the fields,
+  parameters and other elements that refer to the same type name.
+  """
+  __slots__ = ('__weakref__',)
+
   def get_reference_name(self):
     raise NotImplementedError
 
-  def validate(self, types):
+  def validate(self, types, errors=None):
     raise NotImplementedError
 
+  def __setattr__(self, name, value):
+    raise AttributeError('Type references are immutable')
+
+  def __delattr__(self, name):
+    raise AttributeError('Type references are immutable')
+
+  def __reduce__(self):
+    return create_type_reference, (self.get_reference_name(),)
+
+# Shared type reference instances keyed by type name. References are only
+# kept while some model object uses them, so that the type names of API
+# descriptions that are no longer in use do not accumulate.
+TYPE_REFERENCES = weakref.WeakValueDictionary()
+
 def create_type_reference(name):
-  try:
-    return PrimitiveTypeRef(name)
-  except Exception:
-    pass
+  """
+  Get the type reference for the specified type name. Type references are
+  interned, so that all the references to a given type name share the same
+  instance.
 
+  Args:
+    name  Name of the referenced type (e.g. 'string', 'list(Order)', 'Order')
+
+  Returns:
+    A PrimitiveTypeRef, ContainerTypeRef or CustomTypeRef instance
+  """
   try:
-    return ContainerTypeRef(name)
-  except Exception:
+    return TYPE_REFERENCES[name]
+  except KeyError:
     pass
 
-  return CustomTypeRef(name)
+  type_ref = find_type_reference(name)
+  if type_ref is None:
+    type_ref = CustomTypeRef(name)
+    TYPE_REFERENCES[name] = type_ref
+  return type_ref
+
+def find_type_reference(name):
+  """
+  Look up the primitive or container type reference for the specified type
+  name. Unlike create_type_reference, this function does not fall back to
+  custom type references and it does not rely on exception handling to
+  classify the input name.
+
+  Args:
+    name  Name of the referenced type (e.g. 'string', 'list(Order)')
+
+  Returns:
+    A PrimitiveTypeRef or a ContainerTypeRef instance, or None if the name
+    does not refer to a primitive or container type
+  """
+  type_ref = TYPE_REFERENCES.get(name)
+  if type_ref is None:
+    index = name.find('(')
+    if name in PrimitiveTypeRef.PRIMITIVES:
+      type_ref = PrimitiveTypeRef(name)
+    elif index != -1 and name[0 : index] in ContainerTypeRef.CONTAINERS:
+      type_ref = ContainerTypeRef(name)
+    else:
+      return None
+    TYPE_REFERENCES[name] = type_ref
+  elif isinstance(type_ref, CustomTypeRef):
+    return None
+  return type_ref
 
 class PrimitiveTypeRef(TypeRef):
+  __slots__ = ('name',)
   PRIMITIVES = ( 'short', 'int', 'long', 'string', 'boolean',
                 'double', 'byte', 'binary', 'href' )
 
   def __init__(self, name):
     if name in self.PRIMITIVES:
-      self.name = name
+      object.__setattr__(self, 'name', name)
     else:
       raise APIDescriptionException('Invalid primitive type name: ' + name)
 
   def get_reference_name(self):
     return self.name
 
-  def validate(self, types):
+  def validate(self, types, errors=None):
     pass
 
 class ContainerTypeRef(TypeRef):
+  __slots__ = ('container', 'type')
   CONTAINERS = ( 'list', 'set' )
 
   def __init__(self, name):
@@ -166,34 +276,112 @@ class ContainerTypeRef(TypeRef):
     container = name[0 : index]
     type = name[index + 1 : -1]
     if container in self.CONTAINERS:
-      self.container = container
-      self.type = create_type_reference(type)
+      object.__setattr__(self, 'container', container)
+      object.__setattr__(self, 'type', create_type_reference(type))
     else:
       raise APIDescriptionException('Invalid container type: ' + container)
 
-  def validate(self, types):
-    self.type.validate(types)
+  def validate(self, types, errors=None):
+    self.type.validate(types, errors)
 
   def get_reference_name(self):
     return self.container + '(' + self.type.get_reference_name() + ')'
 
 class CustomTypeRef(TypeRef):
+  __slots__ = ('name',)
+
   def __init__(self, name):
-    self.name = name
+    object.__setattr__(self, 'name', name)
 
   def get_reference_name(self):
     return self.name
 
-  def validate(self, types):
-    if self.name == '_API_' or self.name == '_NONE_':
+  def validate(self, types, errors=None):
+    if self.name == '_API_' or self.name == '_NONE_' or self.name in types:
       return
-    for type in types:
-      if type == self.name:
-        return
-    raise APIDescriptionException('Reference to unknown data type: ' + self.name)
+    report_error(errors, 'Reference to unknown data type: ' + self.name)
+
+class TrackedList(list):
+  """
+  A list which counts the modifications made to it through the standard list
+  operations in its version attribute, so that values computed from the list
+  can be recognized as stale.
+  """
+
+  def __init__(self, items=()):
+    list.__init__(self, items)
+    self.version = 0
+
+  def invalidate(self):
+    self.version += 1
+
+  def append(self, item):
+    list.append(self, item)
+    self.invalidate()
+
+  def extend(self, items):
+    list.extend(self, items)
+    self.invalidate()
+
+  def insert(self, i, item):
+    list.insert(self, i, item)
+    self.invalidate()
+
+  def remove(self, item):
+    list.remove(self, item)
+    self.invalidate()
+
+  def pop(self, *args):
+    item = list.pop(self, *args)
+    self.invalidate()
+    return item
+
+  def reverse(self):
+    list.reverse(self)
+    self.invalidate()
+
+  def sort(self, *args, **kwargs):
+    list.sort(self, *args, **kwargs)
+    self.invalidate()
+
+  def __setitem__(self, i, item):
+    list.__setitem__(self, i, item)
+    self.invalidate()
+
+  def __delitem__(self, i):
+    list.__delitem__(self, i)
+    self.invalidate()
+
+  def __setslice__(self, i, j, items):
+    list.__setslice__(self, i, j, items)
+    self.invalidate()
+
+  def __delslice__(self, i, j):
+    list.__delslice__(self, i, j)
+    self.invalidate()
+
+  def __iadd__(self, items):
+    self.extend(items)
+    return self
+
+  def __imul__(self, n):
+    list.__imul__(self, n)
+    self.invalidate()
+    return self
 
 class TypeDef(object):
+  """
+  A type definition. The fields and constraints of a type are held in
+  TrackedList instances, and the version attribute changes whenever either
+  list is modified or replaced, so that the conditions memoized by
+  operations can be recognized as stale (See Operation.get_pre_conditions).
+  Modifying a Field object in place is not detected.
+  """
+
+  __slots__ = ('__fields', '__constraints', '__assignments', 'description')
+
   def __init__(self, data=None, fields=None):
+    self.__assignments = 0
     self.fields = []
     self.constraints = []
     self.description = None
@@ -217,6 +405,34 @@ class TypeDef(object):
       else:
         self.fields = fields
 
+  def __get_fields(self):
+    return self.__fields
+
+  def __set_fields(self, fields):
+    if not isinstance(fields, TrackedList):
+      fields = TrackedList(fields)
+    self.__fields = fields
+    self.__assignments += 1
+
+  fields = property(__get_fields, __set_fields)
+
+  def __get_constraints(self):
+    return self.__constraints
+
+  def __set_constraints(self, constraints):
+    if not isinstance(constraints, TrackedList):
+      constraints = TrackedList(constraints)
+    self.__constraints = constraints
+    self.__assignments += 1
+
+  constraints = property(__get_constraints, __set_constraints)
+
+  def __get_version(self):
+    return (self.__assignments, self.__fields.version,
+            self.__constraints.version)
+
+  version = property(__get_version)
+
   def get_constraints(self, api):
     constraints = []
     constraints.extend(self.constraints)
@@ -235,16 +451,18 @@ class TypeDef(object):
         data[CONSTRAINTS].append(constraint)
     return data
 
-  def validate(self, types):
-    field_names = []
+  def validate(self, types, errors=None):
+    field_names = set()
     for field in self.fields:
-      field.validate(types)
+      field.validate(types, errors)
       if field.name not in field_names:
-        field_names.append(field.name)
+        field_names.add(field.name)
       else:
-        raise APIDescriptionException('Duplicate field ' + field.name + ' in type')
+        report_error(errors, 'Duplicate field ' + field.name + ' in type')
 
 class NamedTypeDef(TypeDef):
+  __slots__ = ('name',)
+
   def __init__(self, data=None, name=None, fields=None):
     if data is not None:
       if name is not None or fields is not None:
@@ -268,7 +486,174 @@ class NamedTypeDef(TypeDef):
       data[k] = v
     return data
 
-class DataType:
+class TypeList(TrackedList):
+  """
+  A list of NamedTypeDef objects which maintains an index of its members keyed
+  by type name. The index is built on demand, and it is discarded whenever the
+  list is modified through one of the standard list operations, which also
+  changes the version of the list. Renaming a type already in the list is not
+  detected automatically - call invalidate() after doing so.
+  """
+
+  def __init__(self, types=()):
+    TrackedList.__init__(self, types)
+    self.type_index = None
+
+  def find(self, name):
+    """
+    Find the type definition with the specified name.
+
+    Args:
+      name  Name of the type definition
+
+    Returns:
+      A NamedTypeDef instance or None if no such type is defined. If multiple
+      types have the same name, the one that appears first in the list is
+      returned.
+    """
+    if self.type_index is None:
+      self.reindex()
+    return self.type_index.get(name)
+
+  def reindex(self):
+    index = {}
+    for data_type in self:
+      if data_type.name not in index:
+        index[data_type.name] = data_type
+    self.type_index = index
+
+  def invalidate(self):
+    self.type_index = None
+    TrackedList.invalidate(self)
+
+class LazyList(list):
+  """
+  A list which holds its items in their raw dictionary form, and converts
+  each item into a model object the first time it is accessed. Conversion is
+  performed by a factory function, which receives the raw dictionary and
+  returns the corresponding model object. Items added to the list after it
+  has been created should be model objects. The list operations which read
+  items (including iteration, slicing, concatenation, searching and
+  copy.copy) convert the items they return or compare.
+  """
+
+  def __init__(self, items, factory):
+    list.__init__(self, items)
+    self.factory = factory
+
+  def promote(self, i):
+    """
+    Convert the item at the specified position into a model object, unless
+    it has already been converted.
+
+    Args:
+      i Non-negative position of the item in the list
+
+    Returns:
+      The model object at the specified position
+    """
+    item = list.__getitem__(self, i)
+    if isinstance(item, dict):
+      item = self.factory(item)
+      list.__setitem__(self, i, item)
+    return item
+
+  def is_loaded(self, i):
+    return not isinstance(list.__getitem__(self, i), dict)
+
+  def __getitem__(self, i):
+    if isinstance(i, slice):
+      return [ self.promote(j) for j in xrange(*i.indices(len(self))) ]
+    if i < 0:
+      i += len(self)
+    if i < 0:
+      raise IndexError('list index out of range')
+    return self.promote(i)
+
+  def __getslice__(self, i, j):
+    return self.__getitem__(slice(i, j))
+
+  def __iter__(self):
+    for i in xrange(len(self)):
+      yield self.promote(i)
+
+  def __contains__(self, item):
+    for member in self:
+      if member == item:
+        return True
+    return False
+
+  def __reversed__(self):
+    for i in reversed(xrange(len(self))):
+      yield self.promote(i)
+
+  def __add__(self, other):
+    return self[:] + other
+
+  def __copy__(self):
+    copy = type(self).__new__(type(self))
+    copy.__dict__.update(self.__dict__)
+    list.extend(copy, self[:])
+    return copy
+
+  def index(self, item, start=0, stop=None):
+    for i in xrange(*slice(start, stop).indices(len(self))):
+      if self.promote(i) == item:
+        return i
+    raise ValueError('%r is not in list' % (item,))
+
+  def count(self, item):
+    count = 0
+    for member in self:
+      if member == item:
+        count += 1
+    return count
+
+  def remove(self, item):
+    del self[self.index(item)]
+
+  def pop(self, *args):
+    if args:
+      self.__getitem__(args[0])
+    elif len(self):
+      self.promote(len(self) - 1)
+    return super(LazyList, self).pop(*args)
+
+class LazyTypeList(LazyList, TypeList):
+  """
+  A TypeList which holds its type definitions in their raw dictionary form
+  until they are accessed. The name index is built from the raw dictionaries,
+  so that looking up a type by name only converts that particular type.
+  """
+
+  def __init__(self, types, factory):
+    LazyList.__init__(self, types, factory)
+    self.type_index = None
+    self.version = 0
+
+  def find(self, name):
+    if self.type_index is None:
+      self.reindex()
+    i = self.type_index.get(name)
+    if i is None:
+      return None
+    return self.promote(i)
+
+  def reindex(self):
+    index = {}
+    for i in xrange(len(self)):
+      data_type = list.__getitem__(self, i)
+      if isinstance(data_type, dict):
+        name = data_type[NAME]
+      else:
+        name = data_type.name
+      if name not in index:
+        index[name] = i
+    self.type_index = index
+
+class DataType(object):
+  __slots__ = ('type', 'ref')
+
   def __init__(self, data):
     type_value = data[TYPE]
     self.ref = None
@@ -288,12 +673,14 @@ class DataType:
   def isHref(self):
     return isinstance(self.type, PrimitiveTypeRef) and self.type.get_reference_name() == 'href'
 
-  def validate(self, types):
-    self.type.validate(types)
+  def validate(self, types, errors=None):
+    self.type.validate(types, errors)
     if self.ref is not None and not self.isHref():
-      raise APIDescriptionException('Invalid reference to: ' + self.ref + ' from non href type')
+      report_error(errors, 'Invalid reference to: ' + self.ref + ' from non href type')
 
 class InputBinding(object):
+  __slots__ = ('mode', 'name', 'type')
+
   def __init__(self, data=None, mode=None, name=None, type=None):
     self.mode = None
     self.name = None
@@ -315,10 +702,12 @@ class InputBinding(object):
         self.name = name
         self.type = type
 
-  def validate(self, types):
-    self.type.validate(types)
+  def validate(self, types, errors=None):
+    self.type.validate(types, errors)
 
 class NamedInputBinding(InputBinding):
+  __slots__ = ('id',)
+
   def __init__(self, data=None, id=None, mode=None, name=None, type=None):
     InputBinding.__init__(self, data, mode, name, type)
     self.id = None
@@ -335,7 +724,9 @@ class NamedInputBinding(InputBinding):
       (TYPE, self.type.serialize())
     ])
 
-class Parameter:
+class Parameter(object):
+  __slots__ = ('binding', 'optional', 'description')
+
   def __init__(self, data=None, binding=None):
     self.binding = None
     self.optional = False
@@ -372,16 +763,15 @@ class Parameter:
       data[OPTIONAL] = True
     return data
 
-  def validate(self, types, bindings):
+  def validate(self, types, bindings, errors=None):
     if isinstance(self.binding, InputBinding):
-      self.binding.validate(types)
-    else:
-      for binding in bindings:
-        if binding == self.binding:
-          return
-      raise APIDescriptionException('Reference to unknown binding: ' + self.binding)
+      self.binding.validate(types, errors)
+    elif self.binding not in bindings:
+      report_error(errors, 'Reference to unknown binding: ' + self.binding)
+
+class Input(object):
+  __slots__ = ('contentType', 'type', 'params', 'description')
 
-class Input:
   def __init__(self, data=None, content_type=None, type=None):
     self.contentType = []
     self.type = None
@@ -422,13 +812,15 @@ class Input:
     serialize_field(self, data, DESCRIPTION)
     return data
 
-  def validate(self, types, bindings):
+  def validate(self, types, bindings, errors=None):
     if self.type:
-      self.type.validate(types)
+      self.type.validate(types, errors)
     for param in self.params:
-      param.validate(types, bindings)
+      param.validate(types, bindings, errors)
+
+class Header(object):
+  __slots__ = ('name', 'description', 'type')
 
-class Header:
   def __init__(self, data=None, name=None, type=None):
     self.name = None
     self.description = None
@@ -457,7 +849,9 @@ class Header:
       data[REF] = self.type.ref
     return data
 
-class Output:
+class Output(object):
+  __slots__ = ('status', 'contentType', 'type', 'headers', 'description')
+
   def __init__(self, data=None, status=None, content_type=None, type=None):
     self.status = -1
     self.contentType = []
@@ -498,11 +892,14 @@ class Output:
         data[HEADERS].append(header.serialize())
     return data
 
-  def validate(self, types):
+  def validate(self, types, errors=None):
     if self.type:
-      self.type.validate(types)
+      self.type.validate(types, errors)
+
+class Operation(object):
+  __slots__ = ('name', 'method', 'input', 'output', 'errors', 'description',
+               'requires', 'ensures', '__pre_conditions', '__post_conditions')
 
-class Operation:
   def __init__(self, data=None, name=None, method=None):
     self.name = None
     self.method = None
@@ -512,6 +909,8 @@ class Operation:
     self.description = None
     self.requires = []
     self.ensures = []
+    self.__pre_conditions = None
+    self.__post_conditions = None
     if data is not None:
       if name is not None or method is not None:
         raise APIDescriptionException('name and method attributes must be None '
@@ -525,7 +924,10 @@ class Operation:
         if data.has_key(OUTPUT):
           self.output = Output(data=data[OUTPUT])
         if data.has_key(ERRORS):
-          for error in data[ERRORS]:
+          # Insert the errors in status order, so that the iteration order of
+          # the dictionary does not depend on how the description was written
+          # (or on how it was restored from the API cache).
+          for error in sorted(data[ERRORS], key=lambda e: int(e[STATUS])):
             self.errors[int(error[STATUS])] = sanitize(error[CAUSE])
         if data.has_key(REQUIRES):
           for condition in data[REQUIRES]:
@@ -542,34 +944,102 @@ class Operation:
         self.method = method
 
   def get_pre_conditions(self, api):
-    conditions = []
-    conditions.extend(self.requires)
+    """
+    Get the pre-conditions of this operation: the requires conditions along
+    with the constraints of the input type (and of the types it refers to).
+    The result is memoized until the requires list, the input type, the
+    data_types list of the API or any of the type definitions involved
+    changes (See TypeList and TypeDef).
+
+    Args:
+      api The API to which this operation belongs
+
+    Returns:
+      A list of predicate strings
+    """
+    data_type = None
     if self.input and self.input.type:
       data_type = self.input.type.type
-      conditions.extend(self.__get_type_constraints(data_type, api, 'input'))
-    return conditions
+    memo = self.__pre_conditions
+    if not self.__is_current(memo, api, self.requires, data_type):
+      memo = self.__get_conditions(api, self.requires, data_type, 'input')
+      self.__pre_conditions = memo
+    return list(memo[-1])
 
   def get_post_conditions(self, api):
-    conditions = []
-    conditions.extend(self.ensures)
+    """
+    Get the post-conditions of this operation: the ensures conditions along
+    with the constraints of the output type (and of the types it refers to).
+    The result is memoized in the same manner as get_pre_conditions.
+
+    Args:
+      api The API to which this operation belongs
+
+    Returns:
+      A list of predicate strings
+    """
+    data_type = None
     if self.output.type:
       data_type = self.output.type.type
-      conditions.extend(self.__get_type_constraints(data_type, api, 'output'))
-    return conditions
+    memo = self.__post_conditions
+    if not self.__is_current(memo, api, self.ensures, data_type):
+      memo = self.__get_conditions(api, self.ensures, data_type, 'output')
+      self.__post_conditions = memo
+    return list(memo[-1])
+
+  def invalidate_conditions(self):
+    """
+    Discard the memoized pre- and post-conditions of this operation.
+    """
+    self.__pre_conditions = None
+    self.__post_conditions = None
 
-  def __get_type_constraints(self, type, api, context):
+  def __get_conditions(self, api, conditions, data_type, context):
+    """
+    Returns:
+      A memo of the conditions: the API, its data_types list and the version
+      of the list, the conditions and the type they were computed from, the
+      (type definition, version) pairs of the types involved and the
+      resulting list of predicate strings
+    """
+    types = api.data_types
+    result = []
+    result.extend(conditions)
+    dependencies = []
+    if data_type is not None:
+      result.extend(self.__get_type_constraints(data_type, api, context,
+                                                dependencies))
+    return (api, types, types.version, tuple(conditions), data_type,
+            dependencies, result)
+
+  def __is_current(self, memo, api, conditions, data_type):
+    if memo is None:
+      return False
+    types = api.data_types
+    if memo[0] is not api or memo[1] is not types or \
+        memo[2] != types.version or memo[4] is not data_type or \
+        memo[3] != tuple(conditions):
+      return False
+    for type_def, version in memo[5]:
+      if type_def.version != version:
+        return False
+    return True
+
+  def __get_type_constraints(self, type, api, context, dependencies):
     constraints = []
     if isinstance(type, TypeDef):
+      dependencies.append((type, type.version))
       constraints.extend(type.constraints)
       for field in type.fields:
         field_constraints = self.__get_type_constraints(field.type.type, api,
-          context + '.' + field.name)
+          context + '.' + field.name, dependencies)
         for constraint in field_constraints:
           constraints.append(self.__change_context(constraint, 'self',
             'self.' + field.name))
     elif isinstance(type, CustomTypeRef):
       type_def = api.get_type_by_name(type.get_reference_name())
-      for constraint in self.__get_type_constraints(type_def, api, context):
+      for constraint in self.__get_type_constraints(type_def, api, context,
+                                                    dependencies):
         constraints.append(self.__change_context(constraint, 'self', context))
     elif isinstance(type, ContainerTypeRef):
       child_type = type.type
@@ -579,14 +1049,20 @@ class Operation:
         variable =  '_' + context.replace('.','_')
       else:
         variable = '_item'
-      for constraint in self.__get_type_constraints(child_type, api, variable):
+      for constraint in self.__get_type_constraints(child_type, api, variable,
+                                                    dependencies):
         constraints.append('forall(' + variable + ', ' + context +
                            ', ' + constraint + ')')
     return constraints
 
   def __change_context(self, string, old, new):
-    changer = ContextChanger()
-    return changer.change_context(string, old, new)
+    key = (string, old, new)
+    result = CONTEXT_CACHE.get(key)
+    if result is None:
+      changer = ContextChanger()
+      result = changer.change_context(string, old, new)
+      CONTEXT_CACHE.put(key, result)
+    return result
 
   def serialize(self):
     data = OrderedDict([
@@ -616,19 +1092,38 @@ class Operation:
         data[ENSURES].append(condition)
     return data
 
-  def validate(self, types, bindings):
+  def __getstate__(self):
+    # Memoized conditions refer to the API object, and are not saved
+    state = {}
+    for slot in self.__slots__:
+      if not slot.startswith('__'):
+        state[slot] = getattr(self, slot)
+    return state
+
+  def __setstate__(self, state):
+    for slot, value in state.items():
+      setattr(self, slot, value)
+    self.errors = dict(sorted(self.errors.items()))
+    self.__pre_conditions = None
+    self.__post_conditions = None
+
+  def validate(self, types, bindings, errors=None):
     if self.method == 'POST' or self.method == 'PUT':
       if not self.input:
-        raise APIDescriptionException('input field undefined for entity enclosing request')
+        report_error(errors, 'input field undefined for entity enclosing request')
     if self.input:
-      self.input.validate(types, bindings)
-    self.output.validate(types)
-    for condition in self.requires:
-      ast.parse(condition, mode='eval')
-    for condition in self.ensures:
-      ast.parse(condition, mode='eval')
-
-class Resource:
+      self.input.validate(types, bindings, errors)
+    self.output.validate(types, errors)
+    for condition in self.requires + self.ensures:
+      try:
+        predicate_cache.parse(condition, copy=False)
+      except SyntaxError as e:
+        report_error(errors, 'Invalid condition in operation ' + self.name +
+                             ': ' + condition + ' (' + str(e) + ')')
+
+class Resource(object):
+  __slots__ = ('name', 'path', 'input_bindings', 'operations')
+
   def __init__(self, data=None, name=None, path=None):
     self.name = None
     self.path = None
@@ -675,21 +1170,65 @@ class Resource:
         return binding
     return None
 
-  def validate(self, types):
-    binding_names = []
+  def validate(self, types, errors=None):
+    binding_names = set()
     for binding in self.input_bindings:
-      binding.validate(types)
-      binding_names.append(binding.id)
-    op_names = []
+      binding.validate(types, errors)
+      binding_names.add(binding.id)
+    op_names = set()
     for operation in self.operations:
-      operation.validate(types, binding_names)
+      operation.validate(types, binding_names, errors)
       if operation.name in op_names:
-        raise APIDescriptionException('Duplication operation ' + operation.name +
-                                      ' in resource ' + self.name)
+        report_error(errors, 'Duplication operation ' + operation.name +
+                             ' in resource ' + self.name)
       else:
-        op_names.append(operation.name)
+        op_names.add(operation.name)
+
+class LazyResource(Resource):
+  """
+  A Resource whose operations are kept in their raw dictionary form until
+  they are accessed. Input bindings and the uniqueness of operation names are
+  validated when the resource is created. Each operation is validated when it
+  is first accessed.
+  """
+  __slots__ = ('types', 'binding_names')
+
+  def __init__(self, data, types):
+    """
+    Create a new LazyResource instance.
+
+    Args:
+      data  A dictionary containing all the required resource attributes
+      types Collection of the names of all the types defined in the API
+    """
+    attributes = dict(data)
+    operations = attributes.pop(OPERATIONS, None)
+    if operations is None:
+      raise APIDescriptionException('Attribute ' + OPERATIONS + ' is required')
+    attributes[OPERATIONS] = []
+    Resource.__init__(self, data=attributes)
+    self.types = types
+    self.binding_names = set()
+    for binding in self.input_bindings:
+      binding.validate(types)
+      self.binding_names.add(binding.id)
+    op_names = set()
+    for operation in operations:
+      name = operation.get(NAME)
+      if name in op_names:
+        raise APIDescriptionException('Duplication operation ' + name +
+                                      ' in resource ' + self.name)
+      op_names.add(name)
+    self.operations = LazyList(operations, self.__load_operation)
+
+  def __load_operation(self, data):
+    operation = Operation(data=data)
+    operation.validate(self.types, self.binding_names)
+    return operation
+
+class Owner(object):
+  __slots__ = ('name', 'email', 'ownerType')
 
-class Owner:
   def __init__(self, data=None, name=None, email=None, type=None):
     self.name = None
     self.email = None
@@ -718,7 +1257,9 @@ class Owner:
       ('ownerType', self.ownerType)
     ])
 
-class CostModel:
+class CostModel(object):
+  __slots__ = ('currency', 'unitPrice', 'requestsPerUnit')
+
   def __init__(self, data=None, currency=None, unit_price=None, requests=None):
     self.currency = None
     self.unitPrice = 0.0
@@ -749,7 +1290,10 @@ class CostModel:
       (REQUESTS_PER_UNIT, self.requestsPerUnit)
     ])
 
-class SLADef:
+class SLADef(object):
+  __slots__ = ('name', 'description', 'availability', 'rateLimit', 'timeUnit',
+               'costModel')
+
   def __init__(self, data=None, name=None):
     self.name = None
     self.description = None
@@ -791,7 +1335,9 @@ class SLADef:
       data[COST_MODEL] = self.costModel.serialize()
     return data
 
-class Version:
+class Version(object):
+  __slots__ = ('id', 'strategy')
+
   def __init__(self, data=None, id=None):
     self.id = None
     self.strategy = None
@@ -816,14 +1362,18 @@ class Version:
     serialize_field(self, data, STRATEGY)
     return data
 
-class API:
+class API(object):
   """
   Represents an API description at the runtime. Encapsulates all the major
   attributes of an API description including name, resources, data types and
   other non-functional properties.
+
+  Data type definitions are held in a TypeList, which indexes them by name.
+  Assigning a new sequence to the data_types attribute wraps it in a new
+  TypeList, so that get_type_by_name always consults an up-to-date index.
   """
 
-  def __init__(self, data=None, name=None):
+  def __init__(self, data=None, name=None, validate=True):
     """
     Creates a new API instance using the provided input data. This constructor
     takes two different arguments, but only one of them should be provided
@@ -834,6 +1384,8 @@ class API:
     Args:
       data  A dictionary containing all the required API attributes
       name  Name of the API
+      validate  Whether to validate an API instance created from input data
+                (Set to False when resources or types will be added later)
     """
     self.name = None
     self.base = []
@@ -841,6 +1393,7 @@ class API:
     self.version = None
     self.resources = []
     self.data_types = []
+    self.__type_refs = {}
     self.ownership = []
     self.sla = []
     self.license = None
@@ -867,6 +1420,7 @@ class API:
         if data.has_key(DATA_TYPES):
           for data_type in data[DATA_TYPES]:
             self.data_types.append(NamedTypeDef(data=data_type))
+          self.data_types.reindex()
         if data.has_key(OWNERSHIP):
           for owner in data[OWNERSHIP]:
             self.ownership.append(Owner(data=owner))
@@ -875,7 +1429,8 @@ class API:
             self.sla.append(SLADef(data=sla))
         if data.has_key(VERSION):
           self.version = Version(data=data[VERSION])
-        self.validate()
+        if validate:
+          self.validate()
     else:
       if name is None:
         raise APIDescriptionException('name attribute must not be None when '
@@ -883,26 +1438,57 @@ class API:
       else:
         self.name = name
 
+  def __get_data_types(self):
+    return self.__data_types
+
+  def __set_data_types(self, data_types):
+    if not isinstance(data_types, TypeList):
+      data_types = TypeList(data_types)
+    self.__data_types = data_types
+
+  data_types = property(__get_data_types, __set_data_types)
+
   def get_type_by_name(self, name):
-    for data_type in self.data_types:
-      if data_type.name == name:
-        return data_type
+    """
+    Resolve the specified type name. Named type definitions are looked up in
+    the name index of the data_types list. Primitive and container type
+    references (and the special _API_ type) are created once per name and
+    cached for subsequent lookups. Names that cannot be resolved are not
+    cached, so looking up arbitrary names does not grow the cache.
 
-    try:
-      data_type = PrimitiveTypeRef(name)
+    Args:
+      name  Name of the type to be resolved
+
+    Returns:
+      A NamedTypeDef, PrimitiveTypeRef or ContainerTypeRef instance, or None
+      if the name cannot be resolved
+    """
+    data_type = self.data_types.find(name)
+    if data_type is not None:
       return data_type
-    except Exception:
-      pass
 
     try:
-      data_type = ContainerTypeRef(name)
-      return data_type
-    except Exception:
+      return self.__type_refs[name]
+    except KeyError:
       pass
 
-    if name == '_API_':
-      return NamedTypeDef(name='_API_', fields=[])
-    return None
+    data_type = find_type_reference(name)
+    if data_type is None and name == '_API_':
+      data_type = NamedTypeDef(name='_API_', fields=[])
+    if data_type is not None:
+      self.__type_refs[name] = data_type
+    return data_type
+
+  def precompute_conditions(self):
+    """
+    Compute and memoize the pre- and post-conditions of all the operations
+    in this API, so that subsequent calls to get_pre_conditions and
+    get_post_conditions (e.g. when comparing operations) are cheap.
+    """
+    for resource in self.resources:
+      for operation in resource.operations:
+        operation.get_pre_conditions(self)
+        operation.get_post_conditions(self)
 
   def serialize(self):
     data = OrderedDict([
@@ -933,26 +1519,157 @@ class API:
       data[VERSION] = self.version.serialize()
     return data
 
-  def validate(self):
-    type_names = []
+  def validate(self, parallel=False, processes=None):
+    """
+    Validate the API description. All the data types and resources are
+    checked in a single pass, and all the detected errors are reported
+    together.
+
+    Args:
+      parallel  Validate the data types and resources in a pool of worker
+                processes. Errors are reported in the same order as in a
+                serial validation. Small descriptions (See
+                PARALLEL_VALIDATION_THRESHOLD) are always validated serially.
+      processes Number of worker processes (defaults to the CPU count)
+
+    Raises:
+      APIDescriptionException If the description contains errors. The errors
+                              attribute of the exception lists all of them.
+    """
+    errors = []
+    type_names = set()
     for type in self.data_types:
       if type.name not in type_names:
-        type_names.append(type.name)
+        type_names.add(type.name)
       else:
-        raise APIDescriptionException('Duplicate type definitions for ' + type.name)
-    for type in self.data_types:
-      type.validate(type_names)
-    for resource in self.resources:
-      resource.validate(type_names)
+        errors.append('Duplicate type definitions for ' + type.name)
+
+    if processes is None and parallel:
+      processes = multiprocessing.cpu_count()
+    size = len(self.data_types) + len(self.resources)
+    if parallel and processes > 1 and size >= PARALLEL_VALIDATION_THRESHOLD:
+      errors.extend(self.__validate_parallel(type_names, processes))
+    else:
+      for type in self.data_types:
+        type.validate(type_names, errors)
+      for resource in self.resources:
+        resource.validate(type_names, errors)
+    if len(errors) == 1:
+      raise APIDescriptionException(errors[0])
+    elif errors:
+      raise APIDescriptionException('Found ' + str(len(errors)) + ' errors in '
+                                    'the API description:\n  ' +
+                                    '\n  '.join(errors), errors)
+
+  def __validate_parallel(self, type_names, processes):
+    shards = []
+    shard_size = max(len(self.data_types) + len(self.resources), 1)
+    shard_size = shard_size / (processes * SHARDS_PER_PROCESS) + 1
+    for key, items in ((DATA_TYPES, self.data_types),
+                       (RESOURCES, self.resources)):
+      for start in range(0, len(items), shard_size):
+        shards.append((key, start, start + shard_size))
+
+    # The worker processes get the API object through the pool initializer,
+    # so only the shard boundaries and the error messages are sent between
+    # processes.
+    pool = multiprocessing.Pool(processes, init_validation_worker,
+                                (self, type_names))
+    try:
+      results = pool.map(validate_shard, shards, chunksize=1)
+    finally:
+      pool.terminate()
+      pool.join()
+    errors = []
+    for result in results:
+      errors.extend(result)
+    return errors
 
   def serialize_json(self):
     return json.dumps(self.serialize(), indent=4, separators=(',', ': '))
 
+# State of a parallel validation worker process (See API.validate)
+VALIDATION_API = None
+VALIDATION_TYPE_NAMES = None
+
+def init_validation_worker(api, type_names):
+  global VALIDATION_API, VALIDATION_TYPE_NAMES
+  VALIDATION_API = api
+  VALIDATION_TYPE_NAMES = type_names
+
+def validate_shard(shard):
+  """
+  Validate a range of data types or resources of the API object held by a
+  parallel validation worker process.
+
+  Args:
+    shard A tuple containing the key of the validated list (DATA_TYPES or
+          RESOURCES), and the start and end indices of the range
+
+  Returns:
+    A list of error messages
+  """
+  key, start, end = shard
+  if key == DATA_TYPES:
+    items = VALIDATION_API.data_types
+  else:
+    items = VALIDATION_API.resources
+  errors = []
+  for item in items[start:end]:
+    item.validate(VALIDATION_TYPE_NAMES, errors)
+  return errors
+
+class LazyAPI(API):
+  """
+  An API whose resources, operations and data types are kept in their raw
+  dictionary form, and converted into model objects when they are first
+  accessed. Validation is deferred in the same manner: a data type is
+  validated when it is converted, and a resource is validated when it is
+  converted (input bindings and operation names) and as each of its
+  operations is converted. Only the uniqueness of data type names is
+  checked up front.
+
+  Use this variant when only a small part of a large API description is
+  needed. Iterating over all the resources and operations converts and
+  validates them all, just like the API class does at construction.
+  """
+
+  def __init__(self, data):
+    """
+    Create a new LazyAPI instance.
+
+    Args:
+      data  A dictionary containing all the required API attributes
+    """
+    attributes = dict(data)
+    resources = attributes.pop(RESOURCES, [])
+    data_types = attributes.pop(DATA_TYPES, [])
+    API.__init__(self, data=attributes, validate=False)
+
+    self.type_names = set()
+    for data_type in data_types:
+      if not data_type.has_key(NAME):
+        raise APIDescriptionException('Attribute ' + NAME + ' is required')
+      name = data_type[NAME]
+      if name in self.type_names:
+        raise APIDescriptionException('Duplicate type definitions for ' + name)
+      self.type_names.add(name)
+    self.resources = LazyList(resources, self.__load_resource)
+    self.data_types = LazyTypeList(data_types, self.__load_type)
+
+  def __load_resource(self, data):
+    return LazyResource(data, self.type_names)
+
+  def __load_type(self, data):
+    data_type = NamedTypeDef(data=data)
+    data_type.validate(self.type_names)
+    return data_type
+
 class ContextChanger(ast.NodeTransformer):
   def change_context(self, string, old, new):
     self.old = old
     self.new = new
-    tree = ast.parse(string, mode='eval')
+    tree = predicate_cache.parse(string)
     self.visit(tree)
     return ast2code.to_source(tree)
 
@@ -962,12 +1679,40 @@ class ContextChanger(ast.NodeTransformer):
     else:
       return node
 
-def parse(path):
+def load_stream(fp, chunk_size=jsonstream.CHUNK_SIZE, parallel=False):
   """
-  Parse and validate the specified API description file.
+  Incrementally parse and validate an API description read from the given
+  file-like object. Items of the resources and dataTypes arrays are turned
+  into Resource and NamedTypeDef objects as soon as they have been read, so
+  that the raw JSON representation of the whole description is never held in
+  memory at once.
 
   Args:
-    path  Path to the API description file
+    fp  A file-like object containing a JSON API description
+    chunk_size  Number of bytes to read from the input at a time
+    parallel  Validate the description in a pool of worker processes
+
+  Returns:
+    An instance of the API class.
+  """
+  resources = []
+  data_types = []
+  reader = jsonstream.JSONStreamReader(fp, chunk_size)
+  data = reader.read_object({
+    RESOURCES : lambda item: resources.append(Resource(data=item)),
+    DATA_TYPES : lambda item: data_types.append(NamedTypeDef(data=item))
+  })
+  api = API(data, validate=False)
+  api.resources.extend(resources)
+  api.data_types.extend(data_types)
+  api.data_types.reindex()
+  api.validate(parallel)
+  return api
+
+def load(fp, streaming=False, lazy=False, parallel=False):
+  """
+  Parse and validate an API description read from the given file-like
+  object. See parse.
 
   Returns:
     An instance of the API class.
@@ -976,14 +1721,373 @@ def parse(path):
     APIDescriptionException If an error occurs while parsing or validating
                             the input API description
   """
+  if streaming and lazy:
+    raise APIDescriptionException('Streaming and lazy parse modes cannot be '
+                                  'used together')
+  if lazy and parallel:
+    raise APIDescriptionException('Parallel validation is not supported in '
+                                  'the lazy parse mode')
   try:
-    fp = open(path)
+    if streaming:
+      return load_stream(fp, parallel=parallel)
     data = json.load(fp)
-    fp.close()
-    return API(data)
+    if lazy:
+      return LazyAPI(data)
+    api = API(data, validate=False)
+    api.validate(parallel)
+    return api
   except APIDescriptionException as e:
     raise e
   except Exception as e:
     traceback.print_exc()
     raise APIDescriptionException(e)
 
+def parse(path, streaming=False, lazy=False, parallel=False):
+  """
+  Parse and validate the specified API description file.
+
+  Args:
+    path  Path to the API description file
+    streaming Parse the file incrementally (See load_stream). This keeps the
+              memory usage of very large API descriptions down.
+    lazy  Return a LazyAPI, which converts and validates the parts of the
+          description as they are accessed
+    parallel  Validate the description in a pool of worker processes (See
+              API.validate)
+
+  Returns:
+    An instance of the API class.
+
+  Raises:
+    APIDescriptionException If an error occurs while parsing or validating
+                            the input API description
+  """
+  try:
+    fp = open(path)
+  except IOError as e:
+    raise APIDescriptionException(e)
+  try:
+    return load(fp, streaming, lazy, parallel)
+  finally:
+    fp.close()
+
+def get_digest(path):
+  """
+  Compute the content hash of the specified file.
+
+  Args:
+    path  Path to the file
+
+  Returns:
+    SHA-1 digest of the file content as a hex string
+  """
+  sha1 = hashlib.sha1()
+  fp = open(path, 'rb')
+  try:
+    while True:
+      chunk = fp.read(jsonstream.CHUNK_SIZE)
+      if not chunk:
+        break
+      sha1.update(chunk)
+  finally:
+    fp.close()
+  return sha1.hexdigest()
+
+def get_cache_path(path, digest, cache_dir=None):
+  """
+  Get the location of the compiled cache file for an API description.
+
+  Args:
+    path  Path to the API description file
+    digest  Content hash of the API description file
+    cache_dir Directory in which cache files are kept. If not specified,
+              the cache file is stored alongside the API description file.
+
+  Returns:
+    Path to the cache file
+  """
+  if cache_dir is None:
+    return path + CACHE_SUFFIX
+  return os.path.join(cache_dir, digest + CACHE_SUFFIX)
+
+def get_slots(cls):
+  """
+  Returns:
+    Names of all the slots of the specified class and of its base classes,
+    with private names mangled
+  """
+  slots = []
+  for base in reversed(cls.__mro__):
+    for slot in base.__dict__.get('__slots__', ()):
+      if slot == '__weakref__':
+        continue
+      if slot.startswith('__'):
+        slot = '_' + base.__name__ + slot
+      slots.append(slot)
+  return tuple(slots)
+
+# Model classes which are saved in the compiled API cache, keyed by name.
+# Each entry holds the class, the slots that make up the state of its
+# instances and the slots which hold values derived from the rest of the
+# model, along with the values they are reset to when an object is restored.
+CACHED_CLASSES = dict((cls.__name__, (cls, get_slots(cls), ()))
+                      for cls in (Field, DataType, TypeDef, NamedTypeDef,
+                                  InputBinding, NamedInputBinding, Parameter,
+                                  Input, Header, Output, Resource, Owner,
+                                  CostModel, SLADef, Version))
+CACHED_CLASSES[Operation.__name__] = (Operation,
+  tuple([ slot for slot in get_slots(Operation)
+          if not slot.endswith('_conditions') ]),
+  (('_Operation__pre_conditions', None), ('_Operation__post_conditions', None)))
+# Lists of model objects which are saved in the compiled API cache
+CACHED_LISTS = { TrackedList.__name__ : TrackedList,
+                 TypeList.__name__ : TypeList }
+# Types of the values which are saved in the compiled API cache as they are
+PLAIN_TYPES = frozenset([ str, unicode, int, long, float, bool, type(None) ])
+# Attributes of API objects which are not saved in the compiled API cache,
+# along with the values they are reset to when an API object is restored
+TRANSIENT_API_ATTRIBUTES = { '_API__type_refs' : dict }
+
+def get_cache_state(value):
+  """
+  Convert an API object, or any part of it, into the state saved in the
+  compiled API cache. The state consists of built-in types only, so that it
+  can be written in the marshal format. Model objects are represented by
+  tuples which hold the name of the class followed by the values of the
+  slots of the object (See CACHED_CLASSES), and type references by their
+  reference names.
+
+  Args:
+    value A value of the API object model
+
+  Returns:
+    The state of the value (See restore_cache_state)
+
+  Raises:
+    ValueError  If the value contains objects that cannot be cached (e.g. the
+                raw items of a LazyAPI)
+  """
+  cls = type(value)
+  if cls in PLAIN_TYPES:
+    return value
+  elif cls is list:
+    return [ item if type(item) in PLAIN_TYPES else get_cache_state(item)
+             for item in value ]
+  elif cls is dict:
+    return dict([ (k, get_cache_state(v)) for k, v in value.iteritems() ])
+
+  entry = CACHED_CLASSES.get(cls.__name__)
+  if entry is not None and entry[0] is cls:
+    state = [ cls.__name__ ]
+    for slot in entry[1]:
+      attribute = getattr(value, slot)
+      if type(attribute) not in PLAIN_TYPES:
+        attribute = get_cache_state(attribute)
+      state.append(attribute)
+    return tuple(state)
+  elif isinstance(value, TypeRef):
+    return (TypeRef.__name__, value.get_reference_name())
+  elif CACHED_LISTS.get(cls.__name__) is cls:
+    return (cls.__name__, get_cache_state(list(value)))
+  elif cls is API:
+    attributes = {}
+    for name, attribute in value.__dict__.iteritems():
+      if not TRANSIENT_API_ATTRIBUTES.has_key(name):
+        attributes[name] = get_cache_state(attribute)
+    return (cls.__name__, attributes)
+  raise ValueError('Cannot cache instances of ' + cls.__name__)
+
+def restore_cache_state(state):
+  """
+  Rebuild a part of the API object model from the state saved in the
+  compiled API cache (See get_cache_state). Objects are created without
+  calling their constructors, and their slots are assigned directly. The
+  lists of the state are reused by the restored model, so the state should
+  not be used afterwards.
+
+  Args:
+    state The state of a value
+
+  Returns:
+    The restored value
+
+  Raises:
+    KeyError  If the state refers to an unknown class
+  """
+  cls = type(state)
+  if cls is list:
+    for i in xrange(len(state)):
+      if type(state[i]) not in PLAIN_TYPES:
+        state[i] = restore_cache_state(state[i])
+    return state
+  elif cls is dict:
+    # Insert the items in key order, so that the iteration order of the
+    # dictionary does not depend on how it was saved (See Operation)
+    return dict(sorted([ (k, restore_cache_state(v))
+                         for k, v in state.iteritems() ]))
+  elif cls is not tuple:
+    return state
+
+  name = state[0]
+  entry = CACHED_CLASSES.get(name)
+  if entry is not None:
+    cls, slots, transient = entry
+    obj = cls.__new__(cls)
+    for slot, value in zip(slots, state[1:]):
+      if value and type(value) not in PLAIN_TYPES:
+        value = restore_cache_state(value)
+      setattr(obj, slot, value)
+    for slot, value in transient:
+      setattr(obj, slot, value)
+    return obj
+  elif name == TypeRef.__name__:
+    return create_type_reference(state[1])
+  elif name == API.__name__:
+    api = API.__new__(API)
+    for attribute, value in state[1].iteritems():
+      api.__dict__[attribute] = restore_cache_state(value)
+    for attribute, factory in TRANSIENT_API_ATTRIBUTES.iteritems():
+      api.__dict__[attribute] = factory()
+    return api
+
+  cls = CACHED_LISTS[name]
+  items = cls.__new__(cls)
+  list.extend(items, restore_cache_state(state[1]))
+  items.version = 0
+  if cls is TypeList:
+    items.type_index = None
+  return items
+
+class HashingReader(object):
+  """
+  A file-like object which computes the SHA-1 digest of the content read
+  through it, so that a file can be hashed and parsed in a single pass.
+  """
+
+  def __init__(self, fp):
+    self.fp = fp
+    self.sha1 = hashlib.sha1()
+
+  def read(self, size=-1):
+    data = self.fp.read(size)
+    self.sha1.update(data)
+    return data
+
+  def hexdigest(self):
+    """
+    Returns:
+      SHA-1 digest of the whole content of the underlying file as a hex
+      string. Any content which has not been read yet is read first.
+    """
+    while self.read(jsonstream.CHUNK_SIZE):
+      pass
+    return self.sha1.hexdigest()
+
+def load_cache(cache_path, digest):
+  """
+  Load a compiled API object from the specified cache file. The cache file
+  holds the state of a validated API object in the marshal format, which
+  cannot contain executable objects, and the API object is rebuilt from it
+  without running the model constructors or validating it again (See
+  restore_cache_state).
+
+  Args:
+    cache_path  Path to the cache file
+    digest  Content hash of the API description the cache file should
+            have been compiled from
+
+  Returns:
+    An instance of the API class, or None if the cache file does not exist,
+    is stale or cannot be read
+  """
+  header = '%s %d %s\n' % (CACHE_MAGIC, CACHE_FORMAT, digest)
+  try:
+    fp = open(cache_path, 'rb')
+  except IOError:
+    return None
+  try:
+    if fp.readline() != header:
+      return None
+    api = restore_cache_state(marshal.load(fp))
+    if not isinstance(api, API):
+      return None
+    return api
+  except Exception:
+    return None
+  finally:
+    fp.close()
+
+def save_cache(api, cache_path, digest):
+  """
+  Save a compiled API object to the specified cache file. The file is written
+  under a temporary name and then renamed, so that concurrent readers never
+  see a partially written cache file. Failing to write the cache is not an
+  error.
+
+  Args:
+    api An instance of the API class, which must have been validated
+    cache_path  Path to the cache file
+    digest  Content hash of the API description the API object was parsed from
+
+  Returns:
+    True if the cache file was written, or False otherwise
+  """
+  directory = os.path.dirname(os.path.abspath(cache_path))
+  temp_path = None
+  try:
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=CACHE_SUFFIX)
+    fp = os.fdopen(fd, 'wb')
+    try:
+      fp.write('%s %d %s\n' % (CACHE_MAGIC, CACHE_FORMAT, digest))
+      marshal.dump(get_cache_state(api), fp)
+    finally:
+      fp.close()
+    os.rename(temp_path, cache_path)
+    return True
+  except (IOError, OSError, ValueError):
+    if temp_path is not None and os.path.exists(temp_path):
+      os.unlink(temp_path)
+    return False
+
+def parse_cached(path, cache_dir=None, streaming=False, parallel=False):
+  """
+  Parse and validate the specified API description file, using a compiled
+  cache of the resulting API object. Cache entries are keyed by the content
+  hash of the API description file, so the file is only parsed again when
+  its content changes. When the cache is out of date, the file is hashed
+  again while it is being parsed, and the resulting API object is cached
+  under the digest of the content that was actually parsed.
+
+  Args:
+    path  Path to the API description file
+    cache_dir Directory in which cache files are kept. If not specified,
+              the cache file is stored alongside the API description file.
+    streaming Parse the file incrementally when the cache is out of date
+    parallel  Validate the description in a pool of worker processes when
+              the cache is out of date
+
+  Returns:
+    An instance of the API class.
+
+  Raises:
+    APIDescriptionException If an error occurs while parsing or validating
+                            the input API description
+  """
+  try:
+    digest = get_digest(path)
+    api = load_cache(get_cache_path(path, digest, cache_dir), digest)
+    if api is not None:
+      return api
+    fp = open(path, 'rb')
+  except IOError as e:
+    raise APIDescriptionException(e)
+  try:
+    reader = HashingReader(fp)
+    api = load(reader, streaming=streaming, parallel=parallel)
+    digest = reader.hexdigest()
+  finally:
+    fp.close()
+  save_cache(api, get_cache_path(path, digest, cache_dir), digest)
+  return api
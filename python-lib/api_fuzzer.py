@@ -0,0 +1,279 @@
+from collections import OrderedDict
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+from api import *
+from predicate_parser import get_custom_type_name, randomize_conditions
+
+__author__ = 'hiranya'
+
+DEFAULT_PREFIX = 'random'
+VARIANTS_PER_TASK = 16
+# Nesting level of the operations in a serialized API description. Copied
+# containers above this level may contain shared parts, and are encoded
+# member by member (See APIFuzzer.generate_json).
+MAX_SHARED_LEVEL = 4
+
+def get_variant_seed(seed, index):
+  """
+  Derive the seed of a single variant from the seed of a corpus. Variants
+  get independent random number generators, so that each variant can be
+  reproduced on its own, no matter how the corpus is split among processes.
+  """
+  digest = hashlib.md5(str(seed) + ':' + str(index)).hexdigest()
+  return int(digest[:16], 16)
+
+def encode_json(value, lines, level):
+  """
+  Encode a value as it would appear at the given nesting level of a JSON
+  document encoded by json.dumps, either as a single line or indented like
+  API.serialize_json.
+  """
+  if lines:
+    return json.dumps(value, separators=(',', ':'))
+  encoded = json.dumps(value, indent=4, separators=(',', ': '))
+  return encoded.replace('\n', '\n' + ' ' * (4 * level))
+
+class APIFuzzer(object):
+  """
+  Generates mutated variants of an API description, for building test
+  corpora. The mutations are the same as those of randomize_api: each
+  pre-condition, post-condition and type constraint reachable from an
+  operation is randomized with a probability of 1/3 (See
+  predicate_parser.PredicateRandomizer).
+
+  The API description is serialized once, and variants are built as copies
+  of the serialized description that share all the resources, operations
+  and types that were not mutated. The original API object is never
+  modified. Variants are reproducible: variant i of a fuzzer with seed s is
+  always the same.
+  """
+
+  def __init__(self, api_def, seed=0, prefix=DEFAULT_PREFIX):
+    """
+    Create a new APIFuzzer.
+
+    Args:
+      api_def The API object to mutate
+      seed  Seed from which the seeds of the variants are derived
+      prefix  Prefix of the variant names (variant i is named prefix + i)
+    """
+    self.seed = seed
+    self.prefix = prefix
+    self.data = api_def.serialize()
+    # JSON encodings of the resources, operations and types shared by the
+    # variants, keyed by (id, lines)
+    self.fragments = {}
+    self.shared = set()
+    for resource in self.data[RESOURCES]:
+      self.shared.add(id(resource))
+      self.shared.update([ id(item) for item in resource[OPERATIONS] ])
+    self.shared.update([ id(item) for item in self.data.get(DATA_TYPES, []) ])
+    self.type_positions = {}
+    types = self.data.get(DATA_TYPES, [])
+    for i in range(len(types)):
+      self.type_positions[types[i][NAME]] = i
+    # Custom types referenced by the input and the output of each operation
+    self.operation_types = []
+    for resource in api_def.resources:
+      resource_types = []
+      for operation in resource.operations:
+        type_names = []
+        for message in (operation.input, operation.output):
+          type_name = get_custom_type_name(message)
+          if type_name is not None:
+            type_names.append(type_name)
+        resource_types.append(type_names)
+      self.operation_types.append(resource_types)
+
+  def get_variant_name(self, index):
+    return self.prefix + str(index)
+
+  def generate(self, index, name=None):
+    """
+    Generate a variant of the API description.
+
+    Args:
+      index Index of the variant in the corpus
+      name  Name of the variant (defaults to the name given by the prefix)
+
+    Returns:
+      The variant in the same format as a parsed JSON API description. The
+      variant shares unmodified parts with the fuzzer and with the other
+      variants, and must not be modified.
+    """
+    if name is None:
+      name = self.get_variant_name(index)
+    rng = random.Random(get_variant_seed(self.seed, index))
+    types = self.data.get(DATA_TYPES, [])
+    constraints = {}
+    resources = []
+    for i in range(len(self.data[RESOURCES])):
+      resource = self.data[RESOURCES][i]
+      operations = None
+      for j in range(len(resource[OPERATIONS])):
+        operation = resource[OPERATIONS][j]
+        # Types are mutated again each time an operation refers to them
+        for type_name in self.operation_types[i][j]:
+          current = constraints.get(type_name)
+          if current is None:
+            current = types[self.type_positions[type_name]].get(CONSTRAINTS, [])
+          constraints[type_name] = randomize_conditions(current, rng)
+
+        requires = operation.get(REQUIRES, [])
+        ensures = operation.get(ENSURES, [])
+        new_requires = randomize_conditions(requires, rng)
+        new_ensures = randomize_conditions(ensures, rng)
+        if new_requires != requires or new_ensures != ensures:
+          if operations is None:
+            operations = list(resource[OPERATIONS])
+          operation = OrderedDict(operation)
+          if new_requires != requires:
+            operation[REQUIRES] = new_requires
+          if new_ensures != ensures:
+            operation[ENSURES] = new_ensures
+          operations[j] = operation
+      if operations is not None:
+        resource = OrderedDict(resource)
+        resource[OPERATIONS] = operations
+      resources.append(resource)
+
+    variant = OrderedDict(self.data)
+    variant[NAME] = name
+    variant[RESOURCES] = resources
+    if constraints:
+      variant[DATA_TYPES] = list(types)
+      for type_name, type_constraints in constraints.items():
+        position = self.type_positions[type_name]
+        if type_constraints != types[position].get(CONSTRAINTS, []):
+          type_data = OrderedDict(types[position])
+          type_data[CONSTRAINTS] = type_constraints
+          variant[DATA_TYPES][position] = type_data
+    return variant
+
+  def generate_json(self, index, lines=False):
+    """
+    Generate a variant of the API description as a JSON string. Resources,
+    operations and types shared with the original description are only
+    encoded once per fuzzer.
+
+    Args:
+      index Index of the variant in the corpus
+      lines Generate a single line of JSON. Otherwise the JSON string is
+            formatted like API.serialize_json.
+    """
+    return self.__encode(self.generate(index), lines, 0)
+
+  def __encode(self, value, lines, level):
+    if id(value) in self.shared:
+      key = (id(value), lines)
+      encoded = self.fragments.get(key)
+      if encoded is None:
+        encoded = encode_json(value, lines, level)
+        self.fragments[key] = encoded
+      return encoded
+    elif level >= MAX_SHARED_LEVEL or not value or \
+        not isinstance(value, (dict, list)):
+      return encode_json(value, lines, level)
+
+    if isinstance(value, dict):
+      start, end = '{', '}'
+      separator = ':' if lines else ': '
+      members = [ json.dumps(k) + separator + self.__encode(v, lines, level + 1)
+                  for k, v in value.items() ]
+    else:
+      start, end = '[', ']'
+      members = [ self.__encode(v, lines, level + 1) for v in value ]
+    if lines:
+      return start + ','.join(members) + end
+    indent = '\n' + ' ' * (4 * (level + 1))
+    return start + indent + (',' + indent).join(members) + \
+           '\n' + ' ' * (4 * level) + end
+
+  def write(self, index, output_dir):
+    """
+    Write a variant of the API description to a file named after the
+    variant in the specified directory.
+
+    Returns:
+      The path of the written file
+    """
+    path = os.path.join(output_dir, self.get_variant_name(index) + '.json')
+    output = open(path, 'w')
+    output.write(self.generate_json(index))
+    output.close()
+    return path
+
+# Fuzzer used by a worker process (See generate_variants)
+FUZZER = None
+
+def init_fuzz_worker(api_def, seed, prefix):
+  global FUZZER
+  FUZZER = APIFuzzer(api_def, seed, prefix)
+
+def write_variant(arguments):
+  index, output_dir = arguments
+  return FUZZER.write(index, output_dir)
+
+def dump_variant(index):
+  return FUZZER.generate_json(index, lines=True)
+
+def generate_variants(api_def, count, seed=0, output_dir=None, output=None,
+                      processes=1, prefix=DEFAULT_PREFIX):
+  """
+  Generate a corpus of mutated variants of an API description (See
+  APIFuzzer). Variants are written either to a directory, one file per
+  variant, or to a single stream of JSON lines in variant order. The output
+  does not depend on the number of processes.
+
+  Args:
+    api_def The API object to mutate
+    count Number of variants to generate
+    seed  Seed of the corpus
+    output_dir  Directory to write the variant files to (created if it does
+                not exist)
+    output  A file object to write the JSON lines to
+    processes Number of worker processes
+    prefix  Prefix of the variant names
+
+  Returns:
+    The number of variants written
+  """
+  if (output_dir is None) == (output is None):
+    raise ValueError('Exactly one of output_dir and output must be specified')
+  if output_dir is not None and not os.path.exists(output_dir):
+    os.makedirs(output_dir)
+
+  pool = None
+  if processes > 1:
+    # The workers build their fuzzers from the API object in the pool
+    # initializer, so only variant indices and results cross processes
+    pool = multiprocessing.Pool(processes, init_fuzz_worker,
+                                (api_def, seed, prefix))
+    if output_dir is not None:
+      results = pool.imap_unordered(write_variant,
+        [ (index, output_dir) for index in range(count) ], VARIANTS_PER_TASK)
+    else:
+      results = pool.imap(dump_variant, range(count), VARIANTS_PER_TASK)
+  else:
+    fuzzer = APIFuzzer(api_def, seed, prefix)
+    if output_dir is not None:
+      results = (fuzzer.write(index, output_dir) for index in range(count))
+    else:
+      results = (fuzzer.generate_json(index, lines=True)
+                 for index in range(count))
+
+  written = 0
+  try:
+    for result in results:
+      if output is not None:
+        output.write(result)
+        output.write('\n')
+      written += 1
+  finally:
+    if pool is not None:
+      pool.terminate()
+      pool.join()
+  return written
@@ -0,0 +1,149 @@
+__author__ = 'hiranya'
+
+INFINITY = float('inf')
+
+def hungarian(cost):
+  """
+  Solve the assignment problem for a rectangular cost matrix using the
+  Hungarian algorithm (Kuhn-Munkres with potentials), in O(n^2 * m) time.
+
+  Args:
+    cost  A list of n rows, each a list of m costs, where n <= m
+
+  Returns:
+    A list holding the column assigned to each row, such that the total
+    cost of the assignment is minimal
+  """
+  n = len(cost)
+  if not n:
+    return []
+  m = len(cost[0])
+  if n > m:
+    raise ValueError('The cost matrix must not have more rows than columns')
+
+  # Rows and columns are numbered from 1, and column 0 is a sentinel
+  u = [ 0.0 ] * (n + 1)
+  v = [ 0.0 ] * (m + 1)
+  p = [ 0 ] * (m + 1)
+  way = [ 0 ] * (m + 1)
+  for i in range(1, n + 1):
+    p[0] = i
+    j0 = 0
+    min_values = [ INFINITY ] * (m + 1)
+    used = [ False ] * (m + 1)
+    while True:
+      used[j0] = True
+      i0 = p[j0]
+      row = cost[i0 - 1]
+      u0 = u[i0]
+      delta = INFINITY
+      j1 = 0
+      for j in range(1, m + 1):
+        if not used[j]:
+          current = row[j - 1] - u0 - v[j]
+          if current < min_values[j]:
+            min_values[j] = current
+            way[j] = j0
+          if min_values[j] < delta:
+            delta = min_values[j]
+            j1 = j
+      for j in range(m + 1):
+        if used[j]:
+          u[p[j]] += delta
+          v[j] -= delta
+        else:
+          min_values[j] -= delta
+      j0 = j1
+      if p[j0] == 0:
+        break
+    while True:
+      j1 = way[j0]
+      p[j0] = p[j1]
+      j0 = j1
+      if not j0:
+        break
+
+  assignment = [ None ] * n
+  for j in range(1, m + 1):
+    if p[j]:
+      assignment[p[j] - 1] = j - 1
+  return assignment
+
+def get_components(edges):
+  """
+  Group the edges of a bipartite graph into connected components.
+
+  Args:
+    edges A dictionary of edge weights keyed by (row, column) tuples
+
+  Returns:
+    A list of edge lists, one for each connected component
+  """
+  parents = {}
+  def find(node):
+    root = node
+    while parents[root] != root:
+      root = parents[root]
+    while parents[node] != root:
+      parents[node], node = root, parents[node]
+    return root
+
+  for i, j in edges:
+    row = ('r', i)
+    column = ('c', j)
+    parents.setdefault(row, row)
+    parents.setdefault(column, column)
+    root1 = find(row)
+    root2 = find(column)
+    if root1 != root2:
+      parents[root1] = root2
+
+  components = {}
+  for edge in sorted(edges):
+    components.setdefault(find(('r', edge[0])), []).append(edge)
+  return components.values()
+
+def max_weight_matching(edges):
+  """
+  Find a maximum weight matching in a bipartite graph. Each connected
+  component of the graph is solved separately with the Hungarian algorithm,
+  so sparse graphs are cheap to match even if they have many nodes.
+
+  Args:
+    edges A dictionary of positive edge weights keyed by (row, column)
+          tuples. Absent pairs cannot be matched.
+
+  Returns:
+    A sorted list of the matched (row, column) tuples
+  """
+  matches = []
+  for component in get_components(edges):
+    if len(component) == 1:
+      matches.append(component[0])
+      continue
+    rows = sorted(set([ i for i, j in component ]))
+    columns = sorted(set([ j for i, j in component ]))
+    transpose = len(rows) > len(columns)
+    if transpose:
+      rows, columns = columns, rows
+    max_weight = max([ edges[edge] for edge in component ])
+    cost = []
+    for row in rows:
+      row_cost = []
+      for column in columns:
+        if transpose:
+          weight = edges.get((column, row), 0.0)
+        else:
+          weight = edges.get((row, column), 0.0)
+        row_cost.append(max_weight - weight)
+      cost.append(row_cost)
+    assignment = hungarian(cost)
+    for k in range(len(rows)):
+      if transpose:
+        edge = (columns[assignment[k]], rows[k])
+      else:
+        edge = (rows[k], columns[assignment[k]])
+      if edges.has_key(edge):
+        matches.append(edge)
+  matches.sort()
+  return matches
@@ -9,24 +9,37 @@ class PythonCodeGenerator:
   between code blocks.
   """
 
-  def begin(self, tab="\t"):
+  def begin(self, tab="\t", output=None):
     """
     Signal the beginning of code generation.
 
     Args:
       tab Character or character sequence to use for indentation
+      output  An optional file-like object to which the generated code is
+              written as it is generated, instead of being buffered in
+              memory until end is called
     """
     self.code = []
+    self.output = output
+    if output is None:
+      self.emit = self.code.append
+    else:
+      self.emit = output.write
     self.tab = tab
     self.level = 0
+    # Indentation prefix of each level reached so far
+    self.prefixes = ['']
 
   def end(self):
     """
     Signal the end of code generation.
 
     Returns:
-      The code segment generated
+      The code segment generated, or None if the code was written to an
+      output stream
     """
+    if self.output is not None:
+      return None
     return string.join(self.code, "")
 
   def writeln(self, string=''):
@@ -36,10 +49,10 @@ class PythonCodeGenerator:
     Args:
       string Line of code (without the terminating newline character)
     """
-    self.write(string + '\n')
+    self.emit(self.prefixes[self.level] + string + '\n')
 
   def write(self, string):
-    self.code.append(self.tab * self.level + string)
+    self.emit(self.prefixes[self.level] + string)
 
   def indent(self):
     """
@@ -47,6 +60,8 @@ class PythonCodeGenerator:
     a new code block.
     """
     self.level += 1
+    if self.level == len(self.prefixes):
+      self.prefixes.append(self.tab * self.level)
 
   def dedent(self):
     """
@@ -57,6 +72,131 @@ class PythonCodeGenerator:
       raise SyntaxError, "internal error in code generator"
     self.level -= 1
 
+class NameAllocator:
+  """
+  Allocates unique identifiers for generated code. A name derived from a
+  base name is the base name itself if it is available, or otherwise the
+  base name followed by the smallest positive integer that makes it
+  available (Foo, Foo1, Foo2...). The allocator remembers the last suffix
+  tried for each base name, so allocating many names from the same base
+  takes constant time per name instead of probing all the previous
+  suffixes again. This assumes that allocated names are never released.
+  """
+
+  def __init__(self, exists=None):
+    """
+    Create a new NameAllocator.
+
+    Args:
+      exists  An optional function that checks whether a name is already
+              in use elsewhere (e.g. by a method already added to a class).
+              Names for which it returns True are never allocated.
+    """
+    self.names = set()
+    self.suffixes = {}
+    self.exists = exists
+
+  def __contains__(self, name):
+    return name in self.names or (self.exists is not None and self.exists(name))
+
+  def allocate(self, base, reserve=True):
+    """
+    Allocate a unique name derived from the given base name.
+
+    Args:
+      base  Base name
+      reserve Record the name as allocated. Otherwise the name only becomes
+              unavailable once the exists function reports it, and the same
+              name is returned again until then.
+
+    Returns:
+      A name not in use
+    """
+    suffix = self.suffixes.get(base, 0)
+    if suffix:
+      name = base + str(suffix)
+    else:
+      name = base
+    while name in self:
+      suffix += 1
+      name = base + str(suffix)
+    self.suffixes[base] = suffix
+    if reserve:
+      self.names.add(name)
+    return name
+
+class MemberList(list):
+  """
+  A list of named members (methods of a class or arguments of a method)
+  that maintains an index of its members by name, so that members can be
+  looked up in constant time. The index is updated as members are added,
+  and rebuilt when members are removed or replaced. Members must not be
+  renamed while they are in the list.
+  """
+
+  def __init__(self, members=()):
+    list.__init__(self, members)
+    self.__reindex()
+
+  def __reindex(self):
+    self.index = {}
+    for member in self:
+      self.index.setdefault(member.name, member)
+
+  def lookup(self, name):
+    """
+    Find a member by name.
+
+    Args:
+      name  Name of the member
+
+    Returns:
+      The first member with the specified name, or None if there is no
+      such member
+    """
+    return self.index.get(name)
+
+  def append(self, member):
+    list.append(self, member)
+    self.index.setdefault(member.name, member)
+
+  def extend(self, members):
+    for member in members:
+      self.append(member)
+
+  def __iadd__(self, members):
+    self.extend(members)
+    return self
+
+  def insert(self, position, member):
+    list.insert(self, position, member)
+    self.__reindex()
+
+  def remove(self, member):
+    list.remove(self, member)
+    self.__reindex()
+
+  def pop(self, *args):
+    member = list.pop(self, *args)
+    self.__reindex()
+    return member
+
+  def __setitem__(self, key, value):
+    list.__setitem__(self, key, value)
+    self.__reindex()
+
+  def __delitem__(self, key):
+    list.__delitem__(self, key)
+    self.__reindex()
+
+  def __setslice__(self, i, j, members):
+    list.__setslice__(self, i, j, members)
+    self.__reindex()
+
+  def __delslice__(self, i, j):
+    list.__delslice__(self, i, j)
+    self.__reindex()
+
 class MethodArgument:
   """
   Describes a method argument. A method argument is comprised of a name,
@@ -82,7 +222,8 @@ class Method:
       name  Name of the method
     """
     self.name = name
-    self.arguments = []
+    self.arguments = MemberList()
+    self.argument_names = NameAllocator(self.has_argument)
     self.return_type = None
     self.body = []
     self.argument_mappings = {}
@@ -150,10 +291,7 @@ class Method:
     Returns:
       True if the argument is defined in the method or False otherwise.
     """
-    for arg in self.arguments:
-      if arg.name == name:
-        return True
-    return False
+    return self.arguments.lookup(name) is not None
 
   def generate_code(self, pcg):
     """
@@ -285,13 +423,22 @@ class StaticMethod(Method):
     body consisting of a single 'pass' statement would be generated.
 
     Args:
-      pcg An instance of the PythonCodeGenerator class
+      pcg An optional instance of the PythonCodeGenerator class to emit the
+          code into. If not specified, a new generator is used.
 
     Returns:
-      A well-formed Python static method as a formatted string
+      A well-formed Python static method as a formatted string, or None if
+      the code was emitted into the provided PythonCodeGenerator
     """
+    if pcg is not None:
+      self.__generate_code(pcg)
+      return None
     pcg = PythonCodeGenerator()
     pcg.begin(tab='  ')
+    self.__generate_code(pcg)
+    return pcg.end()
+
+  def __generate_code(self, pcg):
     signature = 'def ' + self.name + '('
     for i in range(0, len(self.arguments)):
       arg = self.arguments[i]
@@ -314,7 +461,6 @@ class StaticMethod(Method):
     else:
       pcg.writeln('pass')
     pcg.dedent()
-    return pcg.end()
 
 class Class:
   """
@@ -335,7 +481,8 @@ class Class:
     """
     self.name = name
     self.super_class = super_class
-    self.methods = []
+    self.methods = MemberList()
+    self.method_names = NameAllocator(self.has_method)
 
   def has_method(self, name):
     """
@@ -347,10 +494,7 @@ class Class:
     Returns:
       True if the method is defined in the class, and False otherwise.
     """
-    for method in self.methods:
-      if method.name == name:
-        return True
-    return False
+    return self.methods.lookup(name) is not None
 
   def get_constructor(self):
     """
@@ -359,22 +503,31 @@ class Class:
     Returns:
       A Method instance (possibly None if the constructor is not defined)
     """
-    for method in self.methods:
-      if method.name == '__init__':
-        return method
-    return None
+    return self.methods.lookup('__init__')
 
-  def generate_code(self):
+  def generate_code(self, pcg=None):
     """
     Generate code for this class. Generated code contains the class declaration,
     and code for all the member methods.
 
+    Args:
+      pcg An optional instance of the PythonCodeGenerator class to emit the
+          code into. If not specified, a new generator is used.
+
     Returns:
-      A formatted string consisting of well-formed Python code for this class.
+      A formatted string consisting of well-formed Python code for this class,
+      or None if the code was emitted into the provided PythonCodeGenerator
     """
     print 'Generating code for the', self.name, 'class...'
+    if pcg is not None:
+      self.__generate_code(pcg)
+      return None
     pcg = PythonCodeGenerator()
     pcg.begin(tab='  ')
+    self.__generate_code(pcg)
+    return pcg.end()
+
+  def __generate_code(self, pcg):
     signature = 'class ' + self.name
     if self.super_class:
       signature += '(' + self.super_class + ')'
@@ -391,4 +544,3 @@ class Class:
       pcg.indent()
       pcg.writeln('pass')
       pcg.dedent()
-    return pcg.end()
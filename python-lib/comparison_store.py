@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import tempfile
+import predicate_parser
+from predicate_parser import compare_operation_conditions, OPTIMAL_MATCHING
+
+__author__ = 'hiranya'
+
+STORE_FORMAT = 2
+STORE_SUFFIX = '.tmp'
+
+def get_operation_key(api, operation):
+  """
+  Compute a content hash of an operation that changes whenever the result
+  of comparing the operation with another one may change: the HTTP method
+  of the operation and its pre- and post-condition lists, including the
+  constraints of the types it refers to (See Operation.get_pre_conditions).
+  Operations with equal keys compare the same with any other operation,
+  regardless of their names or of the API description they belong to.
+
+  Returns:
+    A hexadecimal SHA-1 digest
+  """
+  content = [ operation.method, operation.get_pre_conditions(api),
+              operation.get_post_conditions(api) ]
+  return hashlib.sha1(json.dumps(content)).hexdigest()
+
+class ComparisonStore(object):
+  """
+  A persistent store of operation comparison results, keyed by the content
+  hashes of the compared operations (See get_operation_key). After an API
+  description is edited, comparing it again with the other descriptions
+  only recomputes the pairs that involve changed operations.
+
+  Results are kept for ordered pairs of keys, since comparing two operations
+  is not guaranteed to be symmetric. Only the results looked up or added
+  since the store was opened are saved, so results of operations that no
+  longer exist are dropped from the store file. The store file records the
+  predicate similarity threshold, the matching method and the version of
+  the similarity algorithm the results were computed with, and its results
+  are discarded if any of them differ.
+  """
+
+  def __init__(self, path=None, threshold=None, method=OPTIMAL_MATCHING):
+    """
+    Open a comparison store.
+
+    Args:
+      path  Path to the store file. Results are loaded from the file if it
+            exists, and written back to it by save. If not specified, the
+            store is kept in memory only.
+      threshold Minimum similarity of paired predicates (defaults to
+                PREDICATE_SIMILARITY_THRESHOLD)
+      method  OPTIMAL_MATCHING or GREEDY_MATCHING
+    """
+    if threshold is None:
+      threshold = predicate_parser.PREDICATE_SIMILARITY_THRESHOLD
+    self.path = path
+    self.threshold = threshold
+    self.method = method
+    self.settings = {
+      'threshold' : threshold,
+      'method' : method,
+      'version' : predicate_parser.SIMILARITY_VERSION
+    }
+    self.results = {}
+    self.used = set()
+    self.hits = 0
+    self.misses = 0
+    if path is not None and os.path.exists(path):
+      fp = open(path)
+      try:
+        data = json.load(fp)
+      except ValueError:
+        data = {}
+      finally:
+        fp.close()
+      # Results of an unknown format, or computed with other settings, are
+      # recomputed
+      if data.get('format') == STORE_FORMAT and \
+          data.get('settings') == self.settings:
+        for key, result in data['results'].iteritems():
+          self.results[key] = tuple(result)
+
+  def __len__(self):
+    return len(self.results)
+
+  def get(self, key1, key2):
+    """
+    Look up the result of comparing two operations.
+
+    Args:
+      key1  Key of the first operation (See get_operation_key)
+      key2  Key of the second operation
+
+    Returns:
+      A tuple containing the pre- and post-condition similarities of the
+      operations, or None if the pair has not been compared
+    """
+    key = key1 + ':' + key2
+    result = self.results.get(key)
+    if result is None:
+      self.misses += 1
+    else:
+      self.hits += 1
+      self.used.add(key)
+    return result
+
+  def put(self, key1, key2, sim1, sim2):
+    """
+    Record the result of comparing two operations.
+    """
+    key = key1 + ':' + key2
+    self.results[key] = (sim1, sim2)
+    self.used.add(key)
+
+  def compare(self, api1, op1, api2, op2):
+    """
+    Compare the pre- and post-conditions of two operations, reusing the
+    stored result when neither operation has changed (See
+    compare_operation_conditions).
+
+    Returns:
+      A tuple containing the pre- and post-condition similarities
+    """
+    key1 = get_operation_key(api1, op1)
+    key2 = get_operation_key(api2, op2)
+    result = self.get(key1, key2)
+    if result is None:
+      result = compare_operation_conditions(api1, op1, api2, op2,
+                                            self.threshold, self.method)
+      self.put(key1, key2, result[0], result[1])
+    return result
+
+  def save(self, path=None):
+    """
+    Write the results used since the store was opened to the store file.
+    The file is written under a temporary name and then renamed, so that an
+    interrupted run never leaves a partially written store behind.
+
+    Args:
+      path  Path to the store file (defaults to the path the store was
+            opened with)
+    """
+    if path is None:
+      path = self.path
+    if path is None:
+      raise ValueError('No path specified for the comparison store')
+    results = {}
+    for key in self.used:
+      results[key] = self.results[key]
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+      os.makedirs(directory)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=STORE_SUFFIX)
+    try:
+      fp = os.fdopen(fd, 'w')
+      try:
+        json.dump({ 'format' : STORE_FORMAT, 'settings' : self.settings,
+                    'results' : results }, fp)
+      finally:
+        fp.close()
+      os.rename(temp_path, path)
+    except:
+      if os.path.exists(temp_path):
+        os.remove(temp_path)
+      raise
@@ -0,0 +1,147 @@
+import json
+
+__author__ = 'hiranya'
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+class JSONStreamReader:
+  """
+  Incrementally decodes a JSON object from a file-like object. The input is
+  read a chunk at a time and the members of the top level object are decoded
+  one after the other. Members that hold arrays can be streamed to a handler
+  function item by item, so that only a single array item needs to be held in
+  memory at any given time.
+  """
+
+  def __init__(self, fp, chunk_size=CHUNK_SIZE):
+    """
+    Create a new JSONStreamReader.
+
+    Args:
+      fp  A file-like object from which the JSON document will be read
+      chunk_size  Number of bytes to read from the input at a time
+    """
+    self.fp = fp
+    self.chunk_size = chunk_size
+    self.decoder = json.JSONDecoder()
+    self.buffer = ''
+    self.pos = 0
+    self.eof = False
+
+  def read_object(self, handlers=None):
+    """
+    Read the top level JSON object from the input.
+
+    Args:
+      handlers  A dictionary of functions keyed by member name. If a member
+                with one of these names holds an array, each item of the array
+                is passed to the corresponding function as soon as it has been
+                decoded, instead of being collected into the result.
+
+    Returns:
+      A dictionary containing all the members that were not streamed to a
+      handler function
+    """
+    if handlers is None:
+      handlers = {}
+    members = {}
+    self.expect('{')
+    if self.peek() == '}':
+      self.pos += 1
+      return members
+
+    while True:
+      key = self.read_value()
+      if not isinstance(key, basestring):
+        raise ValueError('Expected an object key at position ' + str(self.pos))
+      self.expect(':')
+      if handlers.has_key(key) and self.peek() == '[':
+        self.stream_array(handlers[key])
+      else:
+        members[key] = self.read_value()
+      if self.expect(',}') == '}':
+        return members
+
+  def stream_array(self, handler):
+    """
+    Decode the array at the current position, passing each item to the given
+    handler function as soon as it has been decoded.
+
+    Args:
+      handler A function that accepts a single argument
+    """
+    self.expect('[')
+    if self.peek() == ']':
+      self.pos += 1
+      return
+    while True:
+      handler(self.read_value())
+      if self.expect(',]') == ']':
+        return
+
+  def read_value(self):
+    """
+    Decode the JSON value at the current position.
+
+    Returns:
+      The decoded Python object
+    """
+    self.peek()
+    while True:
+      try:
+        value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        # A value that extends to the end of the buffer may be a number or a
+        # literal that continues in the next chunk.
+        if end < len(self.buffer) or self.eof:
+          self.pos = end
+          return value
+      except ValueError:
+        if self.eof:
+          raise
+      self.fill()
+
+  def expect(self, characters):
+    """
+    Consume the next non-whitespace character, which must be one of the
+    specified characters.
+
+    Returns:
+      The consumed character
+    """
+    c = self.peek()
+    if not c or c not in characters:
+      raise ValueError('Expected one of ' + repr(characters) + ' at position ' +
+                       str(self.pos))
+    self.pos += 1
+    return c
+
+  def peek(self):
+    """
+    Skip any whitespace at the current position and return the next character
+    without consuming it.
+
+    Returns:
+      The next non-whitespace character, or an empty string at the end of input
+    """
+    while True:
+      while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+        self.pos += 1
+      if self.pos < len(self.buffer) or self.eof:
+        return self.buffer[self.pos : self.pos + 1]
+      self.fill()
+
+  def fill(self):
+    """
+    Discard the consumed part of the buffer and read the next chunk of input.
+    The read size grows with the buffer, so that decoding an array item which
+    spans many chunks takes a linear number of decode attempts.
+    """
+    if self.pos:
+      self.buffer = self.buffer[self.pos:]
+      self.pos = 0
+    chunk = self.fp.read(max(self.chunk_size, len(self.buffer)))
+    if chunk:
+      self.buffer += chunk
+    else:
+      self.eof = True
@@ -0,0 +1,235 @@
+import random
+import zlib
+from predicate_parser import *
+
+__author__ = 'hiranya'
+
+# A Mersenne prime larger than any 32-bit token hash
+MINHASH_PRIME = (1 << 61) - 1
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+
+def get_operation_tokens(api, operation):
+  """
+  Compute the token set of an operation for MinHash fingerprinting. The
+  tokens are the match keys (See get_match_key) of the nodes collected by
+  NodeEnumerator from the pre- and post-conditions of the operation, tagged
+  with the condition kind. Repeated keys are numbered, so that the token set
+  represents the node multiset: the Jaccard similarity of two token sets is
+  S / (N1 + N2 - S), where S is the number of nodes that match.
+
+  Returns:
+    A set of 32-bit token hashes
+  """
+  tokens = set()
+  for kind, conditions in (('pre', operation.get_pre_conditions(api)),
+                           ('post', operation.get_post_conditions(api))):
+    counts = Counter()
+    for tree in pre_process_ast_set(parse_predicate_set(conditions,
+                                                        copy=False)):
+      counts.update(get_signature(tree)[1])
+    for (node_type, value), count in counts.iteritems():
+      prefix = kind + ':' + node_type.__name__ + ':' + repr(value) + ':'
+      for i in range(count):
+        tokens.add(zlib.crc32(prefix + str(i)) & 0xffffffff)
+  return tokens
+
+class MinHasher(object):
+  """
+  Computes MinHash signatures of token sets. Each of the hash functions is a
+  random linear function modulo MINHASH_PRIME, drawn from a seeded random
+  number generator so that signatures are reproducible across runs and
+  processes.
+  """
+
+  def __init__(self, permutations=MINHASH_PERMUTATIONS, seed=0):
+    rng = random.Random(seed)
+    self.functions = []
+    for i in range(permutations):
+      self.functions.append((rng.randint(1, MINHASH_PRIME - 1),
+                             rng.randint(0, MINHASH_PRIME - 1)))
+
+  def get_signature(self, tokens):
+    """
+    Returns:
+      A tuple holding the minimum hash of the tokens under each hash
+      function, or None if the token set is empty
+    """
+    if not tokens:
+      return None
+    signature = []
+    for a, b in self.functions:
+      signature.append(min([ (a * token + b) % MINHASH_PRIME
+                             for token in tokens ]))
+    return tuple(signature)
+
+def estimate_similarity(signature1, signature2):
+  """
+  Estimate the Jaccard similarity of two token sets from their MinHash
+  signatures.
+  """
+  if signature1 is None or signature2 is None:
+    return 0.0
+  equal = 0
+  for i in range(len(signature1)):
+    if signature1[i] == signature2[i]:
+      equal += 1
+  return float(equal) / len(signature1)
+
+class OperationIndex(object):
+  """
+  An index of operations drawn from any number of API descriptions, which
+  finds the operations likely to be similar to a given operation without
+  comparing it against every indexed operation. Operations are fingerprinted
+  with MinHash signatures of their condition node multisets (See
+  get_operation_tokens), and the signatures are split into bands which are
+  hashed into buckets (locality sensitive hashing). Operations that share a
+  bucket in at least one band are candidates, and candidates are verified
+  with compare_operations.
+
+  With b bands of r rows, two operations whose token sets have a Jaccard
+  similarity of J become candidates with probability 1 - (1 - J^r)^b. With
+  the defaults (16 bands of 8 rows), pairs with J = 0.8 become candidates
+  with a probability of 95%, and pairs with J = 0.5 with a probability of
+  6%. Operations that match according to compare_operations typically have
+  a J of 0.7 or more, since their conditions must pair up with a predicate
+  similarity of at least PREDICATE_SIMILARITY_THRESHOLD. Use more bands of
+  fewer rows to trade speed for recall.
+  """
+
+  def __init__(self, permutations=MINHASH_PERMUTATIONS, bands=LSH_BANDS,
+               seed=0):
+    """
+    Create a new OperationIndex.
+
+    Args:
+      permutations  Number of MinHash functions
+      bands Number of LSH bands. Must divide the number of permutations.
+      seed  Seed of the MinHash functions. Indices can only be compared or
+            merged if they use the same seed.
+    """
+    if bands < 1 or permutations % bands:
+      raise ValueError('The number of bands must divide the number of ' +
+                       'permutations')
+    self.hasher = MinHasher(permutations, seed)
+    self.rows = permutations / bands
+    self.bands = bands
+    self.entries = []
+    self.signatures = []
+    self.buckets = [ {} for i in range(bands) ]
+
+  def __get_band_keys(self, signature):
+    keys = []
+    for band in range(self.bands):
+      start = band * self.rows
+      keys.append(hash(signature[start:start + self.rows]))
+    return keys
+
+  def add_operation(self, api, operation):
+    """
+    Add an operation to the index.
+
+    Returns:
+      The position of the operation in the index
+    """
+    position = len(self.entries)
+    signature = self.hasher.get_signature(get_operation_tokens(api, operation))
+    self.entries.append((api, operation))
+    self.signatures.append(signature)
+    # Operations without any conditions never match another operation
+    # (See compare_operations), and hence are not bucketed
+    if signature is not None:
+      keys = self.__get_band_keys(signature)
+      for band in range(self.bands):
+        self.buckets[band].setdefault(keys[band], []).append(position)
+    return position
+
+  def add_api(self, api):
+    """
+    Add all the operations of an API description to the index.
+    """
+    for resource in api.resources:
+      for operation in resource.operations:
+        self.add_operation(api, operation)
+
+  def get_candidates(self, api, operation):
+    """
+    Find the indexed operations that share an LSH bucket with the given
+    operation.
+
+    Returns:
+      A sorted list of index positions
+    """
+    signature = self.hasher.get_signature(get_operation_tokens(api, operation))
+    if signature is None:
+      return []
+    candidates = set()
+    keys = self.__get_band_keys(signature)
+    for band in range(self.bands):
+      candidates.update(self.buckets[band].get(keys[band], ()))
+    return sorted(candidates)
+
+  def query(self, api, operation, verify=True):
+    """
+    Find the indexed operations similar to the given operation. The
+    operation itself is never included in the result, even if it has been
+    indexed.
+
+    Args:
+      api The API description of the operation
+      operation The operation to look up
+      verify  Check each candidate with compare_operations, and only return
+              the ones that actually match
+
+    Returns:
+      A list of (api, operation) tuples
+    """
+    results = []
+    for position in self.get_candidates(api, operation):
+      api2, op2 = self.entries[position]
+      if op2 is operation:
+        continue
+      if not verify or compare_operations(api, operation, api2, op2):
+        results.append((api2, op2))
+    return results
+
+  def get_candidate_pairs(self):
+    """
+    Find all the pairs of indexed operations that share an LSH bucket.
+
+    Returns:
+      A sorted list of (position, position) tuples, with the smaller
+      position first
+    """
+    pairs = set()
+    for buckets in self.buckets:
+      for bucket in buckets.itervalues():
+        for i in range(len(bucket)):
+          for j in range(i + 1, len(bucket)):
+            pairs.add((bucket[i], bucket[j]))
+    return sorted(pairs)
+
+  def find_matches(self, cross_api=True):
+    """
+    Find all the pairs of indexed operations that match according to
+    compare_operations. Only candidate pairs are compared.
+
+    Args:
+      cross_api Only report pairs of operations from different API
+                descriptions
+
+    Returns:
+      A list of ((api, operation), (api, operation)) tuples
+    """
+    matches = []
+    for i, j in self.get_candidate_pairs():
+      api1, op1 = self.entries[i]
+      api2, op2 = self.entries[j]
+      if cross_api and api1 is api2:
+        continue
+      if compare_operations(api1, op1, api2, op2):
+        matches.append((self.entries[i], self.entries[j]))
+    return matches
+
+  def __len__(self):
+    return len(self.entries)
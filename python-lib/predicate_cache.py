@@ -0,0 +1,118 @@
+import ast
+from collections import OrderedDict
+
+__author__ = 'hiranya'
+
+PARSE_CACHE_SIZE = 10000
+
+class LRUCache(object):
+  """
+  A bounded dictionary that evicts the least recently used entry when it is
+  full. The number of lookups that found (hits) and did not find (misses) an
+  entry is recorded, so the effectiveness of the cache can be inspected.
+  """
+
+  def __init__(self, max_size):
+    """
+    Create a new LRUCache.
+
+    Args:
+      max_size  Maximum number of entries held in the cache. A cache with a
+                max_size of 0 never stores anything.
+    """
+    self.max_size = max_size
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key):
+    """
+    Look up a cache entry, and mark it as the most recently used entry.
+
+    Returns:
+      The cached value, or None if the key is not in the cache
+    """
+    try:
+      value = self.entries.pop(key)
+    except KeyError:
+      self.misses += 1
+      return None
+    self.entries[key] = value
+    self.hits += 1
+    return value
+
+  def put(self, key, value):
+    if self.max_size <= 0:
+      return
+    if key in self.entries:
+      del self.entries[key]
+    elif len(self.entries) >= self.max_size:
+      self.entries.popitem(last=False)
+    self.entries[key] = value
+
+  def clear(self):
+    """
+    Remove all the entries from the cache and reset the hit and miss counters.
+    """
+    self.entries.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def get_statistics(self):
+    """
+    Returns:
+      A dictionary containing the hit and miss counts, the hit rate and the
+      current number of entries in the cache
+    """
+    lookups = self.hits + self.misses
+    if lookups:
+      hit_rate = float(self.hits) / lookups
+    else:
+      hit_rate = 0.0
+    return {
+      'hits' : self.hits,
+      'misses' : self.misses,
+      'hit_rate' : hit_rate,
+      'size' : len(self.entries)
+    }
+
+  def __len__(self):
+    return len(self.entries)
+
+# Parsed predicate ASTs keyed by predicate source string
+PARSE_CACHE = LRUCache(PARSE_CACHE_SIZE)
+
+def parse(string, copy=True):
+  """
+  Parse a predicate string into an AST (an _ast.Expression node). Parsed
+  predicates are cached, and unless a private copy is requested, the same
+  AST instance is returned for every occurrence of a given predicate string.
+  Callers of the latter form must treat the returned AST as immutable.
+
+  Args:
+    string  The predicate string
+    copy  Return a private AST that the caller may modify. Such ASTs are
+          parsed afresh, since that is faster than copying a cached AST.
+          Pass False to get the shared cached AST on read-only paths.
+
+  Returns:
+    An _ast.Expression instance
+
+  Raises:
+    SyntaxError If the string is not a valid predicate. Errors are not cached.
+  """
+  if copy:
+    return ast.parse(string, mode='eval')
+  tree = PARSE_CACHE.get(string)
+  if tree is None:
+    tree = ast.parse(string, mode='eval')
+    PARSE_CACHE.put(string, tree)
+  return tree
+
+def get_statistics():
+  """
+  Returns:
+    Hit and miss statistics of the predicate parse cache (See
+    LRUCache.get_statistics)
+  """
+  return PARSE_CACHE.get_statistics()
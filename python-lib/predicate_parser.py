@@ -1,22 +1,75 @@
 import ast
 import _ast
+from collections import Counter
+import hashlib
 import os
 import random
 import string
 import api
+import assignment
 import ast2code
+import predicate_cache
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
 
 __author__ = 'hiranya'
 
 PREDICATE_SIMILARITY_THRESHOLD = 0.9
 PREDICATE_SET_SIMILARITY_THRESHOLD = 0.85
-
-def parse(string):
-  return ast.parse(string, mode='eval')
+COMPILED_PREDICATE_CACHE_SIZE = 10000
+
+# Predicate set matching strategies (See compare_predicate_sets)
+OPTIMAL_MATCHING = 'optimal'
+GREEDY_MATCHING = 'greedy'
+# Increment whenever a change to compare_predicate_sets may change its
+# results, so that stored results are recomputed (See ComparisonStore)
+SIMILARITY_VERSION = 2
+
+# forall and exists conditions over at least this many items are evaluated
+# column-wise (See PredicateVectorizer)
+BATCH_EVALUATION_THRESHOLD = 100
+# Integer columns are only stored in NumPy arrays if all of their values are
+# smaller than this in magnitude
+NUMPY_INTEGER_LIMIT = 2 ** 31
+
+CONSTANTS = { 'True' : True, 'False' : False, 'None' : None }
+
+def parse(string, copy=True):
+  """
+  Parse a predicate string into an AST. See predicate_cache.parse.
+  """
+  return predicate_cache.parse(string, copy)
+
+def get_attribute(value, name):
+  """
+  Resolve an attribute reference in a predicate. Dictionaries (e.g. decoded
+  JSON payloads) are indexed by the attribute name, and any other object is
+  accessed through getattr.
+  """
+  if isinstance(value, dict):
+    return value[name]
+  return getattr(value, name)
 
 class PredicateEvaluator(ast.NodeVisitor):
-  def evaluate(self, string):
-    tree = parse(string)
+  def evaluate(self, string, variables=None):
+    """
+    Evaluate a predicate by walking its AST.
+
+    Args:
+      string  The predicate string
+      variables A dictionary of values for the names used in the predicate
+                (e.g. input, output). Unbound names evaluate to None.
+
+    Returns:
+      The value of the predicate
+    """
+    if variables is None:
+      variables = {}
+    self.variables = variables
+    tree = parse(string, copy=False)
     return self.visit(tree)
 
   def visit_Expression(self, node):
@@ -45,7 +98,7 @@ class PredicateEvaluator(ast.NodeVisitor):
     elif isinstance(op, _ast.Is):
       return left is right
     elif isinstance(op, _ast.IsNot):
-      return left not in right
+      return left is not right
 
   def visit_Num(self, node):
     return node.n
@@ -70,17 +123,17 @@ class PredicateEvaluator(ast.NodeVisitor):
     values = node.values
     items = {}
     for i in range(0, len(keys)):
-      items[keys[i]] = values[i]
+      items[self.visit(keys[i])] = self.visit(values[i])
     return items
 
   def visit_Attribute(self, node):
     value = self.visit(node.value)
-    return getattr(value, node.attr)
+    return get_attribute(value, node.attr)
 
   def visit_Name(self, node):
-    if node.id == 'True':
-      return True
-    return None
+    if CONSTANTS.has_key(node.id):
+      return CONSTANTS[node.id]
+    return self.variables.get(node.id)
 
   def visit_BinOp(self, node):
     left = self.visit(node.left)
@@ -116,6 +169,10 @@ class PredicateEvaluator(ast.NodeVisitor):
     op = node.op
     if isinstance(op, _ast.Not):
       return not result
+    elif isinstance(op, _ast.USub):
+      return -result
+    elif isinstance(op, _ast.UAdd):
+      return +result
 
   def visit_Call(self, node):
     function = node.func.id
@@ -125,13 +182,13 @@ class PredicateEvaluator(ast.NodeVisitor):
     elif function == 'forall':
       items = self.visit(args[1])
       for item in items:
-        if not self.visit(args[2]):
+        if not self.visit_bound(args[0].id, item, args[2]):
           return False
       return True
     elif function == 'exists':
       items = self.visit(args[1])
       for item in items:
-        if self.visit(args[2]):
+        if self.visit_bound(args[0].id, item, args[2]):
           return True
       return False
     elif function == 'implies':
@@ -140,90 +197,854 @@ class PredicateEvaluator(ast.NodeVisitor):
       right = bool(self.visit(args[1]))
       return left and right
 
+  def visit_bound(self, name, value, node):
+    variables = self.variables
+    self.variables = dict(variables)
+    self.variables[name] = value
+    try:
+      return self.visit(node)
+    finally:
+      self.variables = variables
+
+COMPARISON_OPERATORS = {
+  _ast.Gt : lambda left, right: left > right,
+  _ast.Lt : lambda left, right: left < right,
+  _ast.GtE : lambda left, right: left >= right,
+  _ast.LtE : lambda left, right: left <= right,
+  _ast.Eq : lambda left, right: left == right,
+  _ast.NotEq : lambda left, right: left != right,
+  _ast.In : lambda left, right: left in right,
+  _ast.NotIn : lambda left, right: left not in right,
+  _ast.Is : lambda left, right: left is right,
+  _ast.IsNot : lambda left, right: left is not right,
+}
+
+BINARY_OPERATORS = {
+  _ast.Add : lambda left, right: left + right,
+  _ast.Sub : lambda left, right: left - right,
+  _ast.Mult : lambda left, right: left * right,
+  _ast.Div : lambda left, right: left / right,
+  _ast.Mod : lambda left, right: left % right,
+  _ast.Pow : lambda left, right: left ** right,
+}
+
+class PredicateCompiler(ast.NodeVisitor):
+  """
+  Compiles predicates into Python closures. The AST of a predicate is walked
+  once, and every node is turned into a function which takes a dictionary of
+  variable bindings and computes the value of the node, without dispatching
+  on node types at evaluation time. Compiled predicates evaluate to the same
+  values as PredicateEvaluator.
+  """
+
+  def compile(self, string):
+    """
+    Compile a predicate.
+
+    Args:
+      string  The predicate string
+
+    Returns:
+      A function which accepts an optional dictionary of variable bindings
+      and returns the value of the predicate
+    """
+    body = self.visit(parse(string, copy=False))
+    def evaluate(variables=None):
+      if variables is None:
+        variables = {}
+      return body(variables)
+    return evaluate
+
+  def generic_visit(self, node):
+    # Constructs not supported by the evaluator evaluate to None
+    return lambda env: None
+
+  def visit_Expression(self, node):
+    return self.visit(node.body)
+
+  def visit_Compare(self, node):
+    left = self.visit(node.left)
+    right = self.visit(node.comparators[0])
+    op = COMPARISON_OPERATORS[type(node.ops[0])]
+    return lambda env: op(left(env), right(env))
+
+  def visit_Num(self, node):
+    n = node.n
+    return lambda env: n
+
+  def visit_Str(self, node):
+    s = node.s
+    return lambda env: s
+
+  def visit_List(self, node):
+    items = [ self.visit(item) for item in node.elts ]
+    return lambda env: [ item(env) for item in items ]
+
+  def visit_Tuple(self, node):
+    items = [ self.visit(item) for item in node.elts ]
+    return lambda env: tuple([ item(env) for item in items ])
+
+  def visit_Dict(self, node):
+    items = [ (self.visit(node.keys[i]), self.visit(node.values[i]))
+              for i in range(0, len(node.keys)) ]
+    return lambda env: dict([ (key(env), value(env)) for key, value in items ])
+
+  def visit_Attribute(self, node):
+    value = self.visit(node.value)
+    name = node.attr
+    def attribute(env):
+      obj = value(env)
+      if isinstance(obj, dict):
+        return obj[name]
+      return getattr(obj, name)
+    return attribute
+
+  def visit_Name(self, node):
+    if CONSTANTS.has_key(node.id):
+      constant = CONSTANTS[node.id]
+      return lambda env: constant
+    name = node.id
+    return lambda env: env.get(name)
+
+  def visit_BinOp(self, node):
+    left = self.visit(node.left)
+    right = self.visit(node.right)
+    op = BINARY_OPERATORS.get(type(node.op))
+    if op is None:
+      def unsupported(env):
+        left(env)
+        right(env)
+        return None
+      return unsupported
+    return lambda env: op(left(env), right(env))
+
+  def visit_BoolOp(self, node):
+    values = [ self.visit(value) for value in node.values ]
+    conjunction = isinstance(node.op, _ast.And)
+    def bool_op(env):
+      # Mirrors PredicateEvaluator.visit_BoolOp, which restarts the
+      # evaluation whenever the result so far is None.
+      result = None
+      for value in values:
+        if result is None:
+          result = value(env)
+        elif conjunction:
+          result = result and value(env)
+        else:
+          result = result or value(env)
+      return result
+    return bool_op
+
+  def visit_UnaryOp(self, node):
+    operand = self.visit(node.operand)
+    if isinstance(node.op, _ast.Not):
+      return lambda env: not operand(env)
+    elif isinstance(node.op, _ast.USub):
+      return lambda env: -operand(env)
+    elif isinstance(node.op, _ast.UAdd):
+      return lambda env: +operand(env)
+    def unsupported(env):
+      operand(env)
+      return None
+    return unsupported
+
+  def visit_Call(self, node):
+    function = node.func.id
+    args = node.args
+    if function == 'len':
+      item = self.visit(args[0])
+      return lambda env: len(item(env))
+    elif function == 'forall' or function == 'exists':
+      name = args[0].id
+      items = self.visit(args[1])
+      condition = self.visit(args[2])
+      expected = function == 'exists'
+      vectorizer = PredicateVectorizer()
+      batch = vectorizer.vectorize(args[2], name)
+      def quantifier(env):
+        values = items(env)
+        if (batch is not None and isinstance(values, (list, tuple)) and
+            len(values) >= BATCH_EVALUATION_THRESHOLD):
+          try:
+            mask = batch.evaluate(values, env)
+          except Exception:
+            # Evaluate item by item instead, which also reports the error
+            # (if any) in the same manner as the evaluator
+            pass
+          else:
+            if expected:
+              return any_true(mask, len(values))
+            return all_true(mask, len(values))
+        scope = dict(env)
+        for item in values:
+          scope[name] = item
+          if bool(condition(scope)) == expected:
+            return expected
+        return not expected
+      return quantifier
+    elif function == 'implies':
+      left = self.visit(args[0])
+      right = self.visit(args[1])
+      def implies(env):
+        # Same semantics as PredicateEvaluator (both sides must hold)
+        left_value = bool(left(env))
+        right_value = bool(right(env))
+        return left_value and right_value
+      return implies
+    return lambda env: None
+
+# Compiled predicates keyed by predicate string
+COMPILED_PREDICATES = predicate_cache.LRUCache(COMPILED_PREDICATE_CACHE_SIZE)
+
+def compile_predicate(string):
+  """
+  Get the compiled form of a predicate (See PredicateCompiler). Compiled
+  predicates are cached.
+
+  Args:
+    string  The predicate string
+
+  Returns:
+    A function which accepts an optional dictionary of variable bindings and
+    returns the value of the predicate
+  """
+  function = COMPILED_PREDICATES.get(string)
+  if function is None:
+    compiler = PredicateCompiler()
+    function = compiler.compile(string)
+    COMPILED_PREDICATES.put(string, function)
+  return function
+
+def evaluate_predicate(string, variables=None):
+  """
+  Evaluate a predicate using its compiled form.
+
+  Args:
+    string  The predicate string
+    variables A dictionary of values for the names used in the predicate
+
+  Returns:
+    The value of the predicate
+  """
+  return compile_predicate(string)(variables)
+
+class Column(list):
+  """
+  A column of values in a batch evaluation, as opposed to a list valued
+  scalar (e.g. a list literal in a predicate).
+  """
+  pass
+
+class UnsupportedPredicate(Exception):
+  pass
+
+# Operators that are applied to whole NumPy arrays at once
+NUMPY_OPERATORS = ( _ast.Gt, _ast.Lt, _ast.GtE, _ast.LtE, _ast.Eq, _ast.NotEq,
+                    _ast.Add, _ast.Sub, _ast.Mult, _ast.Div, _ast.Mod )
+# Largest possible magnitude of the result of an arithmetic operator given
+# the largest magnitudes of its operands. Integer arrays silently wrap
+# around on overflow, so these operators are only applied to them if the
+# result fits (See elementwise).
+INTEGER_BOUNDS = {
+  _ast.Add : lambda left, right: left + right,
+  _ast.Sub : lambda left, right: left + right,
+  _ast.Mult : lambda left, right: left * right,
+  _ast.Div : lambda left, right: left + 1,
+  _ast.Mod : lambda left, right: right
+}
+
+def is_array(value):
+  return numpy is not None and isinstance(value, numpy.ndarray)
+
+def is_column(value):
+  return isinstance(value, Column) or is_array(value)
+
+def is_number(value):
+  return is_array(value) or (isinstance(value, (int, long, float)) and
+                              not isinstance(value, bool))
+
+def to_column(values):
+  """
+  Convert a list of values into a column. Numeric columns are stored in
+  NumPy arrays when NumPy is available. All other columns are stored in
+  Column lists.
+  """
+  if numpy is not None and values:
+    array = numpy.array(values)
+    kind = array.dtype.kind
+    if array.ndim == 1 and len(array) == len(values):
+      if kind == 'f':
+        return array
+      elif kind in 'iu' and numpy.abs(array).max() < NUMPY_INTEGER_LIMIT:
+        return array
+  return Column(values)
+
+def to_columns(records, paths):
+  """
+  Lay out the attributes of a batch of records column-wise.
+
+  Args:
+    records A list of records (objects or dictionaries)
+    paths A list of dotted attribute paths (e.g. 'price', 'owner.name').
+          The empty path refers to the records themselves.
+
+  Returns:
+    A dictionary of columns keyed by attribute path
+  """
+  columns = {}
+  for path in paths:
+    values = records
+    if path:
+      for name in path.split('.'):
+        values = [ get_attribute(value, name) for value in values ]
+    columns[path] = to_column(list(values))
+  return columns
+
+def get_magnitude(value):
+  """
+  Returns:
+    The largest magnitude of the values of an integer column or of an
+    integer scalar (as a Python integer), or None if the value is not an
+    integer
+  """
+  if is_array(value):
+    if value.dtype.kind not in 'iu':
+      return None
+    elif not len(value):
+      return 0
+    return max(abs(int(value.min())), abs(int(value.max())))
+  elif isinstance(value, (int, long)):
+    return abs(value)
+  return None
+
+def fits_integer(bound, left, right):
+  """
+  Check whether integer arithmetic on NumPy arrays can not overflow.
+
+  Args:
+    bound The bound of the operator (See INTEGER_BOUNDS)
+    left  Left operand (an array or a scalar)
+    right Right operand (an array or a scalar)
+
+  Returns:
+    False if both operands are integers and the result may not fit into
+    their integer type, and True otherwise
+  """
+  magnitudes = [ get_magnitude(left), get_magnitude(right) ]
+  if None in magnitudes:
+    return True
+  limit = min([ numpy.iinfo(value.dtype).max for value in (left, right)
+                if is_array(value) ])
+  return bound(*magnitudes) < limit
+
+def elementwise(op, left, right, vectorized=False, bound=None):
+  """
+  Apply a binary operator to each pair of corresponding values of two
+  columns. A scalar operand is paired with every value of the other operand.
+
+  Args:
+    op  A function of two arguments
+    left  Left operand (a column or a scalar)
+    right Right operand (a column or a scalar)
+    vectorized  Whether op can be applied to NumPy arrays directly
+    bound Bound of the magnitude of integer results (See INTEGER_BOUNDS).
+          Integer arrays which may overflow are combined value by value.
+
+  Returns:
+    A column, or a scalar if both operands are scalars
+  """
+  if vectorized and (is_array(left) or is_array(right)):
+    if is_number(left) and is_number(right) and \
+        (bound is None or fits_integer(bound, left, right)):
+      return op(left, right)
+  if is_array(left):
+    left = left.tolist()
+  elif not isinstance(left, Column):
+    if is_array(right):
+      right = right.tolist()
+    elif not isinstance(right, Column):
+      return op(left, right)
+    return Column([ op(left, value) for value in right ])
+  if is_array(right):
+    right = right.tolist()
+  elif not isinstance(right, Column):
+    return Column([ op(value, right) for value in left ])
+  return Column([ op(left[i], right[i]) for i in xrange(len(left)) ])
+
+def all_true(mask, count):
+  """
+  Returns:
+    True if every value of the mask column holds. A scalar mask applies to
+    all of the count items.
+  """
+  if is_array(mask):
+    return bool(mask.all())
+  elif isinstance(mask, Column):
+    return all(mask)
+  return count == 0 or bool(mask)
+
+def any_true(mask, count):
+  """
+  Returns:
+    True if at least one value of the mask column holds. A scalar mask
+    applies to all of the count items.
+  """
+  if is_array(mask):
+    return bool(mask.any())
+  elif isinstance(mask, Column):
+    return any(mask)
+  return count > 0 and bool(mask)
+
+class BatchPredicate(object):
+  """
+  A predicate compiled for column-wise evaluation over a batch of records
+  (See PredicateVectorizer).
+  """
+
+  def __init__(self, body, paths):
+    self.body = body
+    self.paths = paths
+
+  def evaluate(self, records, variables=None):
+    """
+    Evaluate the predicate for each record of a batch.
+
+    Args:
+      records A list of records
+      variables A dictionary of values for the other names used in the
+                predicate
+
+    Returns:
+      A column holding the value of the predicate for each record, or a
+      scalar if the value does not depend on the record
+    """
+    return self.evaluate_columns(to_columns(records, self.paths), variables)
+
+  def evaluate_columns(self, columns, variables=None):
+    """
+    Evaluate the predicate over a batch of records laid out column-wise.
+
+    Args:
+      columns A dictionary of columns keyed by attribute path (See
+              to_columns). It must contain a column for each path listed
+              in the paths attribute.
+      variables A dictionary of values for the other names used in the
+                predicate
+
+    Returns:
+      A column holding the value of the predicate for each record, or a
+      scalar if the value does not depend on the record
+    """
+    if variables is None:
+      variables = {}
+    if numpy is None:
+      return self.body(columns, variables)
+    # Report invalid arithmetic (e.g. division by zero) as errors, as
+    # Python does for scalars. This does not cover integer overflow, which
+    # elementwise avoids instead.
+    with numpy.errstate(all='raise'):
+      return self.body(columns, variables)
+
+class PredicateVectorizer(ast.NodeVisitor):
+  """
+  Compiles a predicate over a record variable (e.g. the condition of a
+  forall) for column-wise evaluation. The predicate is evaluated over a
+  whole batch of records at once: comparisons, arithmetic and boolean
+  operators are applied element-wise to columns of attribute values (NumPy
+  arrays where possible). Sub-expressions which do not refer to the record
+  variable are evaluated once per batch by a PredicateCompiler closure.
+
+  For each record, the result holds the same truth value that the
+  PredicateEvaluator would compute. Boolean operators are only supported in
+  positions where just their truth value matters.
+  """
+
+  def vectorize(self, node, name):
+    """
+    Compile a predicate for column-wise evaluation.
+
+    Args:
+      node  AST of the predicate
+      name  Name of the record variable
+
+    Returns:
+      A BatchPredicate instance, or None if the predicate uses constructs
+      that cannot be evaluated column-wise
+    """
+    self.name = name
+    self.paths = set()
+    self.boolean = True
+    self.compiler = PredicateCompiler()
+    try:
+      body = self.visit(node)
+    except UnsupportedPredicate:
+      return None
+    return BatchPredicate(body, sorted(self.paths))
+
+  def visit(self, node):
+    for child in ast.walk(node):
+      if isinstance(child, _ast.Name) and child.id == self.name:
+        return ast.NodeVisitor.visit(self, node)
+    scalar = self.compiler.visit(node)
+    return lambda columns, env: scalar(env)
+
+  def visit_operand(self, node):
+    boolean = self.boolean
+    self.boolean = False
+    try:
+      return self.visit(node)
+    finally:
+      self.boolean = boolean
+
+  def generic_visit(self, node):
+    raise UnsupportedPredicate(type(node).__name__)
+
+  def visit_Expression(self, node):
+    return self.visit(node.body)
+
+  def visit_Name(self, node):
+    self.paths.add('')
+    return lambda columns, env: columns['']
+
+  def visit_Attribute(self, node):
+    path = []
+    while isinstance(node, _ast.Attribute):
+      path.insert(0, node.attr)
+      node = node.value
+    if not isinstance(node, _ast.Name):
+      raise UnsupportedPredicate('Attribute')
+    path = '.'.join(path)
+    self.paths.add(path)
+    return lambda columns, env: columns[path]
+
+  def visit_Compare(self, node):
+    left = self.visit_operand(node.left)
+    right = self.visit_operand(node.comparators[0])
+    op_type = type(node.ops[0])
+    op = COMPARISON_OPERATORS[op_type]
+    vectorized = op_type in NUMPY_OPERATORS
+    return lambda columns, env: elementwise(op, left(columns, env),
+                                            right(columns, env), vectorized)
+
+  def visit_BinOp(self, node):
+    op_type = type(node.op)
+    if not BINARY_OPERATORS.has_key(op_type):
+      raise UnsupportedPredicate('BinOp')
+    left = self.visit_operand(node.left)
+    right = self.visit_operand(node.right)
+    op = BINARY_OPERATORS[op_type]
+    vectorized = op_type in NUMPY_OPERATORS
+    bound = INTEGER_BOUNDS.get(op_type)
+    return lambda columns, env: elementwise(op, left(columns, env),
+                                            right(columns, env), vectorized,
+                                            bound)
+
+  def visit_BoolOp(self, node):
+    if not self.boolean:
+      raise UnsupportedPredicate('BoolOp')
+    values = [ self.visit(value) for value in node.values ]
+    conjunction = isinstance(node.op, _ast.And)
+    def bool_op(columns, env):
+      operands = [ value(columns, env) for value in values ]
+      if numpy is not None:
+        # Comparisons of non-numeric columns produce columns of booleans,
+        # which can be combined as arrays
+        for i in range(len(operands)):
+          operand = operands[i]
+          if isinstance(operand, Column) and all([ type(v) is bool
+                                                   for v in operand ]):
+            operands[i] = numpy.array(operand, dtype=bool)
+      if numpy is not None and all([ is_number(o) for o in operands ]):
+        if conjunction:
+          return reduce(numpy.logical_and, operands)
+        return reduce(numpy.logical_or, operands)
+      operands = [ Column(o.tolist()) if is_array(o) else o for o in operands ]
+      size = max([ len(o) for o in operands if isinstance(o, Column) ])
+      if not [ o for o in operands if o is None or
+               (isinstance(o, Column) and None in o) ]:
+        # Without None values, only the truth values of the operands matter
+        operands = [ o if isinstance(o, Column) else [ o ] * size
+                     for o in operands ]
+        if conjunction:
+          return Column(map(all, zip(*operands)))
+        return Column(map(any, zip(*operands)))
+      mask = Column()
+      for i in xrange(size):
+        # Same evaluation order as PredicateEvaluator.visit_BoolOp
+        result = None
+        for operand in operands:
+          if isinstance(operand, Column):
+            operand = operand[i]
+          if result is None:
+            result = operand
+          elif conjunction:
+            result = result and operand
+          else:
+            result = result or operand
+        mask.append(bool(result))
+      return mask
+    return bool_op
+
+  def visit_UnaryOp(self, node):
+    if isinstance(node.op, _ast.Not):
+      if not self.boolean:
+        raise UnsupportedPredicate('Not')
+      operand = self.visit(node.operand)
+      def not_op(columns, env):
+        value = operand(columns, env)
+        if is_array(value):
+          return numpy.logical_not(value)
+        elif isinstance(value, Column):
+          return Column([ not item for item in value ])
+        return not value
+      return not_op
+    elif isinstance(node.op, _ast.USub):
+      operand = self.visit_operand(node.operand)
+      def negate(columns, env):
+        value = operand(columns, env)
+        if is_array(value):
+          return -value
+        elif isinstance(value, Column):
+          return Column([ -item for item in value ])
+        return -value
+      return negate
+    raise UnsupportedPredicate('UnaryOp')
+
+  def visit_Call(self, node):
+    if not isinstance(node.func, _ast.Name) or node.func.id != 'len':
+      raise UnsupportedPredicate('Call')
+    item = self.visit_operand(node.args[0])
+    def length(columns, env):
+      value = item(columns, env)
+      if is_array(value):
+        value = value.tolist()
+      return to_column([ len(v) for v in value ])
+    return length
+
+# Batch forms of predicates keyed by (predicate string, record variable name)
+BATCH_PREDICATES = predicate_cache.LRUCache(COMPILED_PREDICATE_CACHE_SIZE)
+
+def vectorize_predicate(string, name='_item'):
+  """
+  Get the batch form of a predicate (See PredicateVectorizer). Batch forms
+  are cached.
+
+  Args:
+    string  The predicate string
+    name  Name of the record variable
+
+  Returns:
+    A BatchPredicate instance
+
+  Raises:
+    ValueError  If the predicate cannot be evaluated column-wise
+  """
+  key = (string, name)
+  batch = BATCH_PREDICATES.get(key)
+  if batch is None:
+    vectorizer = PredicateVectorizer()
+    batch = vectorizer.vectorize(parse(string, copy=False), name)
+    if batch is None:
+      raise ValueError('Predicate cannot be evaluated column-wise: ' + string)
+    BATCH_PREDICATES.put(key, batch)
+  return batch
+
+def evaluate_batch(string, records, name='_item', variables=None):
+  """
+  Evaluate a predicate for each record of a batch. Predicates that cannot be
+  evaluated column-wise are evaluated record by record.
+
+  Args:
+    string  The predicate string
+    records A list of records
+    name  Name of the record variable used in the predicate
+    variables A dictionary of values for the other names used in the predicate
+
+  Returns:
+    A list of booleans, one for each record
+  """
+  try:
+    batch = vectorize_predicate(string, name)
+  except ValueError:
+    batch = None
+  if batch is not None:
+    try:
+      mask = batch.evaluate(records, variables)
+    except Exception:
+      # Evaluate record by record instead, which also reports the error (if
+      # any) in the same manner as the evaluator
+      pass
+    else:
+      if is_array(mask):
+        return [ bool(value) for value in mask.tolist() ]
+      elif isinstance(mask, Column):
+        return [ bool(value) for value in mask ]
+      return [ bool(mask) ] * len(records)
+
+  function = compile_predicate(string)
+  scope = dict(variables or {})
+  result = []
+  for record in records:
+    scope[name] = record
+    result.append(bool(function(scope)))
+  return result
+
+class Mismatch(object):
+  """
+  The reason why two ASTs are not equivalent (See ASTComparator).
+  """
+
+  def __init__(self, path, kind):
+    """
+    Create a new Mismatch.
+
+    Args:
+      path  A tuple of field names and list indices leading from the root of
+            the left hand side AST to the node at which the mismatch was
+            detected, e.g. ('body', 'left', 'comparators', 0)
+      kind  A short description of the mismatch, e.g. 'binop op'
+    """
+    self.path = path
+    self.kind = kind
+
+  def __eq__(self, other):
+    return isinstance(other, Mismatch) and self.path == other.path and \
+           self.kind == other.kind
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __str__(self):
+    return '%s mismatch at %s' % (self.kind,
+                                  '.'.join([ str(item) for item in self.path ]))
+
+  def __repr__(self):
+    return 'Mismatch(%r, %r)' % (self.path, self.kind)
+
 class ASTComparator(ast.NodeVisitor):
+  """
+  Checks whether two ASTs are equivalent, allowing for commutative binary
+  operators, reordered boolean operands and flipped comparisons. When the
+  ASTs are not equivalent, the reason is available as a Mismatch through the
+  mismatch attribute.
+  """
+
+  def __init__(self, tracer=None):
+    """
+    Create a new ASTComparator.
+
+    Args:
+      tracer  An optional function that is called with every Mismatch found
+              while comparing, including the mismatches of alternatives that
+              are tried and rejected before a match is found
+    """
+    self.tracer = tracer
+    self.mismatch = None
+    self.path = []
+
   def compare(self, item1, item2):
     if isinstance(item1, str):
-      left = parse(item1)
+      left = parse(item1, copy=False)
     else:
       left = item1
     if isinstance(item2, str):
-      right = parse(item2)
+      right = parse(item2, copy=False)
     else:
       right = item2
 
     self.current_right = right
-    return self.visit(left)
+    self.mismatch = None
+    self.path = []
+    result = self.visit(left)
+    if result:
+      self.mismatch = None
+    return result
+
+  def report(self, kind):
+    """
+    Record a mismatch at the current position. The first mismatch recorded
+    is kept as the reason of the failure, since the enclosing nodes report
+    their own mismatches after it. Mismatches of rejected alternatives are
+    discarded when another alternative matches.
+
+    Returns:
+      False
+    """
+    mismatch = Mismatch(tuple(self.path), kind)
+    if self.mismatch is None:
+      self.mismatch = mismatch
+    if self.tracer is not None:
+      self.tracer(mismatch)
+    return False
+
+  def visit_child(self, node, right, *path):
+    self.current_right = right
+    self.path.extend(path)
+    try:
+      return self.visit(node)
+    finally:
+      del self.path[-len(path):]
 
   def visit_Expression(self, node):
     if not isinstance(self.current_right, _ast.Expression):
-      print 'expression mismatch'
-      return False
-    left = node.body
-    self.current_right = self.current_right.body
-    return self.visit(left)
+      return self.report('expression')
+    return self.visit_child(node.body, self.current_right.body, 'body')
 
   def visit_BinOp(self, node):
     if not isinstance(self.current_right, _ast.BinOp):
-      return False
+      return self.report('binop')
 
     left_op = node.op
     right_op = self.current_right.op
     if not isinstance(left_op, type(right_op)):
-      print 'binop op mismatch'
-      return False
+      return self.report('binop op')
 
     temp = self.current_right
     left_arg = node.left
-    self.current_right = temp.left
     left_2_left = False
-    if not self.visit(left_arg):
-      self.current_right = temp.right
-      if not self.visit(left_arg):
-        print 'binop left arg mismatch'
-        return False
+    mismatch = self.mismatch
+    if not self.visit_child(left_arg, temp.left, 'left'):
+      if not self.visit_child(left_arg, temp.right, 'left'):
+        return self.report('binop left arg')
+      self.mismatch = mismatch
     else:
       left_2_left = True
 
     right_arg = node.right
     if left_2_left:
-      self.current_right = temp.right
+      return self.visit_child(right_arg, temp.right, 'right')
     else:
-      self.current_right = temp.left
-    return self.visit(right_arg)
+      return self.visit_child(right_arg, temp.left, 'right')
 
   def visit_BoolOp(self, node):
     if not isinstance(self.current_right, _ast.BoolOp):
-      print 'boolop mismatch'
-      return False
+      return self.report('boolop')
     left_op = node.op
     right_op = self.current_right.op
     if not isinstance(left_op, type(right_op)):
-      print 'boolop op mismatch'
-      return False
+      return self.report('boolop op')
 
     left_values = node.values
     right_values = self.current_right.values
     if len(left_values) != len(right_values):
-      print 'boolop value count mismatch'
-      return False
+      return self.report('boolop value count')
 
     matches = []
     for i in range(0, len(left_values)):
+      mismatch = self.mismatch
       for j in range(0, len(right_values)):
-        self.current_right = right_values[j]
-        if self.visit(left_values[i]):
+        if self.visit_child(left_values[i], right_values[j], 'values', i):
+          self.mismatch = mismatch
           matches.append(True)
           break
 
     if len(matches) != len(left_values):
-      print 'one or more boolop values did not match'
-      return False
+      return self.report('boolop values')
     return True
 
   def visit_Compare(self, node):
     if not isinstance(self.current_right, _ast.Compare):
-      print 'comparison mismatch'
-      return False
+      return self.report('comparison')
 
     left_op = node.ops[0]
     right_op = self.current_right.ops[0]
@@ -238,161 +1059,115 @@ class ASTComparator(ast.NodeVisitor):
       elif isinstance(left_op, _ast.GtE) and isinstance(right_op, _ast.LtE):
         opposite_op = True
       else:
-        return False
+        return self.report('comparison op')
     elif isinstance(left_op, _ast.Eq) or isinstance(left_op, _ast.NotEq):
       opposite_op = True
 
     temp = self.current_right
     if opposite_op:
-      left_arg = node.comparators[0]
-      self.current_right = temp.left
-      if not self.visit(left_arg):
-        print 'comparison arg mismatch'
-        return False
-
-      right_arg = node.left
-      self.current_right = temp.comparators[0]
-      return self.visit(right_arg)
+      if not self.visit_child(node.comparators[0], temp.left,
+                              'comparators', 0):
+        return self.report('comparison arg')
+      return self.visit_child(node.left, temp.comparators[0], 'left')
     else:
-      left_arg = node.left
-      self.current_right = temp.left
-      if not self.visit(left_arg):
-        print 'comparison left arg mismatch'
-        return False
-
-      right_arg = node.comparators[0]
-      self.current_right = temp.comparators[0]
-      return self.visit(right_arg)
+      if not self.visit_child(node.left, temp.left, 'left'):
+        return self.report('comparison left arg')
+      return self.visit_child(node.comparators[0], temp.comparators[0],
+                              'comparators', 0)
 
   def visit_Call(self, node):
     if not isinstance(self.current_right, _ast.Call):
-      print 'function call mismatch'
-      return False
+      return self.report('function call')
     temp = self.current_right
-    left_name = node.func
-    self.current_right = temp.func
-    if not self.visit(left_name):
-      print 'function name mismatch'
-      return False
+    if not self.visit_child(node.func, temp.func, 'func'):
+      return self.report('function name')
 
     left_args = node.args
     right_args = temp.args
     if len(left_args) != len(right_args):
-      print 'function arg count mismatch'
-      return False
+      return self.report('function arg count')
 
     for i in range(0, len(left_args)):
-      self.current_right= right_args[i]
-      if not self.visit(left_args[i]):
-        print 'function arg mismatch'
-        return False
+      if not self.visit_child(left_args[i], right_args[i], 'args', i):
+        return self.report('function arg')
     return True
 
   def visit_Name(self, node):
     if not isinstance(self.current_right, _ast.Name):
-      print 'name mismatch'
-      return False
+      return self.report('name')
     if node.id != self.current_right.id:
-      print 'name id mismatch'
-      return False
+      return self.report('name id')
     return True
 
   def visit_Num(self, node):
     if not isinstance(self.current_right, _ast.Num):
-      print 'number mismatch'
-      return False
+      return self.report('number')
     if node.n != self.current_right.n:
-      print 'number value mismatch'
-      return False
+      return self.report('number value')
     return True
 
   def visit_Attribute(self, node):
     if not isinstance(self.current_right, _ast.Attribute):
-      print 'attribute mismatch'
-      return False
+      return self.report('attribute')
     if node.attr != self.current_right.attr:
-      print 'attr value mismatch'
-      return False
-    self.current_right = self.current_right.value
-    return self.visit(node.value)
+      return self.report('attr value')
+    return self.visit_child(node.value, self.current_right.value, 'value')
 
   def visit_Str(self, node):
     if not isinstance(self.current_right, _ast.Str):
-      print 'string mismatch'
-      return False
+      return self.report('string')
     if node.s != self.current_right.s:
-      print 'string value mismatch'
-      return False
+      return self.report('string value')
     return True
 
   def visit_List(self, node):
     if not isinstance(self.current_right, _ast.List):
-      print 'list mismatch'
-      return False
-    left_elements = node.elts
-    right_elements = self.current_right.elts
-    if len(left_elements) != len(right_elements):
-      print 'list length mismatch'
-      return False
-    for i in range(0, len(left_elements)):
-      self.current_right = right_elements[i]
-      if not self.visit(left_elements[i]):
-        print 'list member mismatch'
-        return False
-    return True
+      return self.report('list')
+    return self.compare_elements(node.elts, self.current_right.elts, 'list')
 
   def visit_Tuple(self, node):
     if not isinstance(self.current_right, _ast.Tuple):
-      print 'tuple mismatch'
-      return False
-    left_elements = node.elts
-    right_elements = self.current_right.elts
+      return self.report('tuple')
+    return self.compare_elements(node.elts, self.current_right.elts, 'tuple')
+
+  def compare_elements(self, left_elements, right_elements, kind):
     if len(left_elements) != len(right_elements):
-      print 'tuple length mismatch'
-      return False
+      return self.report(kind + ' length')
     for i in range(0, len(left_elements)):
-      self.current_right = right_elements[i]
-      if not self.visit(left_elements[i]):
-        print 'tuple member mismatch'
-        return False
+      if not self.visit_child(left_elements[i], right_elements[i], 'elts', i):
+        return self.report(kind + ' member')
     return True
 
   def visit_Dict(self, node):
     if not isinstance(self.current_right, _ast.Dict):
-      print 'dict mismatch'
-      return False
+      return self.report('dict')
 
     temp = self.current_right
 
     left_keys = node.keys
     right_keys = temp.keys
     if len(left_keys) != len(right_keys):
-      print 'dict length mismatch'
-      return False
+      return self.report('dict length')
     for i in range(0, len(left_keys)):
-      self.current_right = right_keys[i]
-      if not self.visit(left_keys[i]):
-        print 'dict key mismatch'
-        return False
+      if not self.visit_child(left_keys[i], right_keys[i], 'keys', i):
+        return self.report('dict key')
 
     left_values = node.values
     right_values = temp.values
     for i in range(0, len(left_values)):
-      self.current_right = right_values[i]
-      if not self.visit(left_values[i]):
-        print 'dict value mismatch'
-        return False
+      if not self.visit_child(left_values[i], right_values[i], 'values', i):
+        return self.report('dict value')
     return True
 
 class ASTSimilarityChecker(ast.NodeVisitor):
   def get_similarity(self, item1, item2):
     if isinstance(item1, str):
-      left_tree = parse(item1)
+      left_tree = parse(item1, copy=False)
     else:
       left_tree = item1
 
     if isinstance(item2, str):
-      right_tree = parse(item2)
+      right_tree = parse(item2, copy=False)
     else:
       right_tree = item2
 
@@ -404,7 +1179,7 @@ class ASTSimilarityChecker(ast.NodeVisitor):
 
     S = len(self.shared)
     L = len(self.left)
-    R = len(self.matcher.nodes)
+    R = self.matcher.remaining
     similarity = (2.0 * S) / (2.0 * S + L + R)
     return similarity
 
@@ -425,46 +1200,99 @@ class NodeEnumerator(ast.NodeVisitor):
     self.generic_visit(node)
     self.nodes.append(node)
 
-class NodeMatcher():
+# Functions computing the value which must be equal for two nodes of the
+# given type to match. Nodes of other types match any node of the same type.
+MATCH_KEYS = {
+  _ast.Call : lambda node: getattr(node.func, 'id', None),
+  _ast.Num : lambda node: node.n,
+  _ast.Str : lambda node: node.s,
+}
+
+def get_match_key(node):
+  """
+  Returns:
+    A (node type, match key) tuple. Two nodes match if and only if their
+    match keys are equal (See NodeMatcher).
+  """
+  node_type = type(node)
+  key_function = MATCH_KEYS.get(node_type)
+  if key_function is None:
+    return node_type, None
+  return node_type, key_function(node)
+
+class NodeMatcher(object):
+  """
+  Matches nodes of one AST against the nodes of another. The candidate nodes
+  are grouped into buckets by node type and match key (See MATCH_KEYS), so
+  that finding and consuming a matching node takes constant time. Each
+  candidate node can be matched at most once.
+  """
+
   def __init__(self, right):
     enumerator = NodeEnumerator()
-    self.nodes = enumerator.get_node_list(right)
+    nodes = enumerator.get_node_list(right)
+    self.buckets = {}
+    for i in range(len(nodes)):
+      node = nodes[i]
+      key = get_match_key(node)
+      bucket = self.buckets.get(key)
+      if bucket is None:
+        self.buckets[key] = [ (i, node) ]
+      else:
+        bucket.append((i, node))
+    self.remaining = len(nodes)
     self.matched_nodes = []
 
   def match(self, target):
-    match = None
-    for node in self.nodes:
-      if not isinstance(target, type(node)):
-        continue
-      elif hasattr(self, 'visit_' + type(node).__name__):
-        method = getattr(self, 'visit_' + type(node).__name__)
-        if method(node, target):
-          match = node
-      else:
-        match = node
-
-    if match is not None:
-      self.matched_nodes.append(match)
-      self.nodes.remove(match)
-      return True
-    return False
-
-  def visit_Call(self, node, target):
-    return node.func.id == target.func.id
+    """
+    Find an unmatched node that matches the target node, and mark it as
+    matched. Of several matching nodes, the one enumerated last is chosen.
+
+    Returns:
+      True if a matching node was found, and False otherwise
+    """
+    bucket = self.buckets.get(get_match_key(target))
+    if not bucket:
+      return False
+    i, match = bucket.pop()
+    self.matched_nodes.append(match)
+    self.remaining -= 1
+    return True
 
-  def visit_Num(self, node, target):
-    return node.n == target.n
+  def __get_nodes(self):
+    nodes = []
+    for bucket in self.buckets.values():
+      nodes.extend(bucket)
+    nodes.sort()
+    return [ node for i, node in nodes ]
 
-  def visit_Str(self, node, target):
-    return node.s == target.s
+  # Nodes which have not been matched yet, in enumeration order
+  nodes = property(__get_nodes)
 
 class PredicateRandomizer(ast.NodeTransformer):
+  """
+  Mutates predicate ASTs at random, for generating test corpora. The ASTs
+  are modified in place.
+  """
+
+  def __init__(self, rng=None):
+    """
+    Create a new PredicateRandomizer.
+
+    Args:
+      rng A random.Random instance to draw from. Defaults to the global
+          random number generator of the random module.
+    """
+    if rng is None:
+      rng = random
+    self.rng = rng
+
   def randomize(self):
-    return bool(random.randint(0,1))
+    return bool(self.rng.randint(0,1))
 
   def visit_Num(self, node):
     if self.randomize():
-      number = random.random() * node.n
+      number = self.rng.random() * node.n
       return ast.copy_location(_ast.Num(n=number), node)
     else:
       return node
@@ -472,7 +1300,7 @@ class PredicateRandomizer(ast.NodeTransformer):
   def visit_Str(self, node):
     if self.randomize():
       n = len(node.s)
-      s = ''.join(random.choice(string.ascii_uppercase + string.lowercase + string.digits) for x in range(n))
+      s = ''.join(self.rng.choice(string.ascii_uppercase + string.lowercase + string.digits) for x in range(n))
       return ast.copy_location(_ast.Str(s=s), node)
     else:
       return node
@@ -515,7 +1343,7 @@ class PredicateRandomizer(ast.NodeTransformer):
 
   def get_random_comparator(self, node):
     if self.randomize():
-      comp = random.randint(1,4)
+      comp = self.rng.randint(1,4)
       if comp == 1:
         op = _ast.Lt()
       elif comp == 2:
@@ -563,10 +1391,203 @@ class PredicateRandomizer(ast.NodeTransformer):
         return ast.copy_location(_ast.Name(id='forall'), node)
     return node
 
-def parse_predicate_set(string_set):
+# Binary operators whose operands may be reordered during normalization.
+# Additions are only reordered if they are known to be numeric, since they
+# also concatenate strings and lists (See is_numeric).
+COMMUTATIVE_OPERATORS = ( _ast.Add, _ast.Mult, _ast.BitAnd, _ast.BitOr,
+                          _ast.BitXor )
+# Binary operators which strings and lists do not support
+NUMERIC_OPERATORS = ( _ast.Sub, _ast.Div, _ast.FloorDiv, _ast.Pow )
+FLIPPED_COMPARISONS = { _ast.Gt : _ast.Lt, _ast.GtE : _ast.LtE }
+SYMMETRIC_COMPARISONS = ( _ast.Eq, _ast.NotEq, _ast.Is, _ast.IsNot )
+
+class PredicateNormalizer(ast.NodeVisitor):
+  """
+  Rewrites predicate ASTs into a canonical form, so that equivalent
+  predicates can be recognized by comparing their canonical forms:
+
+    - Operands of chains of commutative binary operators are flattened and
+      sorted (x + (2 + y) --> x + y + 2). Additions are only sorted if one
+      of their operands is numeric (See is_numeric), since concatenating
+      strings or lists is not commutative.
+    - Comparisons are flipped to use < and <= instead of > and >=
+      (x > 1 --> 1 < x), and the sides of ==, !=, is and is not are sorted
+    - Nested conjunctions and disjunctions are flattened, and their operands
+      are sorted and deduplicated (b and (a and b) --> a and b)
+
+  Operands are ordered by their ast.dump representation. The input AST is
+  not modified, so cached ASTs can be normalized. Canonical ASTs do not
+  preserve the evaluation order of their operands, and are only meant for
+  comparison.
+  """
+
+  def normalize(self, tree):
+    return self.visit(tree)
+
+  def generic_visit(self, node):
+    copy = type(node)()
+    for field, value in ast.iter_fields(node):
+      if isinstance(value, list):
+        value = [ self.visit(item) if isinstance(item, ast.AST) else item
+                  for item in value ]
+      elif isinstance(value, ast.AST):
+        value = self.visit(value)
+      setattr(copy, field, value)
+    return copy
+
+  def get_operands(self, node, node_type, op_type, operands):
+    if isinstance(node, node_type) and isinstance(node.op, op_type):
+      if node_type is _ast.BoolOp:
+        for value in node.values:
+          self.get_operands(value, node_type, op_type, operands)
+      else:
+        self.get_operands(node.left, node_type, op_type, operands)
+        self.get_operands(node.right, node_type, op_type, operands)
+    else:
+      operands.append(self.visit(node))
+    return operands
+
+  def visit_BinOp(self, node):
+    op_type = type(node.op)
+    if not issubclass(op_type, COMMUTATIVE_OPERATORS):
+      return self.generic_visit(node)
+    operands = self.get_operands(node, _ast.BinOp, op_type, [])
+    if op_type is not _ast.Add or \
+        [ operand for operand in operands if is_numeric(operand) ]:
+      operands = sort_nodes(operands)
+    result = operands[0]
+    for operand in operands[1:]:
+      result = _ast.BinOp(left=result, op=op_type(), right=operand)
+    return result
+
+  def visit_BoolOp(self, node):
+    op_type = type(node.op)
+    operands = self.get_operands(node, _ast.BoolOp, op_type, [])
+    operands = sort_nodes(operands, unique=True)
+    if len(operands) == 1:
+      return operands[0]
+    return _ast.BoolOp(op=op_type(), values=operands)
+
+  def visit_Compare(self, node):
+    operands = [ self.visit(node.left) ]
+    operands.extend([ self.visit(comparator) for comparator in node.comparators ])
+    op_types = [ type(op) for op in node.ops ]
+    if len(op_types) == 1 and issubclass(op_types[0], SYMMETRIC_COMPARISONS):
+      operands = sort_nodes(operands)
+    elif not [ op for op in op_types if op not in FLIPPED_COMPARISONS ]:
+      operands.reverse()
+      op_types = [ FLIPPED_COMPARISONS[op] for op in reversed(op_types) ]
+    return _ast.Compare(left=operands[0], ops=[ op() for op in op_types ],
+                        comparators=operands[1:])
+
+def is_numeric(node):
+  """
+  Check whether an expression can only evaluate to a number (or fail). An
+  addition with such an operand is a numeric addition whenever it succeeds,
+  so its operands may be reordered (See PredicateNormalizer).
+
+  Returns:
+    True for number literals, len() calls, unary arithmetic, operators that
+    strings and lists do not support (See NUMERIC_OPERATORS) and arithmetic
+    on numeric operands, and False for any other expression
+  """
+  if isinstance(node, _ast.Num):
+    return True
+  elif isinstance(node, _ast.UnaryOp):
+    return isinstance(node.op, (_ast.USub, _ast.UAdd, _ast.Invert))
+  elif isinstance(node, _ast.BinOp):
+    if isinstance(node.op, NUMERIC_OPERATORS):
+      return True
+    elif isinstance(node.op, _ast.Add):
+      return is_numeric(node.left) or is_numeric(node.right)
+    elif isinstance(node.op, _ast.Mod):
+      return is_numeric(node.left)
+    elif isinstance(node.op, _ast.Mult):
+      return is_numeric(node.left) and is_numeric(node.right)
+  elif isinstance(node, _ast.Call):
+    return isinstance(node.func, _ast.Name) and node.func.id == 'len'
+  return False
+
+def sort_nodes(nodes, unique=False):
+  """
+  Sort a list of AST nodes by their ast.dump representation.
+
+  Args:
+    nodes A list of AST nodes
+    unique  Drop all but one of the nodes with the same representation
+  """
+  keyed = [ (ast.dump(node), node) for node in nodes ]
+  keyed.sort(key=lambda item: item[0])
+  result = []
+  previous = None
+  for key, node in keyed:
+    if unique and key == previous:
+      continue
+    result.append(node)
+    previous = key
+  return result
+
+def get_canonical_hash(tree):
+  """
+  Compute a hash of the canonical form of an AST (See PredicateNormalizer).
+  Equivalent predicates usually have equal hashes, and predicates with
+  equal hashes are always equivalent up to the reordering of operands.
+
+  Returns:
+    A hexadecimal SHA-1 digest
+  """
+  normalizer = PredicateNormalizer()
+  return hashlib.sha1(ast.dump(normalizer.normalize(tree))).hexdigest()
+
+# Canonical hashes and similarity signatures of predicates and of their
+# parts, keyed by predicate string (See get_predicate_parts)
+PREDICATE_PARTS = predicate_cache.LRUCache(COMPILED_PREDICATE_CACHE_SIZE)
+
+def get_predicate_parts(string):
+  """
+  Analyze the parts of a predicate that are matched separately when
+  comparing predicate sets: the operands of a top level conjunction or
+  disjunction, or the whole predicate otherwise (See pre_process_ast_set).
+  Results are cached, and must not be modified.
+
+  Returns:
+    A tuple containing the canonical hash of the predicate, a tuple of the
+    canonical hashes of its parts and a tuple of the similarity signatures
+    of its parts (See get_canonical_hash and get_signature)
+  """
+  result = PREDICATE_PARTS.get(string)
+  if result is None:
+    tree = parse(string, copy=False)
+    predicate_hash = get_canonical_hash(tree)
+    parts = pre_process_ast_set([ tree ])
+    if len(parts) == 1:
+      part_hashes = (predicate_hash,)
+    else:
+      part_hashes = tuple([ get_canonical_hash(part) for part in parts ])
+    signatures = tuple([ get_signature(part) for part in parts ])
+    result = (predicate_hash, part_hashes, signatures)
+    PREDICATE_PARTS.put(string, result)
+  return result
+
+def get_predicate_hashes(string):
+  """
+  Returns:
+    A tuple containing the canonical hash of a predicate and a tuple of the
+    canonical hashes of its parts (See get_predicate_parts)
+  """
+  return get_predicate_parts(string)[:2]
+
+def predicates_equivalent(p1, p2):
+  """
+  Check whether two predicate strings have the same canonical form. Once
+  the hashes of the predicates are cached, this is a constant time check.
+  """
+  return get_predicate_hashes(p1)[0] == get_predicate_hashes(p2)[0]
+
+def parse_predicate_set(string_set, copy=True):
   tree_set = []
   for string in string_set:
-    tree_set.append(parse(string))
+    tree_set.append(parse(string, copy))
   return tree_set
 
 def pre_process_ast_set(ast_set):
@@ -581,108 +1602,371 @@ def pre_process_ast_set(ast_set):
       tree_set.append(item)
   return tree_set
 
-def compare_predicate_sets(set1, set2):
-  temp_set1 = parse_predicate_set(set1)
-  temp_set2 = parse_predicate_set(set2)
-  tree_set1 = pre_process_ast_set(temp_set1)
-  tree_set2 = pre_process_ast_set(temp_set2)
-
-  temp_tree_set2 = []
-  for tree in tree_set2:
-    temp_tree_set2.append(tree)
+def get_signature(tree):
+  """
+  Compute the similarity signature of an AST: the number of nodes in the
+  tree and a multiset of their match keys. Since the NodeMatcher matches
+  nodes by their match keys alone, the similarity of two trees can be
+  computed from their signatures (See signature_similarity).
+
+  Returns:
+    A (node count, Counter of match keys) tuple
+  """
+  enumerator = NodeEnumerator()
+  nodes = enumerator.get_node_list(tree)
+  return len(nodes), Counter([ get_match_key(node) for node in nodes ])
+
+def signature_similarity(signature1, signature2):
+  """
+  Compute the similarity of two trees from their signatures. The result is
+  the same as that of ASTSimilarityChecker.get_similarity: 2S / (2S + L + R)
+  where S is the number of matching nodes, which simplifies to
+  2S / (N1 + N2).
+  """
+  shared = get_shared_count(signature1, signature2)
+  return (2.0 * shared) / (signature1[0] + signature2[0])
+
+def get_shared_count(signature1, signature2):
+  """
+  Count the nodes of two trees that match each other, given the signatures
+  of the trees (See get_signature).
+  """
+  keys1 = signature1[1]
+  keys2 = signature2[1]
+  if len(keys1) > len(keys2):
+    keys1, keys2 = keys2, keys1
+  shared = 0
+  for key, count in keys1.iteritems():
+    other = keys2.get(key)
+    if other:
+      shared += min(count, other)
+  return shared
+
+def get_similarity_row(arguments):
+  """
+  Compute one row of a similarity matrix (See get_similarity_matrix).
+
+  Args:
+    arguments A tuple containing the signature of the row, the signatures
+              of the columns and the similarity threshold
+
+  Returns:
+    A dictionary of the similarities that meet the threshold, keyed by
+    column index
+  """
+  signature, signatures, threshold = arguments
+  count1 = signature[0]
+  row = {}
+  for j in range(len(signatures)):
+    count2 = signatures[j][0]
+    # Cheap upper bound: all the nodes of the smaller tree match
+    if (2.0 * min(count1, count2)) / (count1 + count2) < threshold:
+      continue
+    sim = signature_similarity(signature, signatures[j])
+    if sim >= threshold:
+      row[j] = sim
+  return row
+
+def get_similarity_matrix(signatures1, signatures2, threshold, pool=None):
+  """
+  Compute the similarities of all the pairs of trees from two sets, keeping
+  only the similarities that meet the threshold. Pairs whose node counts
+  alone rule out a similarity above the threshold are not compared.
+
+  Args:
+    signatures1 Signatures of the trees in the first set (See get_signature)
+    signatures2 Signatures of the trees in the second set
+    threshold Minimum similarity to record
+    pool  An optional multiprocessing pool used to compute the rows
+
+  Returns:
+    A list holding a dictionary of similarities keyed by column index for
+    each tree in the first set
+  """
+  arguments = [ (signature, signatures2, threshold)
+                for signature in signatures1 ]
+  if pool is None:
+    return map(get_similarity_row, arguments)
+  return pool.map(get_similarity_row, arguments)
+
+def match_greedy(matrix, column_count):
+  """
+  Match the rows of a similarity matrix with columns in row order. Each row
+  is matched with the most similar column that is still available. The
+  result is a maximal matching, and hence has at least half as many pairs
+  as an optimal matching. It depends on the order of the rows.
+
+  Returns:
+    A list of matched (row, column) tuples
+  """
+  available = [ True ] * column_count
+  matches = []
+  for i in range(len(matrix)):
+    best = None
+    for j in sorted(matrix[i]):
+      if available[j] and (best is None or matrix[i][j] > matrix[i][best]):
+        best = j
+    if best is not None:
+      available[best] = False
+      matches.append((i, best))
+  return matches
+
+def match_optimal(matrix):
+  """
+  Match the rows of a similarity matrix with columns so that the number of
+  matched pairs is maximal, and among such matchings, the total similarity
+  of the matched pairs is maximal. This is solved as a maximum weight
+  bipartite matching where each pair weighs B + similarity, with B larger
+  than any achievable total similarity.
+
+  Returns:
+    A list of matched (row, column) tuples
+  """
+  edges = {}
+  bonus = len(matrix) + 1.0
+  for i in range(len(matrix)):
+    for j, sim in matrix[i].iteritems():
+      edges[(i, j)] = bonus + sim
+  return assignment.max_weight_matching(edges)
+
+def compare_predicate_sets(set1, set2, method=OPTIMAL_MATCHING, pool=None,
+                           threshold=None):
+  """
+  Compute the similarity of two predicate sets. Predicates of the two sets
+  are paired up when their similarity meets PREDICATE_SIMILARITY_THRESHOLD,
+  and the result is the Dice coefficient 2S / (2S + L + R), where S is the
+  number of pairs and L and R are the numbers of unpaired predicates in
+  each set. Top level conjunctions and disjunctions are split into their
+  operands before matching. Predicates with the same canonical form (See
+  PredicateNormalizer) are considered identical, and are paired up even if
+  their similarity misses the threshold.
+
+  Args:
+    set1  A list of predicate strings
+    set2  A list of predicate strings
+    method  OPTIMAL_MATCHING to pair up as many predicates as possible, or
+            GREEDY_MATCHING to pair each predicate of set1 in turn with the
+            most similar remaining predicate of set2 (faster for large sets,
+            but may find fewer pairs)
+    pool  An optional multiprocessing pool used to compute the similarities
+    threshold Minimum similarity of paired predicates (defaults to
+              PREDICATE_SIMILARITY_THRESHOLD)
+
+  Returns:
+    The similarity of the two sets, or -1 if both sets are empty
+  """
+  if threshold is None:
+    threshold = PREDICATE_SIMILARITY_THRESHOLD
+  if method not in (GREEDY_MATCHING, OPTIMAL_MATCHING):
+    raise ValueError('Unknown matching method: ' + str(method))
+  hashes1, signatures1 = get_part_hashes_and_signatures(set1)
+  hashes2, signatures2 = get_part_hashes_and_signatures(set2)
+  exact_matches = count_equal_hashes(hashes1, hashes2)
+  if exact_matches == min(len(hashes1), len(hashes2)):
+    # Every part of the smaller set has an equivalent in the other set, so
+    # no matching can pair up more parts
+    return get_set_similarity([], 0, exact_matches, len(hashes1),
+                              len(hashes2), method)
+  matrix = get_similarity_matrix(signatures1, signatures2, threshold, pool)
+  seed_equal_hashes(matrix, hashes1, hashes2)
+  return get_set_similarity(matrix, len(hashes2), 0, len(hashes1),
+                            len(hashes2), method)
+
+def get_part_hashes_and_signatures(string_set):
+  """
+  Returns:
+    A tuple containing the list of canonical hashes and the list of
+    similarity signatures of the parts of the given predicates, in order
+    (See get_predicate_parts)
+  """
+  hashes = []
+  signatures = []
+  for string in string_set:
+    predicate_hash, part_hashes, part_signatures = get_predicate_parts(string)
+    hashes.extend(part_hashes)
+    signatures.extend(part_signatures)
+  return hashes, signatures
+
+def count_equal_hashes(hashes1, hashes2):
+  """
+  Count the pairs of equal canonical hashes that can be formed from two
+  lists, where each hash is paired at most once.
+
+  Returns:
+    The maximum number of pairs of equal hashes
+  """
+  counts1 = Counter(hashes1)
+  counts2 = Counter(hashes2)
+  count = 0
+  for part_hash, count1 in counts1.iteritems():
+    count2 = counts2.get(part_hash)
+    if count2:
+      count += min(count1, count2)
+  return count
+
+def seed_equal_hashes(matrix, hashes1, hashes2):
+  """
+  Set the similarity of every pair of parts with equal canonical hashes to
+  1.0 in a similarity matrix, so that equivalent parts can always be paired
+  up. The choice between them and the other candidate pairs is left to the
+  matching, since pairing equivalent parts up front may prevent a matching
+  with more pairs.
+
+  Args:
+    matrix  Similarity matrix of the parts (See get_similarity_matrix)
+    hashes1 Canonical hashes of the parts of the first set
+    hashes2 Canonical hashes of the parts of the second set
+  """
+  columns = {}
+  for j in range(len(hashes2)):
+    columns.setdefault(hashes2[j], []).append(j)
+  for i in range(len(hashes1)):
+    for j in columns.get(hashes1[i], ()):
+      matrix[i][j] = 1.0
+
+def get_set_similarity(matrix, column_count, exact_matches, count1, count2,
+                       method=OPTIMAL_MATCHING):
+  """
+  Compute the similarity of two predicate sets from the similarity matrix
+  of their predicates (See compare_predicate_sets).
+
+  Args:
+    matrix  Similarity matrix of the predicates (See get_similarity_matrix
+            and seed_equal_hashes)
+    column_count  Number of columns of the matrix
+    exact_matches Number of predicates paired up outside of the matrix
+    count1  Number of predicates in the first set
+    count2  Number of predicates in the second set
+    method  OPTIMAL_MATCHING or GREEDY_MATCHING
+
+  Returns:
+    The similarity of the two sets, or -1 if both sets are empty
+  """
+  if method == GREEDY_MATCHING:
+    matches = match_greedy(matrix, column_count)
+  else:
+    matches = match_optimal(matrix)
 
-  checker = ASTSimilarityChecker()
-  similarities = {}
-  matches = {}
-  for tree1 in tree_set1:
-    for tree2 in temp_tree_set2:
-      sim = checker.get_similarity(tree1, tree2)
-      if sim >= PREDICATE_SIMILARITY_THRESHOLD:
-        prev_sim = similarities.get(tree1)
-        if prev_sim is None or sim > prev_sim:
-          similarities[tree1] = sim
-          matches[tree1] = tree2
-    if matches.has_key(tree1):
-      temp_tree_set2.remove(matches[tree1])
-
-  S = len(similarities)
-  L = len(tree_set1) - S
-  R = len(tree_set2) - S
+  S = exact_matches + len(matches)
+  L = count1 - S
+  R = count2 - S
   if S + L + R == 0:
     return -1
   else:
     return (2.0 * S) / (2.0 * S + L + R)
 
+def methods_compatible(method1, method2):
+  """
+  Check whether operations with the given HTTP methods may be equivalent.
+  Operations with the same method are compatible, and so are GET and POST,
+  and POST and PUT operations.
+  """
+  methods = sorted([method1, method2])
+  return methods[0] == methods[1] or methods == ['GET','POST'] or methods == ['POST','PUT']
+
+def compare_operation_conditions(api1, op1, api2, op2, threshold=None,
+                                 method=OPTIMAL_MATCHING):
+  """
+  Compare the pre- and post-conditions of two operations.
+
+  Args:
+    threshold Minimum similarity of paired predicates (defaults to
+              PREDICATE_SIMILARITY_THRESHOLD)
+    method  OPTIMAL_MATCHING or GREEDY_MATCHING
+
+  Returns:
+    A tuple containing the similarity of the pre-conditions and the
+    similarity of the post-conditions (See compare_predicate_sets)
+  """
+  sim1 = compare_predicate_sets(op1.get_pre_conditions(api1),
+                                op2.get_pre_conditions(api2), method,
+                                threshold=threshold)
+  sim2 = compare_predicate_sets(op1.get_post_conditions(api1),
+                                op2.get_post_conditions(api2), method,
+                                threshold=threshold)
+  return sim1, sim2
+
+def conditions_match(sim1, sim2, threshold=None):
+  """
+  Decide whether two operations are equivalent given the similarities of
+  their pre- and post-conditions (See compare_operation_conditions). A
+  similarity of -1 means neither operation has conditions of that kind.
+
+  Args:
+    threshold Minimum similarity of the condition sets (defaults to
+              PREDICATE_SET_SIMILARITY_THRESHOLD)
+  """
+  if threshold is None:
+    threshold = PREDICATE_SET_SIMILARITY_THRESHOLD
+  if sim1 >= threshold and sim2 >= threshold:
+    return True
+  elif sim1 >= threshold and sim2 == -1:
+    return True
+  elif sim1 == -1 and sim2 >= threshold:
+    return True
+  return False
+
 def compare_operations(api1, op1, api2, op2):
-  methods = sorted([op1.method, op2.method])
-  if methods[0] == methods[1] or methods == ['GET','POST'] or methods == ['POST','PUT']:
-    sim1 = compare_predicate_sets(op1.get_pre_conditions(api1), op2.get_pre_conditions(api2))
-    sim2 = compare_predicate_sets(op1.get_post_conditions(api1), op2.get_post_conditions(api2))
-    print sim1, sim2
-    if sim1 >= PREDICATE_SET_SIMILARITY_THRESHOLD and sim2 >= PREDICATE_SET_SIMILARITY_THRESHOLD:
-      return True
-    elif sim1 >= PREDICATE_SET_SIMILARITY_THRESHOLD and sim2 == -1:
-      return True
-    elif sim1 == -1 and sim2 >= PREDICATE_SET_SIMILARITY_THRESHOLD:
-      return True
+  if methods_compatible(op1.method, op2.method):
+    sim1, sim2 = compare_operation_conditions(api1, op1, api2, op2)
+    return conditions_match(sim1, sim2)
   return False
 
-def randomize_predicate(predicate):
-  randomizer = PredicateRandomizer()
+def randomize_predicate(predicate, rng=None):
+  randomizer = PredicateRandomizer(rng)
   tree = randomizer.visit(parse(predicate))
   return ast2code.to_source(tree)
 
-def randomize_operation(api_def, op):
-  if op.input and op.input.type:
-    data_type = op.input.type.type
-    if isinstance(data_type, api.CustomTypeRef):
-      type_def = api_def.get_type_by_name(data_type.get_reference_name())
-      constraints = []
-      for constraint in type_def.constraints:
-        randomize = random.randint(0,2) == 1
-        if randomize:
-          constraints.append(randomize_predicate(constraint))
-        else:
-          constraints.append(constraint)
-      type_def.constraints = constraints
-
-  if op.output.type:
-    data_type = op.output.type.type
-    if isinstance(data_type, api.CustomTypeRef):
-      type_def = api_def.get_type_by_name(data_type.get_reference_name())
-      constraints = []
-      for constraint in type_def.constraints:
-        randomize = random.randint(0,2) == 1
-        if randomize:
-          constraints.append(randomize_predicate(constraint))
-        else:
-          constraints.append(constraint)
-      type_def.constraints = constraints
-
-  requires = []
-  for condition in op.requires:
-    randomize = random.randint(0,2) == 1
+def randomize_conditions(conditions, rng=None):
+  """
+  Randomize each of the given predicates with a probability of 1/3.
+
+  Args:
+    conditions  A list of predicate strings
+    rng A random.Random instance to draw from (defaults to the global
+        random number generator)
+
+  Returns:
+    A new list of predicate strings
+  """
+  if rng is None:
+    rng = random
+  result = []
+  for condition in conditions:
+    randomize = rng.randint(0,2) == 1
     if randomize:
-      requires.append(randomize_predicate(condition))
+      result.append(randomize_predicate(condition, rng))
     else:
-      requires.append(condition)
-  op.requires = requires
-
-  ensures = []
-  for condition in op.ensures:
-    randomize = random.randint(0,2) == 1
-    if randomize:
-      ensures.append(randomize_predicate(condition))
-    else:
-      ensures.append(condition)
-  op.ensures = ensures
+      result.append(condition)
+  return result
+
+def get_custom_type_name(message):
+  """
+  Returns:
+    The name of the custom type of an operation input or output, or None if
+    the message does not have a custom type
+  """
+  if message and message.type:
+    data_type = message.type.type
+    if isinstance(data_type, api.CustomTypeRef):
+      return data_type.get_reference_name()
+  return None
+
+def randomize_operation(api_def, op, rng=None):
+  for message in (op.input, op.output):
+    type_name = get_custom_type_name(message)
+    if type_name is not None:
+      type_def = api_def.get_type_by_name(type_name)
+      type_def.constraints = randomize_conditions(type_def.constraints, rng)
+  op.requires = randomize_conditions(op.requires, rng)
+  op.ensures = randomize_conditions(op.ensures, rng)
   return op
 
-def randomize_api(api_def, name, output_dir):
+def randomize_api(api_def, name, output_dir, rng=None):
   api_def.name = name
   for resource in api_def.resources:
     for op in resource.operations:
-      randomize_operation(api_def, op)
+      randomize_operation(api_def, op, rng)
   if not os.path.exists(output_dir):
     os.mkdir(output_dir)
   output = open(os.path.join(output_dir, name + '.json'), 'w')
@@ -3,6 +3,9 @@ from codegen_core import *
 
 __author__ = 'hiranya'
 
+SERIALIZE = 'serialize'
+DESERIALIZE = 'deserialize'
+
 def get_function_name(prefix, data_type, media_type, api):
   name = ''
   if isinstance(data_type, ContainerTypeRef):
@@ -21,18 +24,54 @@ def sanitize(string):
     temp_name = 'method_' + temp_name
   return temp_name
 
-def get_serializer(media_type, classes, class_name_mappings):
+def get_type_reference_name(data_type):
+  if isinstance(data_type, TypeRef):
+    return data_type.get_reference_name()
+  return data_type.name
+
+def get_serializer(media_type, classes, class_name_mappings, memo=None):
+  """
+  Create a serializer for the specified media type.
+
+  Args:
+    media_type  Media type of the serializer (json, form...)
+    classes List of the generated classes. Other sequences than a MemberList
+            (See codegen_core.MemberList) are copied into one, so classes
+            generated later are only seen if a MemberList is passed.
+    class_name_mappings Dictionary of generated class names keyed by type name
+    memo  A dictionary shared by all the serializers of a generated module,
+          in which the names of the functions generated so far are recorded
+          (See AbstractSerializer). Serializer functions are generated only
+          once per memo.
+
+  Returns:
+    An AbstractSerializer instance
+  """
   if media_type == 'json':
-    return JSONSerializer(classes, class_name_mappings)
+    return JSONSerializer(classes, class_name_mappings, memo)
   elif media_type == 'form':
-    return FormSerializer(classes, class_name_mappings)
+    return FormSerializer(classes, class_name_mappings, memo)
   else:
-    return UnsupportedSerializer(classes, class_name_mappings, media_type)
+    return UnsupportedSerializer(classes, class_name_mappings, media_type, memo)
 
 class AbstractSerializer:
-  def __init__(self, classes, class_name_mappings):
+  """
+  Base class of the serializer generators. generate_serializers and
+  generate_deserializers return the static functions needed to serialize or
+  deserialize a data type, in dependency order. Functions are memoized by
+  (type reference name, media type, direction), so a function that has
+  already been generated with the same memo is neither generated nor
+  returned again, and types shared by many others are only visited once.
+  """
+
+  def __init__(self, classes, class_name_mappings, memo=None):
+    if not isinstance(classes, MemberList):
+      classes = MemberList(classes)
     self.classes = classes
     self.class_name_mappings = class_name_mappings
+    if memo is None:
+      memo = {}
+    self.memo = memo
 
   def generate_serializers(self, data_type, api):
     raise NotImplementedError
@@ -43,17 +82,47 @@ class AbstractSerializer:
   def generate_final_serializer(self):
     raise NotImplementedError
 
+  def lookup(self, data_type, media_type, direction):
+    """
+    Returns:
+      The name of the function generated with the memo for the specified
+      type, media type and direction, or None if there is no such function
+    """
+    return self.memo.get((get_type_reference_name(data_type), media_type,
+                          direction))
+
+  def record(self, data_type, media_type, direction, function_name):
+    self.memo[(get_type_reference_name(data_type), media_type,
+               direction)] = function_name
+
+  def add_final_serializer(self, media_type, functions):
+    key = (None, media_type, SERIALIZE)
+    if key not in self.memo:
+      sm = self.generate_final_serializer()
+      self.memo[key] = sm.name
+      functions.append(sm)
+
   def get_class_parameter(self, data_type, key):
-    class_name = self.class_name_mappings[data_type]
-    for clazz in self.classes:
-      if clazz.name == class_name:
-        constructor = clazz.get_constructor()
-        return constructor.get_mapping(key)
-    return None
+    """
+    Get the constructor argument of the generated class of a data type that
+    holds the specified field.
+
+    Args:
+      data_type Name of the data type
+      key Name of the field
+
+    Returns:
+      Name of the constructor argument, or None if no class has been
+      generated for the data type
+    """
+    clazz = self.classes.lookup(self.class_name_mappings[data_type])
+    if clazz is None:
+      return None
+    return clazz.get_constructor().get_mapping(key)
 
 class UnsupportedSerializer(AbstractSerializer):
-  def __init__(self, classes, class_name_mappings, media_type):
-    AbstractSerializer.__init__(self, classes, class_name_mappings)
+  def __init__(self, classes, class_name_mappings, media_type, memo=None):
+    AbstractSerializer.__init__(self, classes, class_name_mappings, memo)
     self.media_type = media_type
 
   def generate_final_serializer(self):
@@ -63,22 +132,29 @@ class UnsupportedSerializer(AbstractSerializer):
     return sm
 
   def generate_serializers(self, data_type, api):
-    function_name = get_function_name('serialize', data_type, self.media_type, api)
-    sm = StaticMethod(function_name)
-    sm.arguments.append(MethodArgument('obj'))
-    sm.add_line('raise NotImplementedError')
-    return [ sm, self.generate_final_serializer() ]
+    functions = []
+    self.generate_function(data_type, api, SERIALIZE, functions)
+    self.add_final_serializer(self.media_type, functions)
+    return functions
 
   def generate_deserializers(self, data_type, api):
-    function_name = get_function_name('deserialize', data_type, self.media_type, api)
+    functions = []
+    self.generate_function(data_type, api, DESERIALIZE, functions)
+    return functions
+
+  def generate_function(self, data_type, api, direction, functions):
+    if self.lookup(data_type, self.media_type, direction) is not None:
+      return
+    function_name = get_function_name(direction, data_type, self.media_type, api)
+    self.record(data_type, self.media_type, direction, function_name)
     sm = StaticMethod(function_name)
     sm.arguments.append(MethodArgument('obj'))
     sm.add_line('raise NotImplementedError')
-    return [ sm ]
+    functions.append(sm)
 
 class JSONSerializer(AbstractSerializer):
-  def __init__(self, classes, class_name_mappings):
-    AbstractSerializer.__init__(self, classes, class_name_mappings)
+  def __init__(self, classes, class_name_mappings, memo=None):
+    AbstractSerializer.__init__(self, classes, class_name_mappings, memo)
 
   def generate_final_serializer(self):
     sm = StaticMethod('serialize_final_json')
@@ -88,7 +164,27 @@ class JSONSerializer(AbstractSerializer):
 
   def generate_serializers(self, data_type, api):
     serializers = list()
+    self.generate_serializer(data_type, api, serializers)
+    return serializers
+
+  def generate_serializer(self, data_type, api, serializers):
+    """
+    Generate the serializer function of a data type, along with the
+    serializers of the types it refers to, unless they have already been
+    generated.
+
+    Returns:
+      Name of the serializer function of the data type
+    """
+    function_name = self.lookup(data_type, 'json', SERIALIZE)
+    if function_name is not None:
+      return function_name
+    if isinstance(data_type, CustomTypeRef):
+      # References share the function of the type they refer to
+      actual_type = api.get_type_by_name(data_type.get_reference_name())
+      return self.generate_serializer(actual_type, api, serializers)
     function_name = get_function_name('serialize', data_type, 'json', api)
+    self.record(data_type, 'json', SERIALIZE, function_name)
     sm = StaticMethod(function_name)
     sm.arguments.append(MethodArgument('obj'))
 
@@ -102,9 +198,9 @@ class JSONSerializer(AbstractSerializer):
         sm.add_line('output = list()')
         sm.add_line('for item in obj:')
         sm.indent()
-        child_serializers = self.generate_serializers(data_type.type, api)
-        serializers.extend(child_serializers)
-        sm.add_line('output.append(' + child_serializers[-1].name + '(item))')
+        child_serializer = self.generate_serializer(data_type.type, api,
+                                                    serializers)
+        sm.add_line('output.append(' + child_serializer + '(item))')
         sm.dedent()
         sm.add_line('return output')
       serializers.append(sm)
@@ -122,13 +218,13 @@ class JSONSerializer(AbstractSerializer):
         elif isinstance(field_type, TypeDef):
           named_type = NamedTypeDef(name=data_type.name + '_' + field.name,
             fields=field_type.fields)
-          child_serializers = self.generate_serializers(named_type, api)
-          serializers.extend(child_serializers)
-          value = child_serializers[-1].name + '(obj.' + param + ')'
+          child_serializer = self.generate_serializer(named_type, api,
+                                                      serializers)
+          value = child_serializer + '(obj.' + param + ')'
         else:
-          child_serializers = self.generate_serializers(field_type, api)
-          serializers.extend(child_serializers)
-          value = child_serializers[-1].name + '(obj.' + param + ')'
+          child_serializer = self.generate_serializer(field_type, api,
+                                                      serializers)
+          value = child_serializer + '(obj.' + param + ')'
         if field.optional:
           sm.add_line('if obj.' + param + ':')
           sm.indent()
@@ -138,16 +234,33 @@ class JSONSerializer(AbstractSerializer):
           sm.add_line('output[\'' + key + '\'] = ' + value)
       sm.add_line('return output')
       serializers.append(sm)
-    else:
-      actual_type = api.get_type_by_name(data_type.get_reference_name())
-      serializers.extend(self.generate_serializers(actual_type, api))
 
-    serializers.append(self.generate_final_serializer())
-    return serializers
+    self.add_final_serializer('json', serializers)
+    return function_name
 
   def generate_deserializers(self, data_type, api):
     deserializers = list()
+    self.generate_deserializer(data_type, api, deserializers)
+    return deserializers
+
+  def generate_deserializer(self, data_type, api, deserializers):
+    """
+    Generate the deserializer function of a data type, along with the
+    deserializers of the types it refers to, unless they have already been
+    generated.
+
+    Returns:
+      Name of the deserializer function of the data type
+    """
+    function_name = self.lookup(data_type, 'json', DESERIALIZE)
+    if function_name is not None:
+      return function_name
+    if isinstance(data_type, CustomTypeRef):
+      # References share the function of the type they refer to
+      actual_type = api.get_type_by_name(data_type.get_reference_name())
+      return self.generate_deserializer(actual_type, api, deserializers)
     function_name = get_function_name('deserialize', data_type, 'json', api)
+    self.record(data_type, 'json', DESERIALIZE, function_name)
     sm = StaticMethod(function_name)
     sm.arguments.append(MethodArgument('obj'))
     sm.add_line('if obj is None:')
@@ -176,9 +289,9 @@ class JSONSerializer(AbstractSerializer):
       if isinstance(data_type.type, PrimitiveTypeRef):
         sm.add_line('container.append(item)')
       else:
-        child_deserializers = self.generate_deserializers(data_type.type, api)
-        deserializers.extend(child_deserializers)
-        sm.add_line('container.append(' + child_deserializers[-1].name + '(item))')
+        child_deserializer = self.generate_deserializer(data_type.type, api,
+                                                        deserializers)
+        sm.add_line('container.append(' + child_deserializer + '(item))')
       sm.dedent()
       if data_type.container == 'list':
         sm.add_line('return list(container)')
@@ -216,26 +329,23 @@ class JSONSerializer(AbstractSerializer):
           elif isinstance(field_type, TypeDef):
             named_type = NamedTypeDef(name=data_type.name + '_' + field.name,
               fields=field_type.fields)
-            child_deserializers = self.generate_deserializers(named_type, api)
-            deserializers.extend(child_deserializers)
-            sm.add_line(param + ' = ' + child_deserializers[-1].name + '(data.get(\'' + field.name + '\'))')
+            child_deserializer = self.generate_deserializer(named_type, api,
+                                                            deserializers)
+            sm.add_line(param + ' = ' + child_deserializer + '(data.get(\'' + field.name + '\'))')
           else:
-            child_deserializers = self.generate_deserializers(field_type, api)
-            deserializers.extend(child_deserializers)
-            sm.add_line(param + ' = ' + child_deserializers[-1].name + '(data.get(\'' + field.name + '\'))')
+            child_deserializer = self.generate_deserializer(field_type, api,
+                                                            deserializers)
+            sm.add_line(param + ' = ' + child_deserializer + '(data.get(\'' + field.name + '\'))')
           constructor += param + '=' + param
         constructor += ')'
         sm.add_line(constructor)
         sm.add_line('return result')
       deserializers.append(sm)
-    else:
-      actual_type = api.get_type_by_name(data_type.get_reference_name())
-      deserializers.extend(self.generate_deserializers(actual_type, api))
-    return deserializers
+    return function_name
 
 class FormSerializer(AbstractSerializer):
-  def __init__(self, classes, class_name_mappings):
-    AbstractSerializer.__init__(self, classes, class_name_mappings)
+  def __init__(self, classes, class_name_mappings, memo=None):
+    AbstractSerializer.__init__(self, classes, class_name_mappings, memo)
 
   def generate_final_serializer(self):
     sm = StaticMethod('serialize_final_form')
@@ -245,7 +355,27 @@ class FormSerializer(AbstractSerializer):
 
   def generate_serializers(self, data_type, api):
     serializers = list()
+    self.generate_serializer(data_type, api, serializers)
+    return serializers
+
+  def generate_serializer(self, data_type, api, serializers):
+    """
+    Generate the serializer function of a data type, along with the
+    serializers of the types it refers to, unless they have already been
+    generated.
+
+    Returns:
+      Name of the serializer function of the data type
+    """
+    function_name = self.lookup(data_type, 'form', SERIALIZE)
+    if function_name is not None:
+      return function_name
+    if isinstance(data_type, CustomTypeRef):
+      # References share the function of the type they refer to
+      actual_type = api.get_type_by_name(data_type.get_reference_name())
+      return self.generate_serializer(actual_type, api, serializers)
     function_name = get_function_name('serialize', data_type, 'form', api)
+    self.record(data_type, 'form', SERIALIZE, function_name)
     sm = StaticMethod(function_name)
     sm.arguments.append(MethodArgument('obj'))
 
@@ -259,9 +389,9 @@ class FormSerializer(AbstractSerializer):
         sm.add_line('output = list()')
         sm.add_line('for item in obj:')
         sm.indent()
-        child_serializers = self.generate_serializers(data_type.type, api)
-        serializers.extend(child_serializers)
-        sm.add_line('output.append(' + child_serializers[-1].name + '(item))')
+        child_serializer = self.generate_serializer(data_type.type, api,
+                                                    serializers)
+        sm.add_line('output.append(' + child_serializer + '(item))')
         sm.dedent()
         sm.add_line('return output')
       serializers.append(sm)
@@ -277,9 +407,9 @@ class FormSerializer(AbstractSerializer):
              isinstance(field_type.type, PrimitiveTypeRef):
           value = 'obj.' + param
         else:
-          child_serializers = self.generate_serializers(field_type, api)
-          serializers.extend(child_serializers)
-          value = child_serializers[-1].name + '(obj.' + param + ')'
+          child_serializer = self.generate_serializer(field_type, api,
+                                                      serializers)
+          value = child_serializer + '(obj.' + param + ')'
         if field.optional:
           sm.add_line('if obj.' + param + ':')
           sm.indent()
@@ -289,9 +419,6 @@ class FormSerializer(AbstractSerializer):
           sm.add_line('output[\'' + key + '\'] = ' + value)
       sm.add_line('return output')
       serializers.append(sm)
-    else:
-      actual_type = api.get_type_by_name(data_type.get_reference_name())
-      serializers.extend(self.generate_serializers(actual_type, api))
 
-    serializers.append(self.generate_final_serializer())
-    return serializers
\ No newline at end of file
+    self.add_final_serializer('form', serializers)
+    return function_name
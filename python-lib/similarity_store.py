@@ -0,0 +1,302 @@
+from array import array
+import json
+import mmap
+import multiprocessing
+import struct
+import sys
+from predicate_parser import *
+
+__author__ = 'hiranya'
+
+STORE_FORMAT = 1
+INDEX_SUFFIX = '.json'
+# Shared node counts are stored as unsigned 16-bit integers
+MAX_NODE_COUNT = 65535
+
+def get_shared_counts(signatures, i):
+  """
+  Compute the row of the condensed shared node count matrix for part i: the
+  number of matching nodes of part i and each part j > i.
+
+  Returns:
+    An array of unsigned 16-bit integers
+  """
+  signature = signatures[i]
+  row = array('H')
+  for j in range(i + 1, len(signatures)):
+    row.append(get_shared_count(signature, signatures[j]))
+  return row
+
+# Part signatures of a worker process (See build_similarity_store)
+STORE_SIGNATURES = None
+
+def init_store_worker(signatures):
+  global STORE_SIGNATURES
+  STORE_SIGNATURES = signatures
+
+def get_store_row(i):
+  return get_shared_counts(STORE_SIGNATURES, i).tostring()
+
+def get_condensed_index(i, j, count):
+  """
+  Returns:
+    The position of the entry of parts i and j (i < j) in a condensed
+    matrix of the given number of parts
+  """
+  return i * count - i * (i + 1) / 2 + (j - i - 1)
+
+def build_similarity_store(apis, path, processes=1):
+  """
+  Compute the similarities of all the predicates of a corpus of API
+  descriptions, and save them to a similarity store (See SimilarityStore).
+
+  The similarity of two predicates is 2S / (N1 + N2), where S is the number
+  of nodes they share, and N1 and N2 are their node counts (See
+  ASTSimilarityChecker). The store holds S for every pair of predicate
+  parts in a condensed upper triangular matrix of unsigned 16-bit integers,
+  so similarities can be recomputed exactly, without any rounding. The
+  matrix is written to the specified path, and a JSON index holding the
+  predicates, their parts and the operations of the corpus is written
+  alongside it.
+
+  Args:
+    apis  A list of API objects
+    path  Path of the matrix file
+    processes Number of worker processes used to compute the matrix
+  """
+  predicates = []
+  predicate_ids = {}
+  operations = []
+  for k in range(len(apis)):
+    api = apis[k]
+    for resource in api.resources:
+      for operation in resource.operations:
+        condition_ids = []
+        for conditions in (operation.get_pre_conditions(api),
+                           operation.get_post_conditions(api)):
+          ids = []
+          for condition in conditions:
+            predicate_id = predicate_ids.get(condition)
+            if predicate_id is None:
+              predicate_id = len(predicates)
+              predicate_ids[condition] = predicate_id
+              predicates.append(condition)
+            ids.append(predicate_id)
+          condition_ids.append(ids)
+        operations.append({
+          'api' : k,
+          'resource' : resource.name,
+          'name' : operation.name,
+          'method' : operation.method,
+          'pre' : condition_ids[0],
+          'post' : condition_ids[1]
+        })
+
+  parts = []
+  signatures = []
+  predicate_parts = []
+  for predicate in predicates:
+    predicate_hash, part_hashes, part_signatures = get_predicate_parts(predicate)
+    ids = []
+    for k in range(len(part_hashes)):
+      if part_signatures[k][0] > MAX_NODE_COUNT:
+        raise ValueError('Predicate too large for a similarity store: ' +
+                         predicate)
+      ids.append(len(parts))
+      parts.append([ part_hashes[k], part_signatures[k][0] ])
+      signatures.append(part_signatures[k])
+    predicate_parts.append(ids)
+
+  output = open(path, 'wb')
+  try:
+    pool = None
+    if processes > 1:
+      pool = multiprocessing.Pool(processes, init_store_worker, (signatures,))
+      rows = pool.imap(get_store_row, range(len(signatures)), 16)
+    else:
+      rows = (get_shared_counts(signatures, i).tostring()
+              for i in range(len(signatures)))
+    for row in rows:
+      if sys.byteorder != 'little':
+        row = array('H', row)
+        row.byteswap()
+        row = row.tostring()
+      output.write(row)
+  finally:
+    if pool is not None:
+      pool.terminate()
+      pool.join()
+    output.close()
+
+  index = {
+    'format' : STORE_FORMAT,
+    'apis' : [ api.name for api in apis ],
+    'predicates' : predicates,
+    'predicateParts' : predicate_parts,
+    'parts' : parts,
+    'operations' : operations
+  }
+  fp = open(path + INDEX_SUFFIX, 'w')
+  json.dump(index, fp)
+  fp.close()
+  return SimilarityStore(path)
+
+class SimilarityStore(object):
+  """
+  A precomputed predicate similarity matrix of a corpus of API descriptions
+  (See build_similarity_store). The matrix is memory mapped, so opening a
+  store is cheap regardless of its size. Predicate sets and operations of
+  the corpus can be compared with any thresholds, with the same results as
+  compare_predicate_sets and compare_operations, but without parsing or
+  comparing any ASTs.
+  """
+
+  def __init__(self, path):
+    fp = open(path + INDEX_SUFFIX)
+    index = json.load(fp)
+    fp.close()
+    if index.get('format') != STORE_FORMAT:
+      raise ValueError('Unsupported similarity store format: ' + path)
+    self.apis = index['apis']
+    self.predicates = index['predicates']
+    self.predicate_parts = index['predicateParts']
+    self.part_hashes = [ part[0] for part in index['parts'] ]
+    self.node_counts = [ part[1] for part in index['parts'] ]
+    self.operations = index['operations']
+    self.count = len(self.part_hashes)
+    self.predicate_ids = {}
+    for i in range(len(self.predicates)):
+      self.predicate_ids[self.predicates[i]] = i
+
+    self.matrix = None
+    if self.count > 1:
+      fp = open(path, 'rb')
+      try:
+        self.matrix = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+      finally:
+        fp.close()
+      expected = self.count * (self.count - 1)
+      if len(self.matrix) != expected:
+        raise ValueError('Corrupted similarity store: ' + path)
+
+  def close(self):
+    if self.matrix is not None:
+      self.matrix.close()
+      self.matrix = None
+
+  def get_similarity(self, i, j):
+    """
+    Returns:
+      The similarity of predicate parts i and j
+    """
+    if i == j:
+      return 1.0
+    elif i > j:
+      i, j = j, i
+    position = get_condensed_index(i, j, self.count)
+    shared = struct.unpack_from('<H', self.matrix, 2 * position)[0]
+    return (2.0 * shared) / (self.node_counts[i] + self.node_counts[j])
+
+  def get_part_ids(self, predicate_ids):
+    parts = []
+    for predicate_id in predicate_ids:
+      parts.extend(self.predicate_parts[predicate_id])
+    return parts
+
+  def compare_predicate_sets(self, ids1, ids2, threshold=None,
+                             method=OPTIMAL_MATCHING):
+    """
+    Compute the similarity of two predicate sets of the corpus (See
+    predicate_parser.compare_predicate_sets).
+
+    Args:
+      ids1  Ids of the predicates in the first set
+      ids2  Ids of the predicates in the second set
+      threshold Minimum similarity of paired predicates (defaults to
+                PREDICATE_SIMILARITY_THRESHOLD)
+      method  OPTIMAL_MATCHING or GREEDY_MATCHING
+    """
+    if threshold is None:
+      threshold = PREDICATE_SIMILARITY_THRESHOLD
+    if method not in (GREEDY_MATCHING, OPTIMAL_MATCHING):
+      raise ValueError('Unknown matching method: ' + str(method))
+    parts1 = self.get_part_ids(ids1)
+    parts2 = self.get_part_ids(ids2)
+    hashes1 = [ self.part_hashes[i] for i in parts1 ]
+    hashes2 = [ self.part_hashes[j] for j in parts2 ]
+    exact_matches = count_equal_hashes(hashes1, hashes2)
+    if exact_matches == min(len(parts1), len(parts2)):
+      return get_set_similarity([], 0, exact_matches, len(parts1),
+                                len(parts2), method)
+
+    matrix = []
+    for part1 in parts1:
+      count1 = self.node_counts[part1]
+      row = {}
+      for k in range(len(parts2)):
+        part2 = parts2[k]
+        count2 = self.node_counts[part2]
+        # Cheap upper bound: all the nodes of the smaller part match
+        if (2.0 * min(count1, count2)) / (count1 + count2) < threshold:
+          continue
+        sim = self.get_similarity(part1, part2)
+        if sim >= threshold:
+          row[k] = sim
+      matrix.append(row)
+    seed_equal_hashes(matrix, hashes1, hashes2)
+    return get_set_similarity(matrix, len(parts2), 0, len(parts1),
+                              len(parts2), method)
+
+  def get_predicate_ids(self, predicates):
+    """
+    Returns:
+      The ids of the given predicate strings, which must be in the store
+    """
+    return [ self.predicate_ids[predicate] for predicate in predicates ]
+
+  def compare_operations(self, k1, k2, predicate_threshold=None,
+                         set_threshold=None):
+    """
+    Check whether two operations of the corpus are equivalent (See
+    predicate_parser.compare_operations).
+
+    Args:
+      k1  Index of the first operation in the store
+      k2  Index of the second operation in the store
+      predicate_threshold Minimum similarity of paired predicates (defaults
+                          to PREDICATE_SIMILARITY_THRESHOLD)
+      set_threshold Minimum similarity of the condition sets (defaults to
+                    PREDICATE_SET_SIMILARITY_THRESHOLD)
+    """
+    op1 = self.operations[k1]
+    op2 = self.operations[k2]
+    if not methods_compatible(op1['method'], op2['method']):
+      return False
+    sim1 = self.compare_predicate_sets(op1['pre'], op2['pre'],
+                                       predicate_threshold)
+    sim2 = self.compare_predicate_sets(op1['post'], op2['post'],
+                                       predicate_threshold)
+    return conditions_match(sim1, sim2, set_threshold)
+
+  def find_matches(self, predicate_threshold=None, set_threshold=None,
+                   cross_api=True):
+    """
+    Find all the pairs of equivalent operations of the corpus.
+
+    Args:
+      predicate_threshold Minimum similarity of paired predicates
+      set_threshold Minimum similarity of the condition sets
+      cross_api Only report pairs of operations from different API
+                descriptions
+
+    Returns:
+      A list of (k1, k2) tuples of operation indices, with k1 < k2
+    """
+    matches = []
+    for k1 in range(len(self.operations)):
+      for k2 in range(k1 + 1, len(self.operations)):
+        if cross_api and self.operations[k1]['api'] == self.operations[k2]['api']:
+          continue
+        if self.compare_operations(k1, k2, predicate_threshold, set_threshold):
+          matches.append((k1, k2))
+    return matches
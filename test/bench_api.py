@@ -0,0 +1,287 @@
+#!/usr/bin/python
+
+"""
+Benchmarks for the API description model. Run from the test directory, either
+without arguments (runs all the benchmarks) or with the names of the benchmarks
+to run:
+
+  ./bench_api.py type_lookup
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+sys.path.append('../python-lib')
+from api import *
+
+# Type chain length of the descriptions used by all the benchmarks except
+# type_lookup (See synthetic_description)
+CHAIN_LENGTH = 10
+
+def synthetic_description(type_count, resource_count=0, ops_per_resource=5,
+                          fields_per_type=5, chain_length=None):
+  """
+  Generate a synthetic API description with the specified number of data types
+  and resources. Each data type refers to the type defined before it, so that
+  type references and constraints resolve across the whole description.
+
+  Args:
+    chain_length  If specified, data types are arranged in chains of at most
+                  this many types instead (as used by the lazy loading and
+                  later benchmarks), so that resolving the constraints of an
+                  operation only visits a few types.
+
+  Returns:
+    A dictionary in the same format as a parsed JSON API description
+  """
+  data_types = []
+  for i in range(type_count):
+    fields = []
+    for j in range(fields_per_type):
+      if j == 0 and i > 0 and (chain_length is None or i % chain_length):
+        field_type = 'Type' + str(i - 1)
+      elif j == 1:
+        field_type = 'list(string)'
+      elif j == 2:
+        field_type = 'int'
+      else:
+        field_type = 'string'
+      fields.append({ 'name' : 'field' + str(j), 'type' : field_type,
+                      'description' : 'Field ' + str(j) + ' of type ' + str(i) })
+    data_types.append({
+      'name' : 'Type' + str(i),
+      'fields' : fields,
+      'constraints' : [ 'self.field2 > ' + str(i % 100) ]
+    })
+
+  resources = []
+  for i in range(resource_count):
+    operations = []
+    for j in range(ops_per_resource):
+      type_name = 'Type' + str((i * ops_per_resource + j) % max(type_count, 1))
+      if not type_count:
+        type_name = 'string'
+      operation = {
+        'name' : 'operation' + str(j),
+        'method' : 'POST' if j % 2 else 'GET',
+        'description' : 'Operation ' + str(j) + ' of resource ' + str(i),
+        'output' : { 'status' : 200, 'contentType' : [ 'application/json' ],
+                     'type' : type_name },
+        'requires' : [ 'len(input.field1) > 0' ],
+        'ensures' : [ 'output.field2 >= ' + str(j) ]
+      }
+      if j % 2:
+        operation['input'] = { 'contentType' : [ 'application/json' ],
+                               'type' : type_name,
+                               'params' : [ { 'binding' : 'idBinding' } ] }
+      operations.append(operation)
+    resources.append({
+      'name' : 'Resource' + str(i),
+      'path' : '/resource' + str(i) + '/{id}',
+      'inputBindings' : [ { 'id' : 'idBinding', 'name' : 'id',
+                            'type' : 'string', 'mode' : 'url' } ],
+      'operations' : operations
+    })
+
+  return {
+    'name' : 'Synthetic',
+    'base' : [ 'http://test.com/synthetic' ],
+    'resources' : resources,
+    'dataTypes' : data_types
+  }
+
+def measure(function, repeat=3):
+  """
+  Run the given function several times and return the best wall clock time
+  in seconds.
+  """
+  best = None
+  for i in range(repeat):
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+def linear_type_lookup(api, name):
+  # Type resolution as implemented before the type index was introduced
+  for data_type in api.data_types:
+    if data_type.name == name:
+      return data_type
+  try:
+    return PrimitiveTypeRef(name)
+  except Exception:
+    pass
+  try:
+    return ContainerTypeRef(name)
+  except Exception:
+    pass
+  return None
+
+def bench_type_lookup():
+  print 'Type lookup cost (microseconds per lookup)'
+  print '%8s %12s %12s' % ('types', 'indexed', 'linear')
+  for count in (100, 1000, 10000):
+    api = API(synthetic_description(count))
+    names = []
+    for i in range(0, count, max(count / 100, 1)):
+      names.append('Type' + str(i))
+    names.extend([ 'string', 'list(string)', 'set(Type0)' ])
+
+    def indexed():
+      for i in range(10):
+        for name in names:
+          api.get_type_by_name(name)
+
+    def linear():
+      for name in names:
+        linear_type_lookup(api, name)
+
+    indexed_time = measure(indexed) / (10 * len(names))
+    linear_time = measure(linear) / len(names)
+    print '%8d %12.3f %12.3f' % (count, indexed_time * 1e6, linear_time * 1e6)
+
+def bench_lazy_load():
+  print 'Time to load a description and inspect a single operation (seconds)'
+  print '%10s %10s %10s' % ('operations', 'eager', 'lazy')
+  for resources in (100, 1000, 10000):
+    data = synthetic_description(1000, resources, chain_length=CHAIN_LENGTH)
+
+    def eager():
+      api = API(data)
+      api.resources[-1].operations[1].get_pre_conditions(api)
+
+    def lazy():
+      api = LazyAPI(data)
+      api.resources[-1].operations[1].get_pre_conditions(api)
+
+    print '%10d %10.4f %10.4f' % (resources * 5, measure(eager), measure(lazy))
+
+def deep_size(root):
+  """
+  Compute the total memory footprint of an object graph in bytes. Every
+  object reachable from the root (through containers, instance dictionaries
+  and slots) is counted once.
+  """
+  seen = set()
+  stack = [root]
+  total = 0
+  while stack:
+    obj = stack.pop()
+    if id(obj) in seen or isinstance(obj, (type, types.ClassType)):
+      continue
+    seen.add(id(obj))
+    total += sys.getsizeof(obj)
+    if isinstance(obj, dict):
+      stack.extend(obj.keys())
+      stack.extend(obj.values())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+      stack.extend(obj)
+    elif not isinstance(obj, (basestring, int, long, float, bool)):
+      if hasattr(obj, '__dict__'):
+        stack.append(obj.__dict__)
+      for cls in type(obj).__mro__:
+        for slot in cls.__dict__.get('__slots__', ()):
+          if hasattr(obj, slot):
+            stack.append(getattr(obj, slot))
+  return total
+
+def bench_memory():
+  print 'Memory footprint of the API object model'
+  data = synthetic_description(10000, 10000, chain_length=CHAIN_LENGTH)
+  api = API(data)
+  del data
+  size = deep_size(api)
+  print '10000 types, 50000 operations: %.1f MB' % (size / 1048576.0)
+
+def bench_cache():
+  print 'Time to load an API description (seconds)'
+  print '%10s %10s %10s %10s' % ('operations', 'parse', 'cache miss', 'cache hit')
+  temp_dir = tempfile.mkdtemp()
+  try:
+    for resources in (100, 1000, 10000):
+      path = os.path.join(temp_dir, 'api' + str(resources) + '.json')
+      fp = open(path, 'w')
+      json.dump(synthetic_description(1000, resources,
+                                      chain_length=CHAIN_LENGTH), fp)
+      fp.close()
+      cache_dir = os.path.join(temp_dir, 'cache' + str(resources))
+      parse_time = measure(lambda: parse(path))
+      miss_time = measure(lambda: parse_cached(path, cache_dir), repeat=1)
+      hit_time = measure(lambda: parse_cached(path, cache_dir))
+      print '%10d %10.4f %10.4f %10.4f' % (resources * 5, parse_time, miss_time,
+                                           hit_time)
+  finally:
+    shutil.rmtree(temp_dir)
+
+def bench_validate():
+  print 'Time to validate an API description (seconds)'
+  print '%10s %10s' % ('fields', 'validate')
+  for count in (1000, 10000, 20000):
+    api = API(synthetic_description(count, count / 5,
+                                    chain_length=CHAIN_LENGTH), validate=False)
+    print '%10d %10.4f' % (count * 5, measure(api.validate))
+
+def bench_parallel_validate():
+  print 'Time to validate an API description in parallel (seconds)'
+  print '%10s %10s %10s %10s' % ('operations', 'serial', '2 procs', '4 procs')
+  for resources in (1000, 10000):
+    api = API(synthetic_description(10000, resources,
+                                    chain_length=CHAIN_LENGTH), validate=False)
+    serial = measure(api.validate)
+    two = measure(lambda: api.validate(parallel=True, processes=2))
+    four = measure(lambda: api.validate(parallel=True, processes=4))
+    print '%10d %10.4f %10.4f %10.4f' % (resources * 5, serial, two, four)
+
+def bench_conditions():
+  print 'Time to get the conditions of all operation pairs (seconds)'
+  print '%10s %10s %10s' % ('operations', 'memoized', 'recomputed')
+  for resources in (10, 20, 40):
+    api = API(synthetic_description(100, resources,
+                                    chain_length=CHAIN_LENGTH))
+    operations = []
+    for resource in api.resources:
+      operations.extend(resource.operations)
+
+    def all_pairs():
+      api.precompute_conditions()
+      for op1 in operations:
+        for op2 in operations:
+          op1.get_pre_conditions(api)
+          op2.get_pre_conditions(api)
+          op1.get_post_conditions(api)
+          op2.get_post_conditions(api)
+
+    def all_pairs_recomputed():
+      for op1 in operations:
+        for op2 in operations:
+          for operation in (op1, op2):
+            operation.invalidate_conditions()
+            operation.get_pre_conditions(api)
+            operation.get_post_conditions(api)
+
+    print '%10d %10.4f %10.4f' % (len(operations), measure(all_pairs),
+                                  measure(all_pairs_recomputed, repeat=1))
+
+BENCHMARKS = [
+  ('type_lookup', bench_type_lookup),
+  ('lazy_load', bench_lazy_load),
+  ('memory', bench_memory),
+  ('cache', bench_cache),
+  ('validate', bench_validate),
+  ('parallel_validate', bench_parallel_validate),
+  ('conditions', bench_conditions),
+]
+
+if __name__ == '__main__':
+  selected = sys.argv[1:]
+  for name, benchmark in BENCHMARKS:
+    if not selected or name in selected:
+      benchmark()
+      print
@@ -0,0 +1,220 @@
+#!/usr/bin/python
+
+"""
+Benchmarks for client stub generation. Run from the test directory, either
+without arguments (runs all the benchmarks) or with the names of the
+benchmarks to run:
+
+  ./bench_codegen.py member_lookup
+"""
+
+import json
+import os
+import shutil
+import StringIO
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append('../python-lib')
+sys.path.append('../bin')
+from codegen_core import *
+from codegen import define_argument_name, define_method_name
+from bench_api import measure, synthetic_description, CHAIN_LENGTH
+
+class LinearClass(Class):
+  # Method lookup as implemented before the member index was introduced
+  def has_method(self, name):
+    for method in self.methods:
+      if method.name == name:
+        return True
+    return False
+
+class LinearMethod(Method):
+  # Argument lookup as implemented before the member index was introduced
+  def has_argument(self, name):
+    for arg in self.arguments:
+      if arg.name == name:
+        return True
+    return False
+
+def linear_allocate(names, base):
+  # Name allocation as implemented before NameAllocator was introduced
+  name = base
+  counter = 0
+  while True:
+    if name in names:
+      if counter > 0:
+        name = name[:-1*len(str(counter))]
+      counter += 1
+      name += str(counter)
+      continue
+    else:
+      names.append(name)
+      return name
+
+def build_class(class_type, method_type, method_count, argument_count=5):
+  """
+  Build a class the way bin/codegen.py builds resource clients: each method
+  and argument name is allocated with define_method_name and
+  define_argument_name before the member is added.
+  """
+  clazz = class_type('Client')
+  for i in range(method_count):
+    method = method_type(define_method_name(clazz, 'getItem' + str(i)))
+    for j in range(argument_count):
+      method.arguments.append(MethodArgument(
+        define_argument_name(method, 'param' + str(j))))
+    method.add_line('return None')
+    clazz.methods.append(method)
+  return clazz
+
+def bench_member_lookup():
+  print 'Time to build a class with unique method names (seconds)'
+  print '%10s %10s %10s' % ('methods', 'indexed', 'linear')
+  for count in (1000, 5000, 10000):
+    indexed = measure(lambda: build_class(Class, Method, count))
+    linear = measure(lambda: build_class(LinearClass, LinearMethod, count), 1)
+    print '%10d %10.4f %10.4f' % (count, indexed, linear)
+
+def bench_arguments():
+  print 'Time to build a method with unique argument names (seconds)'
+  print '%10s %10s %10s' % ('arguments', 'indexed', 'linear')
+  for count in (1000, 5000, 10000):
+    indexed = measure(lambda: build_class(Class, Method, 1, count))
+    linear = measure(lambda: build_class(LinearClass, LinearMethod, 1, count), 1)
+    print '%10d %10.4f %10.4f' % (count, indexed, linear)
+
+def bench_name_allocation():
+  print 'Time to allocate names that all derive from the same base name (seconds)'
+  print '%10s %10s %10s' % ('names', 'allocator', 'linear')
+  for count in (500, 1000, 2000):
+    def allocator():
+      names = NameAllocator()
+      for i in range(count):
+        names.allocate('DataType')
+    def linear():
+      names = []
+      for i in range(count):
+        linear_allocate(names, 'DataType')
+    print '%10d %10.4f %10.4f' % (count, measure(allocator), measure(linear, 1))
+
+def shared_types_description(depth):
+  """
+  Generate an API description based on simple4.json whose operations all
+  exchange a type that refers to a chain of types, where each type refers
+  to the next one twice. Generating the serializers of the first type
+  without sharing work across references takes 2^depth steps.
+  """
+  fp = open(os.path.join('../samples', 'simple4.json'))
+  data = json.load(fp)
+  fp.close()
+  for i in range(depth + 1):
+    if i < depth:
+      fields = [ { 'name' : name, 'type' : 'Node' + str(i + 1) }
+                 for name in ('left', 'right') ]
+    else:
+      fields = [ { 'name' : 'value', 'type' : 'string' } ]
+    data['dataTypes'].append({ 'name' : 'Node' + str(i), 'fields' : fields })
+  for resource in data['resources']:
+    for operation in resource['operations']:
+      operation['output']['type'] = 'Node0'
+      operation['output']['contentType'] = [ 'application/json' ]
+      if operation['method'] == 'POST':
+        operation['input'] = { 'type' : 'Node0',
+                               'contentType' : [ 'application/json' ] }
+  return data
+
+def many_types_description(type_count):
+  """
+  Generate an API description based on simple4.json with the data types of
+  a synthetic description (See bench_api.synthetic_description), and a
+  resource whose operations return every chain of types, so that
+  serializers are generated for all the types.
+  """
+  fp = open(os.path.join('../samples', 'simple4.json'))
+  data = json.load(fp)
+  fp.close()
+  for resource in data['resources']:
+    for operation in resource['operations']:
+      operation['output']['contentType'] = [ 'application/json' ]
+      if operation['method'] == 'POST':
+        operation['input']['contentType'] = [ 'application/json' ]
+  data['dataTypes'].extend(synthetic_description(
+    type_count, chain_length=CHAIN_LENGTH)['dataTypes'])
+  template = data['resources'][0]['operations'][1]
+  operations = []
+  for i in range(9, type_count, 10):
+    operation = json.loads(json.dumps(template))
+    operation['name'] = 'getType' + str(i)
+    operation['output']['type'] = 'Type' + str(i)
+    operations.append(operation)
+  resource = json.loads(json.dumps(data['resources'][0]))
+  resource['name'] = 'Types'
+  resource['path'] = '/types/{orderId}'
+  resource['operations'] = operations
+  data['resources'].append(resource)
+  return data
+
+def run_codegen(data, temp_dir):
+  path = os.path.join(temp_dir, 'description.json')
+  fp = open(path, 'w')
+  json.dump(data, fp)
+  fp.close()
+  output = os.path.join(temp_dir, 'client.py')
+  def generate():
+    devnull = open(os.devnull, 'w')
+    subprocess.check_call([ sys.executable, 'codegen.py', '-f', path,
+                            '-o', output ], cwd='../bin', stdout=devnull)
+    devnull.close()
+  return measure(generate, 1)
+
+def bench_class_index():
+  print 'Time to generate a client for a description with many types (seconds)'
+  print '%10s %10s' % ('types', 'codegen')
+  temp_dir = tempfile.mkdtemp()
+  try:
+    for count in (1000, 5000):
+      print '%10d %10.4f' % (count, run_codegen(many_types_description(count),
+                                                temp_dir))
+  finally:
+    shutil.rmtree(temp_dir)
+
+def bench_serializers():
+  print 'Time to generate a client for deeply shared types (seconds)'
+  print '%10s %10s' % ('depth', 'codegen')
+  temp_dir = tempfile.mkdtemp()
+  try:
+    for depth in (8, 12, 16, 100):
+      print '%10d %10.4f' % (depth, run_codegen(shared_types_description(depth),
+                                                temp_dir))
+  finally:
+    shutil.rmtree(temp_dir)
+
+def bench_generate():
+  print 'Time to generate the code of a class (seconds)'
+  print '%10s %10s' % ('methods', 'generate')
+  for count in (1000, 10000):
+    clazz = build_class(Class, Method, count)
+    def generate():
+      pcg = PythonCodeGenerator()
+      pcg.begin(tab='  ', output=StringIO.StringIO())
+      clazz.generate_code(pcg)
+    print '%10d %10.4f' % (count, measure(generate))
+
+BENCHMARKS = [
+  ('member_lookup', bench_member_lookup),
+  ('arguments', bench_arguments),
+  ('name_allocation', bench_name_allocation),
+  ('serializers', bench_serializers),
+  ('class_index', bench_class_index),
+  ('generate', bench_generate),
+]
+
+if __name__ == '__main__':
+  selected = sys.argv[1:]
+  for name, benchmark in BENCHMARKS:
+    if not selected or name in selected:
+      benchmark()
+      print
@@ -0,0 +1,499 @@
+#!/usr/bin/python
+
+"""
+Benchmarks for predicate parsing and comparison. Run from the test directory,
+either without arguments (runs all the benchmarks) or with the names of the
+benchmarks to run:
+
+  ./bench_predicates.py compare_sets
+"""
+
+import _ast
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append('../python-lib')
+from api import *
+from api_fuzzer import generate_variants
+import ast2code
+import predicate_cache
+import predicate_parser
+from predicate_parser import *
+from bench_api import measure, synthetic_description, CHAIN_LENGTH
+from operation_index import OperationIndex
+from similarity_store import build_similarity_store
+
+def operation_conditions(type_count=100, resource_count=20):
+  """
+  Collect the pre- and post-condition sets of all the operations of a
+  synthetic API description, along with randomized variants of them.
+
+  Returns:
+    A list of predicate string lists
+  """
+  random.seed(42)
+  api = API(synthetic_description(type_count, resource_count,
+                                  chain_length=CHAIN_LENGTH))
+  condition_sets = []
+  for resource in api.resources:
+    for operation in resource.operations:
+      for conditions in (operation.get_pre_conditions(api),
+                         operation.get_post_conditions(api)):
+        condition_sets.append(conditions)
+        condition_sets.append([ randomize_predicate(c) for c in conditions ])
+  return condition_sets
+
+def bench_compare_sets():
+  print 'compare_predicate_sets throughput'
+  condition_sets = operation_conditions()
+  pairs = []
+  for i in range(0, len(condition_sets), 2):
+    for j in range(0, len(condition_sets), 50):
+      pairs.append((condition_sets[i], condition_sets[j]))
+
+  def compare_all():
+    for set1, set2 in pairs:
+      compare_predicate_sets(set1, set2)
+
+  # Predicates are cached both as parsed ASTs and as analyzed parts
+  caches = (predicate_cache.PARSE_CACHE, predicate_parser.PREDICATE_PARTS)
+  print '%12s %12s %10s' % ('cache', 'pairs/sec', 'hit rate')
+  max_sizes = [ cache.max_size for cache in caches ]
+  try:
+    for label, enabled in (('disabled', False), ('enabled', True)):
+      for cache, max_size in zip(caches, max_sizes):
+        cache.clear()
+        cache.max_size = max_size if enabled else 0
+      elapsed = measure(compare_all)
+      statistics = predicate_parser.PREDICATE_PARTS.get_statistics()
+      print '%12s %12.1f %10.3f' % (label, len(pairs) / elapsed,
+                                    statistics['hit_rate'])
+  finally:
+    for cache, max_size in zip(caches, max_sizes):
+      cache.max_size = max_size
+
+def bench_parse():
+  print 'Predicate parse cost (microseconds per predicate)'
+  condition_sets = operation_conditions()
+  count = sum([ len(conditions) for conditions in condition_sets ])
+
+  def parse_all():
+    for conditions in condition_sets:
+      parse_predicate_set(conditions, copy=False)
+
+  print '%12s %12s' % ('cache', 'parse')
+  max_size = predicate_cache.PARSE_CACHE.max_size
+  try:
+    for label, size in (('disabled', 0), ('enabled', max_size)):
+      predicate_cache.PARSE_CACHE.clear()
+      predicate_cache.PARSE_CACHE.max_size = size
+      print '%12s %12.3f' % (label, measure(parse_all) / count * 1e6)
+  finally:
+    predicate_cache.PARSE_CACHE.max_size = max_size
+
+class Payload(object):
+  def __init__(self, **attributes):
+    self.__dict__.update(attributes)
+
+def bench_evaluate():
+  print 'Predicate evaluation throughput (evaluations per second)'
+  predicates = [
+    'output.cost > 10 and len(output.additions) < 5',
+    'forall(_item, output.items, _item.price > 0 and len(_item.name) > 0)',
+    'exists(_item, output.items, _item.name == \'cookie\')',
+    'implies(input.quantity > 1, output.cost >= input.quantity * 2)',
+  ]
+  bindings = []
+  for i in range(100):
+    items = [ Payload(name='item' + str(j), price=j + 1) for j in range(5) ]
+    bindings.append({
+      'input' : Payload(quantity=i % 4),
+      'output' : Payload(cost=i, additions=[ 'milk' ] * (i % 7), items=items)
+    })
+  count = len(predicates) * len(bindings)
+  evaluator = PredicateEvaluator()
+
+  def visitor():
+    for variables in bindings:
+      for predicate in predicates:
+        evaluator.evaluate(predicate, variables)
+
+  def compiled():
+    for variables in bindings:
+      for predicate in predicates:
+        evaluate_predicate(predicate, variables)
+
+  print '%12s %12.1f' % ('visitor', count / measure(visitor))
+  print '%12s %12.1f' % ('compiled', count / measure(compiled))
+
+def bench_batch():
+  print 'Time to check a postcondition over a 100k item response (seconds)'
+  predicates = [
+    'forall(_item, output, _item.price > 0)',
+    'forall(_item, output, _item.price * _item.quantity < 1000000 and ' +
+      'len(_item.name) > 0)',
+    'exists(_item, output, _item.price > 100 and _item.quantity < 0)',
+  ]
+  output = [ Payload(name='item' + str(i), price=i % 97 + 1,
+                     quantity=i % 13) for i in range(100000) ]
+  variables = { 'output' : output }
+  threshold = predicate_parser.BATCH_EVALUATION_THRESHOLD
+  print 'NumPy available: %s' % (numpy is not None)
+  print '%12s %12s %12s' % ('predicate', 'per item', 'batch')
+  try:
+    for i in range(len(predicates)):
+      function = compile_predicate(predicates[i])
+      predicate_parser.BATCH_EVALUATION_THRESHOLD = len(output) + 1
+      per_item = measure(lambda: function(variables))
+      predicate_parser.BATCH_EVALUATION_THRESHOLD = threshold
+      batch = measure(lambda: function(variables))
+      print '%12d %12.4f %12.4f' % (i + 1, per_item, batch)
+  finally:
+    predicate_parser.BATCH_EVALUATION_THRESHOLD = threshold
+
+class LinearNodeMatcher(object):
+  # Node matching as implemented before candidate nodes were bucketed
+  def __init__(self, right):
+    self.nodes = NodeEnumerator().get_node_list(right)
+
+  def match(self, target):
+    match = None
+    for node in self.nodes:
+      if not isinstance(target, type(node)):
+        continue
+      elif isinstance(node, _ast.Call):
+        if node.func.id == target.func.id:
+          match = node
+      elif isinstance(node, _ast.Num):
+        if node.n == target.n:
+          match = node
+      elif isinstance(node, _ast.Str):
+        if node.s == target.s:
+          match = node
+      else:
+        match = node
+    if match is not None:
+      self.nodes.remove(match)
+      return True
+    return False
+
+  def __get_remaining(self):
+    return len(self.nodes)
+
+  remaining = property(__get_remaining)
+
+def generate_predicate(terms, seed):
+  rng = random.Random(seed)
+  clauses = []
+  for i in range(terms):
+    field = 'self.field' + str(rng.randint(0, terms))
+    choice = rng.randint(0, 2)
+    if choice == 0:
+      clauses.append(field + ' > ' + str(rng.randint(0, 100)))
+    elif choice == 1:
+      clauses.append('len(' + field + ') <= ' + str(rng.randint(0, 10)))
+    else:
+      clauses.append(field + ' * 2 + 1 != \'' + str(rng.randint(0, 9)) + '\'')
+  return ' and '.join(clauses)
+
+def bench_similarity():
+  print 'Predicate similarity cost (milliseconds per comparison)'
+  print '%8s %8s %12s %12s' % ('terms', 'nodes', 'bucketed', 'linear')
+  checker = ASTSimilarityChecker()
+  for terms in (10, 100, 1000):
+    left = parse(generate_predicate(terms, 1))
+    right = parse(generate_predicate(terms, 2))
+    node_count = len(NodeEnumerator().get_node_list(right))
+
+    def similarity():
+      return checker.get_similarity(left, right)
+
+    bucketed = measure(similarity)
+    expected = similarity()
+    predicate_parser.NodeMatcher = LinearNodeMatcher
+    try:
+      repeat = 3 if terms < 1000 else 1
+      linear = measure(similarity, repeat)
+      if similarity() != expected:
+        print 'Similarity mismatch for', terms, 'terms'
+    finally:
+      predicate_parser.NodeMatcher = NodeMatcher
+    print '%8d %8d %12.3f %12.3f' % (terms, node_count, bucketed * 1e3,
+                                     linear * 1e3)
+
+def bench_comparator():
+  print 'ASTComparator throughput (comparisons per second)'
+  random.seed(3)
+  rng = random.Random(3)
+  pairs = []
+  for i in range(2000):
+    predicate = generate_predicate(rng.randint(1, 4), rng.random())
+    if i % 2:
+      other = randomize_predicate(predicate)
+    else:
+      other = generate_predicate(rng.randint(1, 4), rng.random())
+    pairs.append((parse(predicate), parse(other)))
+
+  def compare_all(comparator):
+    for left, right in pairs:
+      comparator.compare(left, right)
+
+  mismatches = []
+  devnull = open(os.devnull, 'w')
+  def print_mismatch(mismatch):
+    # Equivalent of the messages the comparator used to print
+    print >> devnull, mismatch.kind + ' mismatch'
+
+  print '%20s %12s' % ('tracer', 'compares/sec')
+  for label, tracer in (('none', None), ('collect', mismatches.append),
+                        ('print to devnull', print_mismatch)):
+    elapsed = measure(lambda: compare_all(ASTComparator(tracer)))
+    print '%20s %12.1f' % (label, len(pairs) / elapsed)
+  devnull.close()
+
+def bench_equivalence():
+  print 'Time to find the equivalent predicates of two sets (seconds)'
+  print '%10s %12s %12s %12s %12s' % ('predicates', 'comparator', 'found',
+                                      'hashes', 'found')
+  rng = random.Random(11)
+  normalizer = PredicateNormalizer()
+  for size in (100, 300, 1000):
+    set1 = [ generate_predicate(rng.randint(1, 4), rng.random())
+             for i in range(size) ]
+    # Equivalent predicates with a different syntax
+    set2 = [ ast2code.to_source(normalizer.normalize(parse(predicate)))
+             for predicate in set1 ]
+    rng.shuffle(set2)
+
+    def pairwise():
+      comparator = ASTComparator()
+      found = 0
+      for predicate1 in set1:
+        for predicate2 in set2:
+          if comparator.compare(predicate1, predicate2):
+            found += 1
+            break
+      return found
+
+    def hashed():
+      predicate_parser.PREDICATE_PARTS.clear()
+      hashes = set([ get_predicate_hashes(predicate)[0]
+                     for predicate in set2 ])
+      found = 0
+      for predicate in set1:
+        if get_predicate_hashes(predicate)[0] in hashes:
+          found += 1
+      return found
+
+    repeat = 3 if size < 1000 else 1
+    print '%10d %12.4f %12d %12.4f %12d' % (size, measure(pairwise, repeat),
+      pairwise(), measure(hashed), hashed())
+
+def pairwise_compare_predicate_sets(set1, set2):
+  # Predicate set comparison as implemented before the similarity matrix
+  tree_set1 = pre_process_ast_set(parse_predicate_set(set1))
+  tree_set2 = pre_process_ast_set(parse_predicate_set(set2))
+  remaining = list(tree_set2)
+  checker = ASTSimilarityChecker()
+  S = 0
+  for tree1 in tree_set1:
+    best = None
+    best_sim = None
+    for tree2 in remaining:
+      sim = checker.get_similarity(tree1, tree2)
+      if sim >= PREDICATE_SIMILARITY_THRESHOLD:
+        if best_sim is None or sim > best_sim:
+          best = tree2
+          best_sim = sim
+    if best is not None:
+      remaining.remove(best)
+      S += 1
+  L = len(tree_set1) - S
+  R = len(tree_set2) - S
+  return (2.0 * S) / (2.0 * S + L + R)
+
+def bench_set_matching():
+  print 'Time to compare two large predicate sets (seconds)'
+  print '%10s %10s %10s %10s %10s' % ('predicates', 'pairwise', 'greedy',
+                                      'optimal', 'similarity')
+  rng = random.Random(5)
+  for size in (50, 200, 800):
+    set1 = [ generate_predicate(rng.randint(1, 4), rng.random())
+             for i in range(size) ]
+    set2 = [ randomize_predicate(predicate) for predicate in set1 ]
+    rng.shuffle(set2)
+    repeat = 3 if size < 800 else 1
+    pairwise = measure(lambda: pairwise_compare_predicate_sets(set1, set2),
+                       repeat)
+    greedy = measure(lambda: compare_predicate_sets(set1, set2,
+                                                    GREEDY_MATCHING))
+    optimal = measure(lambda: compare_predicate_sets(set1, set2))
+    print '%10d %10.4f %10.4f %10.4f %4.3f/%4.3f' % (size, pairwise, greedy,
+      optimal, compare_predicate_sets(set1, set2, GREEDY_MATCHING),
+      compare_predicate_sets(set1, set2))
+
+def operation_corpus(api_count, resource_count=10):
+  """
+  Generate a corpus of API descriptions in which the APIs come in pairs:
+  the second API of each pair has the same operations as the first one,
+  with some of their conditions randomized.
+  """
+  random.seed(7)
+  rng = random.Random(7)
+  corpus = []
+  for i in range(0, api_count, 2):
+    data = synthetic_description(0, resource_count, chain_length=CHAIN_LENGTH)
+    for resource in data['resources']:
+      for operation in resource['operations']:
+        operation['requires'] = [ generate_predicate(rng.randint(1, 3),
+                                                     rng.random()) ]
+        operation['ensures'] = [ generate_predicate(rng.randint(2, 5),
+                                                    rng.random()) ]
+    corpus.append(API(data))
+    for resource in data['resources']:
+      for operation in resource['operations']:
+        operation['ensures'] = [ randomize_predicate(condition)
+                                 for condition in operation['ensures'] ]
+    corpus.append(API(data))
+  return corpus
+
+def all_pairs_matches(corpus):
+  # Exhaustive comparison of every pair of operations from different APIs
+  matches = []
+  for i in range(len(corpus)):
+    for j in range(i + 1, len(corpus)):
+      api1 = corpus[i]
+      api2 = corpus[j]
+      for resource1 in api1.resources:
+        for op1 in resource1.operations:
+          for resource2 in api2.resources:
+            for op2 in resource2.operations:
+              if compare_operations(api1, op1, api2, op2):
+                matches.append((op1, op2))
+  return matches
+
+def bench_operation_index():
+  print 'Time to find matching operations across a corpus of APIs (seconds)'
+  print '%10s %10s %10s %10s %10s' % ('operations', 'all pairs', 'index',
+                                      'matches', 'recall')
+  for api_count in (4, 16, 48):
+    corpus = operation_corpus(api_count)
+    operations = sum([ len(resource.operations) for api in corpus
+                       for resource in api.resources ])
+    if api_count <= 16:
+      start = time.time()
+      expected = all_pairs_matches(corpus)
+      all_pairs = '%10.4f' % (time.time() - start)
+    else:
+      expected = None
+      all_pairs = '%10s' % '-'
+
+    start = time.time()
+    index = OperationIndex()
+    for api in corpus:
+      index.add_api(api)
+    matches = index.find_matches()
+    elapsed = time.time() - start
+    if expected is None:
+      recall = '%10s' % '-'
+    else:
+      recall = '%10.3f' % (float(len(matches)) / max(len(expected), 1))
+    print '%10d %s %10.4f %10d %s' % (operations, all_pairs, elapsed,
+                                      len(matches), recall)
+
+def bench_fuzz():
+  print 'Time to generate a corpus of mutated API descriptions (seconds)'
+  print '%10s %10s %10s %10s' % ('variants', 'legacy', 'fuzzer', 'JSON lines')
+  data = synthetic_description(100, 100, chain_length=CHAIN_LENGTH)
+  api = API(data)
+  temp_dir = tempfile.mkdtemp()
+  try:
+    for count in (10, 100):
+      def legacy():
+        # randomize_api mutates its input, so each variant needs a fresh copy
+        random.seed(1)
+        for i in range(count):
+          randomize_api(API(data), 'random' + str(i),
+                        os.path.join(temp_dir, 'legacy'))
+
+      def fuzzer():
+        generate_variants(api, count, 1, os.path.join(temp_dir, 'fuzzer'))
+
+      def lines():
+        output = open(os.path.join(temp_dir, 'variants.json'), 'w')
+        generate_variants(api, count, 1, output=output)
+        output.close()
+
+      print '%10d %10.4f %10.4f %10.4f' % (count, measure(legacy, 1),
+                                           measure(fuzzer), measure(lines))
+  finally:
+    shutil.rmtree(temp_dir)
+
+def bench_similarity_store():
+  print 'Time to sweep the predicate similarity threshold over a corpus (seconds)'
+  print '%10s %10s %10s %10s %10s %10s' % ('operations', 'thresholds', 'live',
+                                           'build', 'store', 'bytes')
+  thresholds = [ 0.5 + 0.05 * i for i in range(10) ]
+  temp_dir = tempfile.mkdtemp()
+  try:
+    for api_count in (4, 8):
+      corpus = operation_corpus(api_count)
+      operations = [ (api, operation) for api in corpus
+                     for resource in api.resources
+                     for operation in resource.operations ]
+      pairs = [ (k1, k2) for k1 in range(len(operations))
+                for k2 in range(k1 + 1, len(operations))
+                if operations[k1][0] is not operations[k2][0] ]
+
+      def live():
+        for threshold in thresholds:
+          for k1, k2 in pairs:
+            api1, op1 = operations[k1]
+            api2, op2 = operations[k2]
+            compare_predicate_sets(op1.get_post_conditions(api1),
+                                   op2.get_post_conditions(api2),
+                                   threshold=threshold)
+
+      path = os.path.join(temp_dir, 'store' + str(api_count) + '.bin')
+      start = time.time()
+      store = build_similarity_store(corpus, path)
+      build = time.time() - start
+
+      def sweep():
+        for threshold in thresholds:
+          for k1, k2 in pairs:
+            store.compare_predicate_sets(store.operations[k1]['post'],
+                                         store.operations[k2]['post'],
+                                         threshold)
+
+      print '%10d %10d %10.4f %10.4f %10.4f %10d' % (len(operations),
+        len(thresholds), measure(live, 1), build, measure(sweep, 1),
+        os.path.getsize(path))
+      store.close()
+  finally:
+    shutil.rmtree(temp_dir)
+
+BENCHMARKS = [
+  ('parse', bench_parse),
+  ('evaluate', bench_evaluate),
+  ('batch', bench_batch),
+  ('similarity', bench_similarity),
+  ('comparator', bench_comparator),
+  ('equivalence', bench_equivalence),
+  ('set_matching', bench_set_matching),
+  ('compare_sets', bench_compare_sets),
+  ('operation_index', bench_operation_index),
+  ('fuzz', bench_fuzz),
+  ('similarity_store', bench_similarity_store),
+]
+
+if __name__ == '__main__':
+  selected = sys.argv[1:]
+  for name, benchmark in BENCHMARKS:
+    if not selected or name in selected:
+      benchmark()
+      print
@@ -1,11 +1,28 @@
 #!/usr/bin/python
 
+import copy
+import cPickle
+import gc
+import json
 import os
+import shutil
+import tempfile
 import unittest
 import sys
 
 sys.path.append('../python-lib')
-from api import parse, APIDescriptionException
+import api as api_module
+from api import *
+from jsonstream import JSONStreamReader
+
+UNPICKLED = []
+
+def record_unpickling():
+  UNPICKLED.append(True)
+
+class Unpickled(object):
+  def __reduce__(self):
+    return (record_unpickling, ())
 
 class TestAPIDescriptionParser(unittest.TestCase):
 
@@ -268,6 +285,229 @@ class TestAPIDescriptionParser(unittest.TestCase):
     self.assertEqual(binding.type.type.get_reference_name(), 'string')
     self.assertEqual(resource.operations[1].input.params[0].binding, 'orderIdBinding')
 
+  def test_type_lookup(self):
+    """
+    Test for resolving type names through the type index, including updates
+    to the index when the data types list is modified.
+    """
+    api = self.load_api_description('simple2.json')
+    order = api.get_type_by_name('Order')
+    self.assertEqual(order.name, 'Order')
+    self.assertIs(api.get_type_by_name('Order'), order)
+    self.assertIsInstance(api.get_type_by_name('string'), PrimitiveTypeRef)
+    self.assertIs(api.get_type_by_name('string'), api.get_type_by_name('string'))
+    container = api.get_type_by_name('list(Order)')
+    self.assertIsInstance(container, ContainerTypeRef)
+    self.assertEqual(container.get_reference_name(), 'list(Order)')
+    self.assertEqual(api.get_type_by_name('_API_').name, '_API_')
+    self.assertIsNone(api.get_type_by_name('Invoice'))
+    for i in range(10):
+      self.assertIsNone(api.get_type_by_name('Unknown' + str(i)))
+    self.assertEqual(len(api._API__type_refs), 3)
+
+    invoice = NamedTypeDef(name='Invoice', fields=[])
+    api.data_types.append(invoice)
+    self.assertIs(api.get_type_by_name('Invoice'), invoice)
+    api.data_types.remove(invoice)
+    self.assertIsNone(api.get_type_by_name('Invoice'))
+
+    api.data_types = [invoice]
+    self.assertIs(api.get_type_by_name('Invoice'), invoice)
+    self.assertIsNone(api.get_type_by_name('Order'))
+
+  def test_shared_type_references(self):
+    """
+    Test for interned type references - all references to a type name must
+    share one immutable instance.
+    """
+    api = self.load_api_description('simple2.json')
+    order = api.get_type_by_name('Order')
+    string_ref = order.fields[0].type.type
+    self.assertEqual(string_ref.get_reference_name(), 'string')
+    self.assertIs(order.fields[1].type.type, string_ref)
+    self.assertIs(create_type_reference('string'), string_ref)
+    self.assertIs(api.get_type_by_name('string'), string_ref)
+    self.assertIs(create_type_reference('list(Order)').type,
+                  create_type_reference('Order'))
+    self.assertRaises(AttributeError, setattr, string_ref, 'name', 'int')
+
+    # References nothing uses any more are dropped
+    create_type_reference('list(UnusedType)')
+    gc.collect()
+    self.assertNotIn('UnusedType', TYPE_REFERENCES)
+    self.assertNotIn('list(UnusedType)', TYPE_REFERENCES)
+
+  def test_streaming_parse(self):
+    """
+    Test for incremental parsing - the streaming parser must produce the same
+    API objects as the regular parser, regardless of the chunk size.
+    """
+    for i in range(1, 7):
+      path = os.path.join('../samples', 'simple' + str(i) + '.json')
+      expected = parse(path).serialize()
+      self.assertEqual(parse(path, streaming=True).serialize(), expected)
+      fp = open(path)
+      api = load_stream(fp, chunk_size=7)
+      fp.close()
+      self.assertEqual(api.serialize(), expected)
+
+    fp = open(os.path.join('../samples', 'simple5.json'))
+    data = json.load(fp)
+    fp.seek(0)
+    items = []
+    reader = JSONStreamReader(fp, chunk_size=3)
+    members = reader.read_object({ 'sla' : items.append })
+    fp.close()
+    self.assertEqual(items, data['sla'])
+    del data['sla']
+    self.assertEqual(members, data)
+
+    try:
+      parse(os.path.join('../samples', 'error1.json'), streaming=True)
+      self.fail('No error thrown for undefined type')
+    except APIDescriptionException:
+      pass
+
+  def test_lazy_parse(self):
+    """
+    Test for lazy loading - resources, operations and types must be converted
+    only when accessed, and must match the output of the regular parser.
+    """
+    for i in range(1, 7):
+      path = os.path.join('../samples', 'simple' + str(i) + '.json')
+      expected = parse(path)
+      api = parse(path, lazy=True)
+      self.assertIsInstance(api, LazyAPI)
+      self.assertEqual(len(api.resources), len(expected.resources))
+      self.assertFalse(api.resources.is_loaded(0))
+      self.assertEqual(api.serialize(), expected.serialize())
+
+    api = parse(os.path.join('../samples', 'simple4.json'), lazy=True)
+    order = api.get_type_by_name('Order')
+    self.assertEqual(order.name, 'Order')
+    self.assertTrue(api.data_types.is_loaded(0))
+    self.assertFalse(api.data_types.is_loaded(1))
+    resource = api.resources[-1]
+    self.assertEqual(resource.name, 'AllOrders')
+    self.assertFalse(api.resources.is_loaded(0))
+    self.assertFalse(resource.operations.is_loaded(0))
+    self.assertEqual(resource.operations[1].method, 'POST')
+    self.assertFalse(resource.operations.is_loaded(0))
+
+    api = parse(os.path.join('../samples', 'error1.json'), lazy=True)
+    try:
+      for resource in api.resources:
+        for operation in resource.operations:
+          pass
+      self.fail('No error thrown for undefined type')
+    except APIDescriptionException:
+      pass
+
+  def test_lazy_list(self):
+    """
+    Test that the list operations of LazyList never expose raw items
+    """
+    def create():
+      return LazyList([ { 'value' : i } for i in range(4) ], lambda d: d['value'])
+
+    lazy = create()
+    self.assertEqual(lazy + [ 4 ], [ 0, 1, 2, 3, 4 ])
+    self.assertEqual(list(reversed(create())), [ 3, 2, 1, 0 ])
+    self.assertEqual(create().index(2), 2)
+    self.assertEqual(create().index(2, 1, 3), 2)
+    self.assertRaises(ValueError, create().index, 2, 3)
+    self.assertEqual(create().count(1), 1)
+
+    lazy = create()
+    lazy.remove(1)
+    self.assertEqual(lazy[:], [ 0, 2, 3 ])
+    self.assertRaises(ValueError, lazy.remove, 1)
+
+    lazy = create()
+    self.assertFalse(lazy.is_loaded(0))
+    duplicate = copy.copy(lazy)
+    self.assertIsInstance(duplicate, LazyList)
+    self.assertEqual(list.__getitem__(duplicate, 0), 0)
+    self.assertEqual(duplicate[:], [ 0, 1, 2, 3 ])
+
+    # Converting a type definition is not a modification of the type list
+    api = parse(os.path.join('../samples', 'simple4.json'), lazy=True)
+    version = api.data_types.version
+    self.assertEqual([ t.name for t in reversed(api.data_types) ],
+                     [ 'OrderRequest', 'Order' ])
+    self.assertEqual(api.data_types.version, version)
+    order = api.get_type_by_name('Order')
+    self.assertEqual(api.data_types.index(order), 0)
+    api.data_types.remove(order)
+    self.assertIsNone(api.get_type_by_name('Order'))
+    self.assertNotEqual(api.data_types.version, version)
+
+  def test_parse_cached(self):
+    """
+    Test for the compiled API description cache - cached API objects must be
+    reused until the content of the description file changes.
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(temp_dir, 'api.json')
+      cache_dir = os.path.join(temp_dir, 'cache')
+      shutil.copy(os.path.join('../samples', 'simple4.json'), path)
+      expected = parse(path).serialize()
+
+      api = parse_cached(path, cache_dir)
+      self.assertEqual(api.serialize(), expected)
+      digest = get_digest(path)
+      cache_path = get_cache_path(path, digest, cache_dir)
+      cached = load_cache(cache_path, digest)
+      self.assertIsNotNone(cached)
+      self.assertEqual(cached.serialize(), expected)
+      self.assertEqual(parse_cached(path, cache_dir).serialize(), expected)
+      order = cached.get_type_by_name('Order')
+      self.assertIs(order.fields[0].type.type, create_type_reference('string'))
+      self.assertIsInstance(order.fields, TrackedList)
+      self.assertIsInstance(cached.data_types, TypeList)
+      for resource in cached.resources:
+        for operation in resource.operations:
+          self.assertEqual(operation.get_pre_conditions(cached),
+                           operation.get_pre_conditions(api))
+      stream_dir = os.path.join(temp_dir, 'stream')
+      self.assertEqual(
+        parse_cached(path, stream_dir, streaming=True).serialize(), expected)
+      self.assertIsNotNone(
+        load_cache(get_cache_path(path, digest, stream_dir), digest))
+
+      shutil.copy(os.path.join('../samples', 'simple2.json'), path)
+      self.assertIsNone(load_cache(cache_path, get_digest(path)))
+      api = parse_cached(path, cache_dir)
+      self.assertEqual(api.serialize(), parse(path).serialize())
+
+      api = parse_cached(path)
+      self.assertTrue(os.path.exists(path + CACHE_SUFFIX))
+      self.assertEqual(parse_cached(path).serialize(), api.serialize())
+
+      for i in range(1, 7):
+        shutil.copy(os.path.join('../samples', 'simple' + str(i) + '.json'),
+                    path)
+        expected = parse(path)
+        parse_cached(path, cache_dir)
+        api = parse_cached(path, cache_dir)
+        self.assertEqual(api.serialize(), expected.serialize())
+
+      # Cache files holding anything but marshalled data are ignored
+      digest = get_digest(path)
+      cache_path = get_cache_path(path, digest, cache_dir)
+      fp = open(cache_path, 'wb')
+      fp.write('%s %d %s\n' % (CACHE_MAGIC, CACHE_FORMAT, digest))
+      cPickle.dump(Unpickled(), fp, cPickle.HIGHEST_PROTOCOL)
+      fp.close()
+      self.assertIsNone(load_cache(cache_path, digest))
+      self.assertEqual(UNPICKLED, [])
+      self.assertEqual(parse_cached(path, cache_dir).serialize(),
+                       parse(path).serialize())
+      self.assertIsNotNone(load_cache(cache_path, digest))
+    finally:
+      shutil.rmtree(temp_dir)
+
   def test_error1(self):
     """
     Test for undefined type references
@@ -298,6 +538,125 @@ class TestAPIDescriptionParser(unittest.TestCase):
     except APIDescriptionException:
       pass
 
+  def test_multiple_errors(self):
+    """
+    Test that all the validation errors are reported together
+    """
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    data['dataTypes'][0]['fields'][0]['type'] = 'Unknown'
+    data['dataTypes'].append(data['dataTypes'][1])
+    data['resources'][0]['operations'][0]['requires'] = [ 'self.cost >' ]
+    try:
+      API(data)
+      self.fail('No error thrown for invalid description')
+    except APIDescriptionException as e:
+      self.assertEqual(len(e.errors), 3)
+      self.assertTrue('Duplicate type definitions for OrderRequest' in e.errors)
+      self.assertTrue('Reference to unknown data type: Unknown' in e.errors)
+
+    try:
+      self.load_api_description('error1.json')
+      self.fail('No error thrown for undefined type')
+    except APIDescriptionException as e:
+      self.assertEqual(e.errors, [ str(e) ])
+
+  def test_parallel_validation(self):
+    """
+    Test that parallel validation reports the same errors as the serial
+    validation, in the same order
+    """
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    resource = data['resources'][0]
+    for i in range(20):
+      operation = dict(resource['operations'][0])
+      operation['name'] = 'operation' + str(i)
+      if i % 3 == 0:
+        operation['output'] = dict(operation['output'], type='Unknown' + str(i))
+      resource['operations'].append(operation)
+    for i in range(10):
+      data['resources'].append(dict(resource, name='Resource' + str(i)))
+    data['dataTypes'].append(data['dataTypes'][1])
+
+    api = API(data, validate=False)
+    try:
+      api.validate()
+      self.fail('No error thrown for invalid description')
+    except APIDescriptionException as e:
+      expected = e.errors
+
+    threshold = api_module.PARALLEL_VALIDATION_THRESHOLD
+    api_module.PARALLEL_VALIDATION_THRESHOLD = 0
+    try:
+      api.validate(parallel=True, processes=3)
+      self.fail('No error thrown for invalid description')
+    except APIDescriptionException as e:
+      self.assertEqual(e.errors, expected)
+      self.assertEqual(len(e.errors), 78)
+    finally:
+      api_module.PARALLEL_VALIDATION_THRESHOLD = threshold
+
+    api = self.load_api_description('simple4.json')
+    api.validate(parallel=True, processes=2)
+
+  def test_condition_memo(self):
+    """
+    Test that memoized operation conditions are recomputed when the operation
+    or the referenced type definitions change
+    """
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    data['dataTypes'][0]['constraints'] = [ 'self.cost > 0' ]
+    api = API(data)
+    api.precompute_conditions()
+    operation = api.resources[1].operations[1]
+    self.assertEqual(operation.name, 'submitOrder')
+    self.assertEqual(operation.get_post_conditions(api), [ 'output.cost > 0' ])
+
+    conditions = operation.get_post_conditions(api)
+    conditions.append('output.cost < 10')
+    self.assertEqual(operation.get_post_conditions(api), [ 'output.cost > 0' ])
+
+    operation.ensures.append('len(output.additions) > 0')
+    self.assertEqual(operation.get_post_conditions(api),
+                     [ 'len(output.additions) > 0', 'output.cost > 0' ])
+
+    order = api.get_type_by_name('Order')
+    order.constraints = [ 'self.cost > 1' ]
+    self.assertEqual(operation.get_post_conditions(api),
+                     [ 'len(output.additions) > 0', 'output.cost > 1' ])
+
+    order.constraints.append('self.cost < 5')
+    self.assertEqual(operation.get_post_conditions(api),
+      [ 'len(output.additions) > 0', 'output.cost > 1', 'output.cost < 5' ])
+
+    # Changes to other APIs leave the memoized conditions alone
+    other = API(data)
+    other.get_type_by_name('Order').constraints.append('self.cost < 2')
+    self.assertEqual(order.constraints, [ 'self.cost > 1', 'self.cost < 5' ])
+    self.assertEqual(
+      other.resources[1].operations[1].get_post_conditions(other),
+      [ 'output.cost > 0', 'output.cost < 2' ])
+    self.assertEqual(operation.get_post_conditions(api),
+      [ 'len(output.additions) > 0', 'output.cost > 1', 'output.cost < 5' ])
+
+    request = api.get_type_by_name('OrderRequest')
+    request.constraints = [ 'len(self.drink) > 0' ]
+    self.assertEqual(operation.get_pre_conditions(api),
+                     [ 'len(input.drink) > 0' ])
+    request.constraints.pop()
+    self.assertEqual(operation.get_pre_conditions(api), [])
+    request.constraints.append('len(self.drink) > 1')
+    self.assertEqual(operation.get_pre_conditions(api),
+                     [ 'len(input.drink) > 1' ])
+    api.data_types.remove(request)
+    api.data_types.append(NamedTypeDef(name='OrderRequest', fields=[]))
+    self.assertEqual(operation.get_pre_conditions(api), [])
+
 if __name__ == '__main__':
     unittest.main()
 
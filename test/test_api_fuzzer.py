@@ -0,0 +1,102 @@
+#!/usr/bin/python
+
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from api_fuzzer import *
+from predicate_parser import randomize_api
+
+class TestAPIFuzzer(unittest.TestCase):
+
+  def load_description(self):
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    data['dataTypes'][0]['constraints'] = [ 'self.cost > 0',
+                                            'len(self.additions) < 5' ]
+    for resource in data['resources']:
+      for operation in resource['operations']:
+        operation['requires'] = [ 'len(input.drink) > 0', 'input.size == 1' ]
+        operation['ensures'] = [ 'output.cost < 10 and output.drink != \'\'' ]
+    return data
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def test_reproducible_variants(self):
+    api = API(self.load_description())
+    original = api.serialize_json()
+    fuzzer = APIFuzzer(api, seed=7)
+    variants = [ fuzzer.generate_json(i) for i in range(10) ]
+    self.assertEqual(api.serialize_json(), original)
+    self.assertEqual(variants, [ APIFuzzer(api, seed=7).generate_json(i)
+                                 for i in range(10) ])
+    self.assertNotEqual(variants[0], APIFuzzer(api, seed=8).generate_json(0))
+    self.assertEqual(len(set(variants)), 10)
+
+    # Variants carry the same mutations as randomize_api
+    for i in range(10):
+      api = API(self.load_description())
+      rng = random.Random(get_variant_seed(7, i))
+      randomize_api(api, 'random' + str(i), self.temp_dir, rng)
+      fp = open(os.path.join(self.temp_dir, 'random' + str(i) + '.json'))
+      self.assertEqual(fp.read(), variants[i])
+      fp.close()
+
+  def test_copy_on_write(self):
+    api = API(self.load_description())
+    fuzzer = APIFuzzer(api, seed=1)
+    for i in range(10):
+      variant = fuzzer.generate(i)
+      self.assertEqual(variant['name'], 'random' + str(i))
+      for j in range(len(variant['resources'])):
+        resource = variant['resources'][j]
+        original = fuzzer.data['resources'][j]
+        for k in range(len(resource['operations'])):
+          operation = resource['operations'][k]
+          original_operation = original['operations'][k]
+          if operation['requires'] == original_operation['requires'] and \
+              operation['ensures'] == original_operation['ensures']:
+            self.assertTrue(operation is original_operation)
+          else:
+            self.assertFalse(operation is original_operation)
+            self.assertTrue(operation['output'] is original_operation['output'])
+      self.assertTrue(variant['dataTypes'][1] is fuzzer.data['dataTypes'][1])
+    API(variant)
+
+  def test_generate_variants(self):
+    api = API(self.load_description())
+    output_dir = os.path.join(self.temp_dir, 'variants')
+    self.assertEqual(generate_variants(api, 20, seed=3, output_dir=output_dir,
+                                       processes=2, prefix='variant'), 20)
+    self.assertEqual(len(os.listdir(output_dir)), 20)
+    fp = open(os.path.join(output_dir, 'variant12.json'))
+    self.assertEqual(fp.read(), APIFuzzer(api, 3, 'variant').generate_json(12))
+    fp.close()
+
+    outputs = []
+    for processes in (1, 2):
+      path = os.path.join(self.temp_dir, 'variants' + str(processes) + '.json')
+      output = open(path, 'w')
+      generate_variants(api, 20, seed=3, output=output, processes=processes)
+      output.close()
+      fp = open(path)
+      outputs.append(fp.read())
+      fp.close()
+    self.assertEqual(outputs[0], outputs[1])
+    lines = outputs[0].splitlines()
+    self.assertEqual(len(lines), 20)
+    self.assertEqual(json.loads(lines[5])['name'], 'random5')
+    self.assertRaises(ValueError, generate_variants, api, 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/python
+
+import itertools
+import random
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from assignment import *
+
+class TestAssignment(unittest.TestCase):
+
+  def brute_force(self, edges, rows, columns):
+    best = 0.0
+    for permutation in itertools.permutations(range(max(rows, columns))):
+      total = 0.0
+      for i in range(rows):
+        total += edges.get((i, permutation[i]), 0.0)
+      best = max(best, total)
+    return best
+
+  def test_hungarian(self):
+    self.assertEqual(hungarian([]), [])
+    self.assertEqual(hungarian([[ 4, 1, 3 ], [ 2, 0, 5 ]]), [ 1, 0 ])
+    self.assertRaises(ValueError, hungarian, [[ 1 ], [ 2 ]])
+
+  def test_max_weight_matching(self):
+    rng = random.Random(7)
+    for trial in range(200):
+      rows = rng.randint(1, 5)
+      columns = rng.randint(1, 5)
+      edges = {}
+      for i in range(rows):
+        for j in range(columns):
+          if rng.random() < 0.4:
+            edges[(i, j)] = rng.randint(1, 10) + rng.random()
+      matches = max_weight_matching(edges)
+      self.assertEqual(len(set([ i for i, j in matches ])), len(matches))
+      self.assertEqual(len(set([ j for i, j in matches ])), len(matches))
+      total = sum([ edges[match] for match in matches ])
+      self.assertAlmostEqual(total, self.brute_force(edges, rows, columns))
+
+if __name__ == '__main__':
+    unittest.main()
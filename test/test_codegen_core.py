@@ -0,0 +1,128 @@
+#!/usr/bin/python
+
+import StringIO
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from codegen_core import *
+
+class TestCodegenCore(unittest.TestCase):
+
+  def create_class(self):
+    clazz = Class('Client', 'object')
+    constructor = Method('__init__')
+    constructor.arguments.append(MethodArgument('endpoint', default='None'))
+    constructor.add_line('self.endpoint = endpoint')
+    clazz.methods.append(constructor)
+    method = Method('get_order')
+    method.arguments.append(MethodArgument('order_id', 'string'))
+    method.add_line('if order_id:')
+    method.indent()
+    method.add_line('for i in range(3):')
+    method.indent()
+    method.add_line('print i')
+    method.dedent()
+    method.dedent()
+    method.add_line('return None')
+    clazz.methods.append(method)
+    return clazz
+
+  def create_static_method(self):
+    method = StaticMethod('serialize_json')
+    method.arguments.append(MethodArgument('data'))
+    method.arguments.append(MethodArgument('indent', default='None'))
+    method.add_line('return json.dumps(data, indent=indent)')
+    return method
+
+  def test_code_generator(self):
+    pcg = PythonCodeGenerator()
+    pcg.begin(tab='  ')
+    pcg.writeln('if True:')
+    pcg.indent()
+    pcg.writeln('if False:')
+    pcg.indent()
+    pcg.write('pass\n')
+    pcg.dedent()
+    pcg.writeln('x = 1')
+    pcg.dedent()
+    pcg.writeln()
+    self.assertEqual(pcg.end(),
+                     'if True:\n  if False:\n    pass\n  x = 1\n\n')
+    self.assertRaises(SyntaxError, pcg.dedent)
+
+  def test_streaming(self):
+    clazz = self.create_class()
+    static_method = self.create_static_method()
+    expected = static_method.generate_code() + '\n' + \
+               clazz.generate_code() + '\n'
+    self.assertTrue(expected.startswith('def serialize_json(data, indent=None):\n'))
+    self.assertTrue('\n      for i in range(3):\n        print i\n' in expected)
+
+    output = StringIO.StringIO()
+    pcg = PythonCodeGenerator()
+    pcg.begin(tab='  ', output=output)
+    self.assertEqual(static_method.generate_code(pcg), None)
+    pcg.writeln()
+    self.assertEqual(clazz.generate_code(pcg), None)
+    pcg.writeln()
+    self.assertEqual(pcg.end(), None)
+    self.assertEqual(output.getvalue(), expected)
+
+  def test_member_list(self):
+    clazz = self.create_class()
+    self.assertTrue(clazz.has_method('get_order'))
+    self.assertFalse(clazz.has_method('get_orders'))
+    self.assertTrue(clazz.get_constructor() is clazz.methods[0])
+    method = clazz.methods[1]
+    self.assertTrue(method.has_argument('order_id'))
+    self.assertFalse(method.has_argument('order'))
+
+    duplicate = Method('get_order')
+    clazz.methods.append(duplicate)
+    self.assertTrue(clazz.methods.lookup('get_order') is method)
+    del clazz.methods[1]
+    self.assertTrue(clazz.methods.lookup('get_order') is duplicate)
+    clazz.methods.remove(clazz.get_constructor())
+    self.assertEqual(clazz.get_constructor(), None)
+    clazz.methods.insert(0, Method('__init__'))
+    clazz.methods += [ Method('delete_order') ]
+    self.assertEqual([ m.name for m in clazz.methods ],
+                     [ '__init__', 'get_order', 'delete_order' ])
+    self.assertTrue(clazz.get_constructor() is clazz.methods[0])
+    self.assertTrue(clazz.has_method('delete_order'))
+    clazz.methods[2] = Method('update_order')
+    self.assertFalse(clazz.has_method('delete_order'))
+    self.assertTrue(clazz.methods.lookup('update_order') is clazz.methods.pop())
+    self.assertFalse(clazz.has_method('update_order'))
+    clazz.methods[:] = []
+    self.assertFalse(clazz.has_method('get_order'))
+    self.assertEqual(clazz.get_constructor(), None)
+
+  def test_name_allocator(self):
+    allocator = NameAllocator()
+    self.assertEqual([ allocator.allocate('Foo') for i in range(12) ],
+                     [ 'Foo' ] + [ 'Foo' + str(i) for i in range(1, 12) ])
+    # Foo1 and Foo11 are taken
+    self.assertEqual(allocator.allocate('Foo1'), 'Foo12')
+    self.assertEqual(allocator.allocate('Bar'), 'Bar')
+    self.assertTrue('Foo5' in allocator)
+    self.assertFalse('Foo13' in allocator)
+
+    # Names are only taken once the members are added
+    clazz = Class('Client')
+    name = clazz.method_names.allocate('get', reserve=False)
+    self.assertEqual(name, 'get')
+    self.assertEqual(clazz.method_names.allocate('get', reserve=False), 'get')
+    clazz.methods.append(Method(name))
+    clazz.methods.append(Method('get2'))
+    name = clazz.method_names.allocate('get', reserve=False)
+    self.assertEqual(name, 'get1')
+    clazz.methods.append(Method(name))
+    self.assertEqual(clazz.method_names.allocate('get', reserve=False), 'get3')
+    method = Method('get')
+    method.arguments.append(MethodArgument('id'))
+    self.assertEqual(method.argument_names.allocate('id', reserve=False), 'id1')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from api import *
+from comparison_store import *
+import predicate_parser
+from predicate_parser import compare_operation_conditions, GREEDY_MATCHING
+
+class TestComparisonStore(unittest.TestCase):
+
+  def load_api_description(self, name, ensures):
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    data['name'] = name
+    data['dataTypes'][0]['constraints'] = [ 'self.cost > 0' ]
+    for resource in data['resources']:
+      for operation in resource['operations']:
+        operation['ensures'] = ensures.get(operation['name'],
+                                           [ 'output.cost < 100' ])
+    return API(data)
+
+  def get_operations(self, api):
+    return [ operation for resource in api.resources
+             for operation in resource.operations ]
+
+  def compare_all(self, store, api1, api2):
+    results = []
+    for op1 in self.get_operations(api1):
+      for op2 in self.get_operations(api2):
+        results.append(store.compare(api1, op1, api2, op2))
+    return results
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.temp_dir, 'store', 'results.json')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def test_operation_key(self):
+    api1 = self.load_api_description('Starbucks1', {})
+    api2 = self.load_api_description('Starbucks2', {})
+    ops1 = self.get_operations(api1)
+    ops2 = self.get_operations(api2)
+    self.assertEqual(get_operation_key(api1, ops1[0]),
+                     get_operation_key(api2, ops2[0]))
+    self.assertNotEqual(get_operation_key(api1, ops1[0]),
+                        get_operation_key(api1, ops1[1]))
+    api3 = self.load_api_description('Starbucks3', {
+      ops1[0].name : [ 'output.cost < 50' ]
+    })
+    self.assertNotEqual(get_operation_key(api1, ops1[0]),
+                        get_operation_key(api3, self.get_operations(api3)[0]))
+
+  def test_incremental_comparison(self):
+    api1 = self.load_api_description('Starbucks1', {})
+    api2 = self.load_api_description('Starbucks2', {})
+    store = ComparisonStore(self.path)
+    results = self.compare_all(store, api1, api2)
+    operation_count = len(self.get_operations(api1))
+    self.assertEqual(store.hits, 0)
+    self.assertEqual(store.misses, operation_count ** 2)
+    for op1, op2, result in zip(
+        [ op for op in self.get_operations(api1)
+          for i in range(operation_count) ],
+        self.get_operations(api2) * operation_count, results):
+      self.assertEqual(result, compare_operation_conditions(api1, op1,
+                                                            api2, op2))
+    store.save()
+
+    # Only the pairs involving the edited operation are compared again
+    name = self.get_operations(api2)[0].name
+    api2 = self.load_api_description('Starbucks2', {
+      name : [ 'output.cost < 100 and output.drink != \'\'' ]
+    })
+    store = ComparisonStore(self.path)
+    self.assertEqual(len(store), operation_count ** 2)
+    new_results = self.compare_all(store, api1, api2)
+    self.assertEqual(store.misses, operation_count)
+    self.assertEqual(store.hits, operation_count * (operation_count - 1))
+    self.assertNotEqual(new_results, results)
+    store.save()
+
+    store = ComparisonStore(self.path)
+    self.assertEqual(self.compare_all(store, api1, api2), new_results)
+    self.assertEqual(store.misses, 0)
+
+  def test_settings(self):
+    api1 = self.load_api_description('Starbucks1', {})
+    api2 = self.load_api_description('Starbucks2', {
+      'getOrder' : [ 'output.cost < 99' ]
+    })
+    store = ComparisonStore(self.path, threshold=0.5)
+    results = self.compare_all(store, api1, api2)
+    self.assertEqual(results[0], compare_operation_conditions(
+      api1, self.get_operations(api1)[0], api2, self.get_operations(api2)[0],
+      0.5))
+    store.save()
+    self.assertEqual(len(ComparisonStore(self.path, threshold=0.5)),
+                     len(results))
+
+    # Results computed with other settings are discarded
+    self.assertEqual(len(ComparisonStore(self.path)), 0)
+    self.assertEqual(len(ComparisonStore(self.path, threshold=0.5,
+                                         method=GREEDY_MATCHING)), 0)
+    version = predicate_parser.SIMILARITY_VERSION
+    predicate_parser.SIMILARITY_VERSION = version + 1
+    try:
+      self.assertEqual(len(ComparisonStore(self.path, threshold=0.5)), 0)
+    finally:
+      predicate_parser.SIMILARITY_VERSION = version
+
+  def test_invalid_store(self):
+    os.makedirs(os.path.dirname(self.path))
+    fp = open(self.path, 'w')
+    fp.write('{"format": 0, "results": {"a:b": [1.0, 1.0]}}')
+    fp.close()
+    self.assertEqual(len(ComparisonStore(self.path)), 0)
+    fp = open(self.path, 'w')
+    fp.write('{"format"')
+    fp.close()
+    store = ComparisonStore(self.path)
+    self.assertEqual(store.get('a', 'b'), None)
+    store.put('a', 'b', 0.5, -1)
+    store.save()
+    self.assertEqual(ComparisonStore(self.path).get('a', 'b'), (0.5, -1))
+    self.assertEqual(os.listdir(os.path.dirname(self.path)), ['results.json'])
+    self.assertRaises(ValueError, ComparisonStore().save)
+
+if __name__ == '__main__':
+  unittest.main()
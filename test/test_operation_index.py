@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+import json
+import os
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from api import *
+from operation_index import *
+
+class TestOperationIndex(unittest.TestCase):
+
+  def load_api_description(self, name, ensures, constraints=True):
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    data['name'] = name
+    if constraints:
+      data['dataTypes'][0]['constraints'] = [ 'self.cost > 0',
+                                              'len(self.drink) > 0' ]
+    for resource in data['resources']:
+      for operation in resource['operations']:
+        if operation['name'] in ensures:
+          operation['ensures'] = ensures[operation['name']]
+    return API(data)
+
+  def test_minhash(self):
+    hasher = MinHasher(permutations=128, seed=1)
+    tokens = set(range(100))
+    signature = hasher.get_signature(tokens)
+    self.assertEqual(signature, MinHasher(128, 1).get_signature(tokens))
+    self.assertEqual(estimate_similarity(signature, signature), 1.0)
+    other = hasher.get_signature(set(range(50, 150)))
+    self.assertTrue(abs(estimate_similarity(signature, other) - 1 / 3.0) < 0.15)
+    self.assertEqual(estimate_similarity(signature,
+      hasher.get_signature(set(range(1000, 1100)))), 0.0)
+    self.assertEqual(hasher.get_signature(set()), None)
+
+  def test_operation_tokens(self):
+    api = self.load_api_description('Starbucks', {})
+    order = api.resources[0].operations[1]
+    all_orders = api.resources[1].operations[0]
+    self.assertEqual(order.name, 'getOrder')
+    self.assertEqual(all_orders.name, 'getAllOrders')
+    tokens = get_operation_tokens(api, order)
+    self.assertTrue(len(tokens) > 0)
+    self.assertEqual(tokens, get_operation_tokens(api, order))
+    self.assertNotEqual(get_operation_tokens(api, all_orders), tokens)
+    api = self.load_api_description('Starbucks', {}, constraints=False)
+    self.assertEqual(get_operation_tokens(api, order), set())
+
+  def test_query(self):
+    api1 = self.load_api_description('Starbucks1', {
+      'getOrder' : [ 'output.cost < 100' ],
+      'submitOrder' : [ 'output.drink == input.drink' ]
+    })
+    api2 = self.load_api_description('Starbucks2', {
+      'getOrder' : [ 'output.cost < 100' ],
+      'submitOrder' : [ 'exists(_item, output.additions, _item == \'milk\')' ]
+    })
+    index = OperationIndex()
+    index.add_api(api1)
+    index.add_api(api2)
+    self.assertEqual(len(index), 8)
+
+    get_order1 = api1.resources[0].operations[1]
+    get_order2 = api2.resources[0].operations[1]
+    results = index.query(api1, get_order1)
+    self.assertEqual(results, [ (api2, get_order2) ])
+    all_orders1 = api1.resources[1].operations[0]
+    all_orders2 = api2.resources[1].operations[0]
+    self.assertEqual(index.query(api1, all_orders1), [ (api2, all_orders2) ])
+    self.assertTrue((api2, all_orders2) in
+                    index.query(api1, all_orders1, verify=False))
+
+    api3 = self.load_api_description('Starbucks3', {}, constraints=False)
+    self.assertEqual(index.query(api3, api3.resources[0].operations[1]), [])
+
+    matches = index.find_matches()
+    names = sorted([ (op1.name, op2.name) for (a1, op1), (a2, op2) in matches ])
+    self.assertTrue(('getOrder', 'getOrder') in names)
+    self.assertFalse(('submitOrder', 'submitOrder') in names)
+    for (a1, op1), (a2, op2) in matches:
+      self.assertFalse(a1 is a2)
+      self.assertTrue(compare_operations(a1, op1, a2, op2))
+
+    self.assertRaises(ValueError, OperationIndex, 64, 5)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,335 @@
+#!/usr/bin/python
+
+import random
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+import predicate_cache
+from predicate_cache import LRUCache
+from predicate_parser import *
+
+class TestPredicateCache(unittest.TestCase):
+
+  def test_lru_eviction(self):
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    self.assertEqual(cache.get('a'), 1)
+    cache.put('c', 3)
+    self.assertEqual(len(cache), 2)
+    self.assertEqual(cache.get('b'), None)
+    self.assertEqual(cache.get('a'), 1)
+    self.assertEqual(cache.get('c'), 3)
+    statistics = cache.get_statistics()
+    self.assertEqual(statistics['hits'], 3)
+    self.assertEqual(statistics['misses'], 1)
+
+    cache = LRUCache(0)
+    cache.put('a', 1)
+    self.assertEqual(cache.get('a'), None)
+
+  def test_shared_trees(self):
+    predicate = 'self.cost > 10 and len(self.additions) < 3'
+    tree = parse(predicate, copy=False)
+    self.assertTrue(parse(predicate, copy=False) is tree)
+    copy = parse(predicate)
+    self.assertFalse(copy is tree)
+    self.assertFalse(parse(predicate) is copy)
+    self.assertEqual(ast.dump(copy), ast.dump(tree))
+    self.assertRaises(SyntaxError, parse, 'self.cost >')
+
+    # Randomizing a predicate must not modify the cached tree
+    dump = ast.dump(tree)
+    for i in range(10):
+      randomize_predicate(predicate)
+    self.assertEqual(ast.dump(parse(predicate, copy=False)), dump)
+
+  def test_duplicate_predicates(self):
+    self.assertEqual(compare_predicate_sets(['self.a > 1', 'self.a > 1'],
+                                            ['self.a > 1', 'self.a > 1']), 1.0)
+    self.assertAlmostEqual(compare_predicate_sets(
+      ['self.a > 1', 'self.a > 1'], ['self.a > 1']), 2.0 / 3.0)
+
+class TestPredicateSimilarity(unittest.TestCase):
+
+  def test_similarity(self):
+    self.assertEqual(compare_predicates('self.cost > 10', 'self.cost > 10'), 1.0)
+    self.assertEqual(compare_predicates('self.cost > 10', 'self.cost >= 12'), 0.75)
+    self.assertAlmostEqual(compare_predicates(
+      'len(self.additions) < 3 and self.drink == \'latte\'',
+      'self.drink == \'mocha\' and len(self.additions) <= 3'), 0.9)
+    self.assertAlmostEqual(compare_predicates(
+      'forall(_item, self.items, _item.price > 0)',
+      'exists(_item, self.items, _item.price > 1.5)'), 15.0 / 17.0)
+    self.assertAlmostEqual(compare_predicates('x + 1 + 1 + 2', '2 + x + 1'),
+                           6.0 / 7.0)
+
+  def test_signature_similarity(self):
+    checker = ASTSimilarityChecker()
+    rng = random.Random(3)
+    predicates = [ 'self.cost > 10', 'len(self.additions) < 3',
+                   'forall(_item, self.items, _item.price >= 1.5)',
+                   'self.drink == \'latte\' or self.drink != \'tea\'',
+                   'x + 1 + 1 + 2 > f(x, 2)' ]
+    for i in range(100):
+      left = rng.choice(predicates)
+      right = randomize_predicate(rng.choice(predicates))
+      self.assertEqual(signature_similarity(get_signature(parse(left)),
+                                            get_signature(parse(right))),
+                       checker.get_similarity(left, right))
+
+  def test_predicate_set_matching(self):
+    set1 = [ 'x + 2 + 3 + 6 > 7', 'x + 2 + 3 + 5 > 8' ]
+    set2 = [ 'x + 2 + 3 + 6 > 8', 'x + 1 + 3 + 6 > 7' ]
+    self.assertEqual(compare_predicate_sets(set1, set2, GREEDY_MATCHING), 0.5)
+    self.assertEqual(compare_predicate_sets(set1, set2), 1.0)
+    self.assertEqual(compare_predicate_sets([], []), -1)
+    self.assertEqual(compare_predicate_sets([ 'x > 1 and y < 2' ],
+                                            [ 'y < 2', 'z == 3' ]), 0.5)
+
+  def test_operation_matching(self):
+    self.assertTrue(methods_compatible('GET', 'GET'))
+    self.assertTrue(methods_compatible('POST', 'GET'))
+    self.assertTrue(methods_compatible('PUT', 'POST'))
+    self.assertFalse(methods_compatible('GET', 'PUT'))
+    self.assertFalse(methods_compatible('DELETE', 'GET'))
+    self.assertTrue(conditions_match(0.9, 1.0))
+    self.assertTrue(conditions_match(-1, 0.85))
+    self.assertTrue(conditions_match(1.0, -1))
+    self.assertFalse(conditions_match(1.0, 0.5))
+    self.assertFalse(conditions_match(-1, -1))
+
+  def test_node_matcher(self):
+    matcher = NodeMatcher(parse('f(1) + f(2) + 1'))
+    self.assertEqual(matcher.remaining, 14)
+    self.assertTrue(matcher.match(parse('1').body))
+    self.assertTrue(matcher.match(parse('1').body))
+    self.assertFalse(matcher.match(parse('1').body))
+    self.assertTrue(matcher.match(parse('f(3)').body))
+    self.assertFalse(matcher.match(parse('g(1)').body))
+    self.assertEqual(matcher.remaining, 11)
+    self.assertEqual([ type(node).__name__ for node in matcher.nodes ],
+      [ 'Load', 'Name', 'Call', 'Add', 'Load', 'Name', 'Num', 'BinOp', 'Add',
+        'BinOp', 'Expression' ])
+
+class TestASTComparator(unittest.TestCase):
+
+  def test_equivalent_predicates(self):
+    comparator = ASTComparator()
+    self.assertTrue(comparator.compare('x + 1 > 2', '2 < 1 + x'))
+    self.assertTrue(comparator.compare('a and b > 1', 'b > 1 and a'))
+    self.assertTrue(comparator.compare('len(x.y) == [1, 2]',
+                                       '[1, 2] == len(x.y)'))
+    self.assertEqual(comparator.mismatch, None)
+
+  def test_mismatch(self):
+    comparator = ASTComparator()
+    self.assertFalse(comparator.compare('x.y > 1', 'x.z > 1'))
+    self.assertEqual(comparator.mismatch, Mismatch(('body', 'left'),
+                                                   'attr value'))
+    self.assertFalse(comparator.compare('a and b', 'a and c'))
+    self.assertEqual(comparator.mismatch, Mismatch(('body', 'values', 1),
+                                                   'name id'))
+    self.assertEqual(str(comparator.mismatch),
+                     'name id mismatch at body.values.1')
+    self.assertFalse(comparator.compare('x > 1', 'x >= 1'))
+    self.assertEqual(comparator.mismatch, Mismatch(('body',), 'comparison op'))
+
+    mismatches = []
+    comparator = ASTComparator(mismatches.append)
+    self.assertTrue(comparator.compare('1 + x > 2', 'x + 1 > 2'))
+    self.assertEqual(comparator.mismatch, None)
+    self.assertEqual(mismatches, [ Mismatch(('body', 'left', 'left'),
+                                            'number') ])
+
+class TestPredicateNormalizer(unittest.TestCase):
+
+  def normalize(self, predicate):
+    normalizer = PredicateNormalizer()
+    return ast2code.to_source(normalizer.normalize(parse(predicate)))
+
+  def test_canonical_form(self):
+    self.assertEqual(self.normalize('x + (2 + y) > 1'), '1 < x + y + 2')
+    self.assertEqual(self.normalize('b and (a and b)'), 'a and b')
+    self.assertEqual(self.normalize('3 == x.y'), 'x.y == 3')
+    self.assertEqual(self.normalize('a > b >= c'), 'c <= b < a')
+    self.assertEqual(self.normalize('x - 1 >= 2 * y'), 'y * 2 <= x - 1')
+    self.assertEqual(self.normalize('\'a\' + x == y'), '\'a\' + x == y')
+
+    predicate = 'y + x > 1 or a'
+    tree = parse(predicate, copy=False)
+    dump = ast.dump(tree)
+    self.normalize(predicate)
+    self.assertEqual(ast.dump(tree), dump)
+
+  def test_equivalence(self):
+    self.assertTrue(predicates_equivalent('x + 1 > 2', '2 < 1 + x'))
+    self.assertTrue(predicates_equivalent('a == 1 and len(b) > 0',
+                                          '0 < len(b) and 1 == a'))
+    self.assertFalse(predicates_equivalent('x - 1 > 2', '2 < 1 - x'))
+    self.assertFalse(predicates_equivalent('a and b', 'a or b'))
+    # Strings and lists are concatenated in order
+    self.assertFalse(predicates_equivalent('s + t == u', 't + s == u'))
+    self.assertFalse(predicates_equivalent('s + t * 2 == u', 't * 2 + s == u'))
+    self.assertTrue(predicates_equivalent('len(s) + t == u', 't + len(s) == u'))
+    self.assertTrue(predicates_equivalent('a - b + c > 0', 'c + (a - b) > 0'))
+    hashes = get_predicate_hashes('x > 1 and y < 2')
+    self.assertEqual(len(hashes[1]), 2)
+    self.assertEqual(hashes[1][0], get_predicate_hashes('1 < x')[0])
+
+  def test_predicate_set_matching(self):
+    # The flipped comparison alone makes the similarity fall below the
+    # predicate similarity threshold
+    self.assertEqual(compare_predicates(parse('x + 1 > 2'),
+                                        parse('2 < 1 + x')), 8 / 9.0)
+    self.assertEqual(compare_predicate_sets([ 'x + 1 > 2', 'len(y) == 0' ],
+                                            [ '0 == len(y)', '2 < 1 + x' ]),
+                     1.0)
+
+    # Pairing up the equivalent predicates first would leave the other two
+    # predicates unpaired
+    set1 = [ 'a + 1 + c + 3 > 10', 'a + 1 + c + 4 > 10' ]
+    set2 = [ 'a + 1 + c + 3 > 11', 'a + 1 + c + 3 > 10' ]
+    self.assertEqual(compare_predicate_sets(set1, set2), 1.0)
+
+class Item(object):
+  def __init__(self, name, price):
+    self.name = name
+    self.price = price
+
+class TestPredicateEvaluation(unittest.TestCase):
+
+  PREDICATES = [
+    'self.cost > 10',
+    'self.cost * 2 - 1 >= 19 and len(self.additions) < 3',
+    'self.drink == \'latte\' or self.cost % 3 == 1',
+    'not self.cost <= 10',
+    '\'milk\' in self.additions and \'soy\' not in self.additions',
+    'forall(_item, self.items, _item.price > 0)',
+    'forall(_item, self.items, _item.price > 2)',
+    'exists(_item, self.items, _item.name == \'cookie\')',
+    'exists(_item, self.items, _item.price > 100)',
+    'implies(self.cost > 10, len(self.items) > 1)',
+    'implies(self.cost > 100, len(self.items) > 1)',
+    'self.missing is None and self.drink is not None',
+    'self.cost ** 2 / 4 == 30',
+    '[self.cost, (1, 2)] == [11, (1, 2)]',
+    '{\'a\' : self.cost}[\'a\'] > 0',
+    'self.flag == False or -self.cost < 0',
+  ]
+
+  def get_variables(self):
+    order = {
+      'cost' : 11,
+      'drink' : 'latte',
+      'additions' : [ 'milk', 'sugar' ],
+      'items' : [ Item('muffin', 3), Item('cookie', 2) ],
+      'missing' : None,
+      'flag' : True
+    }
+    return { 'self' : order }
+
+  def test_evaluator(self):
+    evaluator = PredicateEvaluator()
+    variables = self.get_variables()
+    self.assertTrue(evaluator.evaluate(self.PREDICATES[0], variables))
+    self.assertTrue(evaluator.evaluate(self.PREDICATES[5], variables))
+    self.assertFalse(evaluator.evaluate(self.PREDICATES[6], variables))
+    self.assertTrue(evaluator.evaluate(self.PREDICATES[7], variables))
+    self.assertFalse(evaluator.evaluate(self.PREDICATES[8], variables))
+    self.assertTrue(evaluator.evaluate(self.PREDICATES[11], variables))
+    self.assertTrue(evaluator.evaluate('1 < 2'))
+
+  def test_compiled_predicates(self):
+    evaluator = PredicateEvaluator()
+    variables = self.get_variables()
+    for predicate in self.PREDICATES:
+      expected = evaluator.evaluate(predicate, variables)
+      self.assertEqual(evaluate_predicate(predicate, variables), expected,
+                       predicate)
+    self.assertTrue(compile_predicate(self.PREDICATES[0]) is
+                    compile_predicate(self.PREDICATES[0]))
+    self.assertTrue(evaluate_predicate('1 < 2'))
+    self.assertRaises(AttributeError, evaluate_predicate, 'self.cost > 0',
+                      { 'self' : object() })
+
+class TestBatchEvaluation(unittest.TestCase):
+
+  PREDICATES = [
+    '_item.price > 10',
+    '_item.price * 2 - 1 >= _item.quantity and _item.name != \'item7\'',
+    'not (_item.price % 3 == 1 or _item.quantity / 2 == 3)',
+    '-_item.price < limit',
+    'len(_item.name) > 5',
+    '_item.name in [\'item1\', \'item2\'] or _item.owner.name == \'bob\'',
+    '_item.note is None or len(_item.note) > 3',
+    '_item.price / _item.quantity > 1',
+    '_item > 0',
+    'limit > 0',
+  ]
+
+  def get_records(self):
+    records = []
+    for i in range(150):
+      record = Item('item' + str(i % 20), i % 17)
+      record.quantity = i % 9
+      record.owner = Item('bob' if i % 5 else 'alice', 0)
+      record.note = None if i % 2 else 'note' + str(i)
+      records.append(record)
+    return records
+
+  def test_batch_evaluation(self):
+    records = self.get_records()
+    variables = { 'limit' : -5 }
+    for predicate in self.PREDICATES:
+      if predicate == '_item > 0':
+        items = range(-10, 140)
+      else:
+        items = records
+      function = compile_predicate(predicate)
+      expected = []
+      for item in items:
+        scope = dict(variables)
+        scope['_item'] = item
+        try:
+          expected.append(bool(function(scope)))
+        except ZeroDivisionError:
+          expected = ZeroDivisionError
+          break
+      if expected is ZeroDivisionError:
+        self.assertRaises(ZeroDivisionError, evaluate_batch, predicate, items,
+                          '_item', variables)
+      else:
+        self.assertEqual(evaluate_batch(predicate, items, '_item', variables),
+                         expected, predicate)
+
+    self.assertRaises(ValueError, vectorize_predicate,
+                      'exists(_x, _item.parts, _x > 0)')
+    columns = { 'price' : to_column([ 1, 5, 10 ]) }
+    mask = vectorize_predicate('_item.price > 4').evaluate_columns(columns)
+    self.assertEqual([ bool(value) for value in mask ], [ False, True, True ])
+
+  def test_batch_integer_overflow(self):
+    records = [ { 'a' : 2 ** 30 + i, 'b' : 2 ** 30 - 7, 'c' : 3 - 2 ** 30,
+                  'qty' : 2 ** 30 - i } for i in range(150) ]
+    # Each of these overflows 64 bit integers
+    for predicate in ('_item.a * _item.b * _item.c < 0',
+                      '_item.qty * 10**12 > 10**21',
+                      '_item.a + _item.b * 2**40 > 0',
+                      '_item.a ** 3 > 0'):
+      function = compile_predicate(predicate)
+      expected = [ bool(function({ '_item' : record })) for record in records ]
+      self.assertEqual(evaluate_batch(predicate, records), expected, predicate)
+
+  def test_batch_quantifiers(self):
+    variables = { 'output' : self.get_records(), 'limit' : 3 }
+    evaluator = PredicateEvaluator()
+    for condition in self.PREDICATES[:-3]:
+      for function in ('forall', 'exists'):
+        predicate = function + '(_item, output, ' + condition + ')'
+        self.assertEqual(evaluate_predicate(predicate, variables),
+                         evaluator.evaluate(predicate, variables), predicate)
+
+if __name__ == '__main__':
+    unittest.main()
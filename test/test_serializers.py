@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+import json
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from api import *
+from codegen_core import *
+from serializers import *
+
+class TestSerializers(unittest.TestCase):
+
+  def create_api(self):
+    return API({
+      'name' : 'Shop',
+      'resources' : [],
+      'dataTypes' : [
+        { 'name' : 'Customer', 'fields' : [
+          { 'name' : 'name', 'type' : 'string' },
+          { 'name' : 'address', 'type' : 'Address' } ] },
+        { 'name' : 'Address', 'fields' : [
+          { 'name' : 'street', 'type' : 'string' } ] },
+        { 'name' : 'Line', 'fields' : [
+          { 'name' : 'buyer', 'type' : 'Customer' },
+          { 'name' : 'seller', 'type' : 'Customer' } ] }
+      ]
+    })
+
+  def create_classes(self, api):
+    classes = []
+    mappings = {}
+    for data_type in api.data_types:
+      clazz = Class(data_type.name)
+      constructor = Method('__init__')
+      for field in data_type.fields:
+        constructor.define_mapping(field.name, field.name)
+      clazz.methods.append(constructor)
+      classes.append(clazz)
+      mappings[data_type.name] = data_type.name
+    return classes, mappings
+
+  def test_memo(self):
+    api = self.create_api()
+    classes, mappings = self.create_classes(api)
+    memo = {}
+    serializer = get_serializer('json', classes, mappings, memo)
+    line = create_type_reference('Line')
+    functions = serializer.generate_serializers(line, api)
+    self.assertEqual([ f.name for f in functions ], [
+      'serialize_Address_json', 'serialize_final_json',
+      'serialize_Customer_json', 'serialize_Line_json' ])
+
+    # Functions are only generated once per memo
+    serializer = get_serializer('json', classes, mappings, memo)
+    self.assertEqual(serializer.generate_serializers(line, api), [])
+    self.assertEqual(serializer.generate_serializers(
+      api.get_type_by_name('Customer'), api), [])
+    functions = serializer.generate_deserializers(
+      create_type_reference('list(Customer)'), api)
+    self.assertEqual([ f.name for f in functions ], [
+      'deserialize_Address_json', 'deserialize_Customer_json',
+      'deserialize_list_Customer_json' ])
+    self.assertEqual(memo[('Line', 'json', SERIALIZE)], 'serialize_Line_json')
+    self.assertEqual(memo[('list(Customer)', 'json', DESERIALIZE)],
+                     'deserialize_list_Customer_json')
+
+    # Without a shared memo, each serializer generates all the functions
+    serializer = get_serializer('form', classes, mappings)
+    self.assertEqual(len(serializer.generate_serializers(line, api)), 4)
+    serializer = get_serializer('xml', classes, mappings, memo)
+    self.assertEqual([ f.name for f in serializer.generate_serializers(line, api) ],
+                     [ 'serialize_Line_xml', 'serialize_final_xml' ])
+    self.assertEqual(serializer.generate_serializers(line, api), [])
+
+  def test_nested_types(self):
+    api = self.create_api()
+    classes, mappings = self.create_classes(api)
+    serializer = get_serializer('json', classes, mappings)
+    functions = serializer.generate_serializers(create_type_reference('Line'),
+                                                api)
+    # Nested types are serialized by their own functions
+    self.assertEqual(functions[2].body[-2],
+                     'output[\'address\'] = serialize_Address_json(obj.address)')
+    self.assertEqual(functions[3].body[1:3], [
+      'output[\'buyer\'] = serialize_Customer_json(obj.buyer)',
+      'output[\'seller\'] = serialize_Customer_json(obj.seller)' ])
+    functions.extend(serializer.generate_deserializers(
+      create_type_reference('Line'), api))
+
+    class Record(object):
+      def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+    namespace = { 'json' : json, 'Customer' : Record, 'Address' : Record,
+                  'Line' : Record }
+    for function in functions:
+      exec function.generate_code() in namespace
+    address = Record(street='Main')
+    line = Record(buyer=Record(name='a', address=address),
+                  seller=Record(name='b', address=address))
+    data = namespace['serialize_final_json'](
+      namespace['serialize_Line_json'](line))
+    self.assertEqual(json.loads(data), {
+      'buyer' : { 'name' : 'a', 'address' : { 'street' : 'Main' } },
+      'seller' : { 'name' : 'b', 'address' : { 'street' : 'Main' } } })
+    line = namespace['deserialize_Line_json'](data)
+    self.assertEqual(line.seller.address.street, 'Main')
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import sys
+
+sys.path.append('../python-lib')
+from api import *
+from api_fuzzer import APIFuzzer
+from similarity_store import *
+
+class TestSimilarityStore(unittest.TestCase):
+
+  def load_corpus(self, count):
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    data['dataTypes'][0]['constraints'] = [ 'self.cost > 0',
+                                            'len(self.drink) > 0' ]
+    for resource in data['resources']:
+      for operation in resource['operations']:
+        operation['requires'] = [ 'len(input.drink) > 0 and input.cost < 10' ]
+        operation['ensures'] = [ 'output.cost < 100',
+                                 'output.drink == input.drink' ]
+    fuzzer = APIFuzzer(API(data), seed=5)
+    return [ API(fuzzer.generate(i)) for i in range(count) ]
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.temp_dir, 'store.bin')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def test_similarities(self):
+    apis = self.load_corpus(4)
+    store = build_similarity_store(apis, self.path)
+    self.assertTrue(store.count > 1)
+    self.assertEqual(os.path.getsize(self.path),
+                     store.count * (store.count - 1))
+    signatures = []
+    for predicate in store.predicates:
+      signatures.extend(get_predicate_parts(predicate)[2])
+    self.assertEqual(len(signatures), store.count)
+    for i in range(store.count):
+      for j in range(store.count):
+        self.assertEqual(store.get_similarity(i, j),
+          signature_similarity(signatures[i], signatures[j]))
+    store.close()
+
+    # Worker processes build the same matrix
+    other = os.path.join(self.temp_dir, 'other.bin')
+    build_similarity_store(apis, other, processes=2).close()
+    fp1, fp2 = open(self.path, 'rb'), open(other, 'rb')
+    self.assertEqual(fp1.read(), fp2.read())
+    fp1.close()
+    fp2.close()
+
+  def test_thresholds(self):
+    apis = self.load_corpus(4)
+    build_similarity_store(apis, self.path)
+    store = SimilarityStore(self.path)
+    operations = []
+    for api in apis:
+      for resource in api.resources:
+        for operation in resource.operations:
+          operations.append((api, operation))
+    self.assertEqual(len(store.operations), len(operations))
+
+    for threshold in (0.3, 0.5, 0.7, 0.9):
+      for k1 in range(len(operations)):
+        api1, op1 = operations[k1]
+        for k2 in range(len(operations)):
+          api2, op2 = operations[k2]
+          for method in (GREEDY_MATCHING, OPTIMAL_MATCHING):
+            self.assertEqual(
+              store.compare_predicate_sets(store.operations[k1]['pre'],
+                store.operations[k2]['pre'], threshold, method),
+              compare_predicate_sets(op1.get_pre_conditions(api1),
+                op2.get_pre_conditions(api2), method, threshold=threshold))
+          self.assertEqual(
+            store.compare_predicate_sets(store.operations[k1]['post'],
+              store.operations[k2]['post'], threshold),
+            compare_predicate_sets(op1.get_post_conditions(api1),
+              op2.get_post_conditions(api2), threshold=threshold))
+
+    matches = store.find_matches()
+    expected = []
+    for k1 in range(len(operations)):
+      for k2 in range(k1 + 1, len(operations)):
+        api1, op1 = operations[k1]
+        api2, op2 = operations[k2]
+        if api1 is not api2 and compare_operations(api1, op1, api2, op2):
+          expected.append((k1, k2))
+    self.assertEqual(matches, expected)
+    self.assertTrue(len(matches) > 0)
+    self.assertTrue(len(store.find_matches(0.99, 0.99)) <= len(matches))
+    self.assertTrue(len(store.find_matches(cross_api=False)) > len(matches))
+    store.close()
+
+  def test_equivalent_predicates(self):
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    data = json.load(fp)
+    fp.close()
+    operations = data['resources'][0]['operations']
+    operations[0]['requires'] = [ 'a + 1 + c + 3 > 10', 'a + 1 + c + 4 > 10' ]
+    operations[1]['requires'] = [ 'a + 1 + c + 3 > 11', 'a + 1 + c + 3 > 10' ]
+    store = build_similarity_store([ API(data) ], self.path)
+    self.assertEqual(store.compare_predicate_sets(store.operations[0]['pre'],
+                                                  store.operations[1]['pre']),
+                     1.0)
+    store.close()
+
+  def test_empty_store(self):
+    fp = open(os.path.join('../samples', 'simple4.json'))
+    api = API(json.load(fp))
+    fp.close()
+    store = build_similarity_store([ api ], self.path)
+    self.assertEqual(os.path.getsize(self.path), 0)
+    self.assertEqual(store.compare_predicate_sets([], []), -1)
+    self.assertEqual(store.find_matches(cross_api=False), [])
+    store.close()
+
+if __name__ == '__main__':
+  unittest.main()